@@ -5,6 +5,13 @@ from mixer.backend.django import mixer as _mixer
 from posts.models import Post, Group
 
 
+@pytest.fixture(autouse=True)
+def synchronous_thumbnails(settings):
+    # Миниатюры строятся сразу: задачи пула потоков переживали бы тест,
+    # его MEDIA_ROOT и тестовую базу.
+    settings.POSTS_THUMBNAIL_WORKERS = 0
+
+
 @pytest.fixture()
 def mock_media(settings):
     with tempfile.TemporaryDirectory() as temp_directory:
@@ -0,0 +1,64 @@
+"""
+Представление постов и комментариев в JSON.
+
+Поля поста выбираются параметром ?fields=id,text,...; без него
+отдаются DEFAULT_FIELDS. Все поля берутся из Post.objects.for_feed(),
+поэтому выбор полей не добавляет запросов к базе.
+"""
+from django.urls import reverse
+
+
+def _file_url(field):
+    return field.url if field else None
+
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date,
+    'updated': lambda post: post.updated,
+    'author': lambda post: post.author.username,
+    'author_name': lambda post: post.author.get_full_name(),
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': lambda post: _file_url(post.image),
+    'thumbnail': lambda post: _file_url(post.thumbnail),
+    'comments_count': lambda post: post.comments_count,
+    'url': lambda post: reverse('api:post_detail', args=(post.pk,)),
+}
+
+DEFAULT_FIELDS = (
+    'id', 'text', 'pub_date', 'author', 'group', 'image', 'comments_count',
+)
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def parse_fields(value):
+    """Кортеж полей из параметра fields; неизвестное поле - FieldsError."""
+    if not value:
+        return DEFAULT_FIELDS
+    fields = tuple(dict.fromkeys(
+        name.strip() for name in value.split(',') if name.strip()
+    ))
+    unknown = [name for name in fields if name not in POST_FIELDS]
+    if unknown or not fields:
+        raise FieldsError(
+            f'Неизвестные поля: {", ".join(unknown)}. '
+            f'Доступны: {", ".join(POST_FIELDS)}'
+        )
+    return fields
+
+
+def serialize_post(post, fields=DEFAULT_FIELDS):
+    return {name: POST_FIELDS[name](post) for name in fields}
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created,
+    }
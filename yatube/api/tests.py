@@ -0,0 +1,139 @@
+import json
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import urlsafe_base64_encode
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for number in range(15):
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text=f'Пост {number}')
+        cls.post = Post.objects.latest('pub_date', 'id')
+        Comment.objects.create(post=cls.post, author=cls.reader,
+                               text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feeds_return_json_pages(self):
+        """Ленты отдают страницу постов с курсором на следующую"""
+        urls = (
+            reverse('api:index'),
+            reverse('api:group_list', args=(self.group.slug,)),
+            reverse('api:profile', args=(self.author.username,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                data = response.json()
+                self.assertEqual(len(data['results']), 10)
+                self.assertEqual(data['results'][0]['id'], self.post.pk)
+                self.assertIsNone(data['previous'])
+                self.assertIn('cursor=', data['next'])
+
+    def test_crafted_cursor_returns_first_page(self):
+        """Курсор с нескалярным значением не роняет API"""
+        cursor = urlsafe_base64_encode(json.dumps(['n', {}, 1]).encode())
+        response = self.client.get(reverse('api:index'), {'cursor': cursor})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['results'][0]['id'], self.post.pk)
+
+    def test_next_page(self):
+        """Курсор next ведет на оставшиеся посты"""
+        data = self.client.get(reverse('api:index')).json()
+        second = self.client.get(data['next']).json()
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next'])
+        ids = [post['id'] for post in data['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 15)
+
+    def test_fields_selection(self):
+        """Параметр fields оставляет только перечисленные поля"""
+        response = self.client.get(reverse('api:index'),
+                                   {'fields': 'id,author,url'})
+        self.assertEqual(set(response.json()['results'][0]),
+                         {'id', 'author', 'url'})
+        response = self.client.get(reverse('api:index'),
+                                   {'fields': 'id,password'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_not_modified_without_feed_query(self):
+        """По совпавшему ETag отдается 304 без запросов ленты"""
+        url = reverse('api:index')
+        etag = self.client.get(url)['ETag']
+        self.assertTrue(etag.startswith('"'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(len(queries), 0)
+
+    def test_if_modified_since(self):
+        """По If-Modified-Since без изменений отдается 304"""
+        url = reverse('api:group_list', args=(self.group.slug,))
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_etag_changes_after_new_post(self):
+        """Новый пост меняет ETag ленты"""
+        url = reverse('api:index')
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(author=self.author, text='Свежий пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['results'][0]['text'], 'Свежий пост')
+
+    def test_post_detail_and_comments(self):
+        """Пост и его комментарии, ETag меняется с новым комментарием"""
+        url = reverse('api:post_detail', args=(self.post.pk,))
+        response = self.client.get(url)
+        self.assertEqual(response.json()['comments_count'], 1)
+        comments_url = reverse('api:post_comments', args=(self.post.pk,))
+        comments = self.client.get(comments_url)
+        self.assertEqual(comments.json()['results'][0]['text'],
+                         'Комментарий')
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Второй')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        response = self.client.get(comments_url,
+                                   HTTP_IF_NONE_MATCH=comments['ETag'])
+        self.assertEqual(response.json()['results'][0]['text'], 'Второй')
+        missing = self.client.get(reverse('api:post_detail', args=(0,)))
+        self.assertEqual(missing.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_follow_index(self):
+        """Лента подписок требует входа и меняет ETag при подписке"""
+        url = reverse('api:follow_index')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        response = self.reader_client.get(url)
+        self.assertEqual(response.json()['results'], [])
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.reader_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.json()['results']), 10)
@@ -0,0 +1,202 @@
+"""
+JSON API для чтения лент.
+
+Ленты отдаются курсорными страницами {"results", "next", "previous"}
+(posts.utils.KeysetPaginator, параметры cursor и limit), поля постов
+выбираются параметром fields (api.serializers).
+
+Каждый ответ получает строгий ETag и Last-Modified. Для лент они
+считаются по версиям кеша (posts.cache), для поста - по дате правки
+и последнему комментарию, поэтому на повторный запрос с If-None-Match
+или If-Modified-Since отдается 304 без выборки ленты и сериализации.
+"""
+import hashlib
+from datetime import datetime
+from functools import wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.timezone import utc
+from django.views.decorators.http import condition, require_GET
+
+from api.serializers import (FieldsError, parse_fields, serialize_comment,
+                             serialize_post)
+from posts.cache import (COMMENTS, POSTS, changed_at, follow_version_name,
+                         get_version)
+from posts.feed import follow_feed
+from posts.models import Comment, Group, Post
+from posts.utils import KeysetPaginator
+
+User = get_user_model()
+
+
+def _json(data, status=HTTPStatus.OK):
+    return JsonResponse(data, status=status, json_dumps_params={
+        'ensure_ascii': False, 'separators': (',', ':'),
+    })
+
+
+def _error(message, status):
+    return _json({'detail': message}, status)
+
+
+def _etag(request, *parts):
+    # В ключ входит полный путь: fields, limit и cursor дают разные ответы.
+    raw = '|'.join(str(part) for part in (request.get_full_path(), *parts))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', settings.POSTS_PER_PAGE))
+    except ValueError:
+        limit = settings.POSTS_PER_PAGE
+    return max(1, min(limit, settings.POSTS_API_MAX_LIMIT))
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def _page(request, queryset, serialize, ordering=('-pub_date', '-id')):
+    page = KeysetPaginator(queryset, _limit(request), ordering).get_page(
+        request.GET.get('cursor')
+    )
+    return _json({
+        'results': [serialize(obj) for obj in page],
+        'next': _page_url(request, page.next_cursor),
+        'previous': _page_url(request, page.previous_cursor),
+    })
+
+
+def with_fields(view):
+    """Разбирает ?fields= до проверки условий: на ошибку - 400 без ETag."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            request.api_fields = parse_fields(request.GET.get('fields'))
+        except FieldsError as error:
+            return _error(str(error), HTTPStatus.BAD_REQUEST)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def api_login_required(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error('Нужна авторизация.', HTTPStatus.UNAUTHORIZED)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def feed_view(get_feed):
+    """
+    View ленты. get_feed(request, **kwargs) возвращает queryset постов
+    и имена версий кеша, от которых лента зависит; он вызывается один
+    раз на запрос, а сам queryset выполняется, только если нужен ответ.
+    """
+    def feed(request, **kwargs):
+        if not hasattr(request, 'api_feed'):
+            request.api_feed = get_feed(request, **kwargs)
+        return request.api_feed
+
+    def etag(request, **kwargs):
+        names = feed(request, **kwargs)[1]
+        return _etag(request, *(f'{name}={get_version(name)}'
+                                for name in names))
+
+    def last_modified(request, **kwargs):
+        names = feed(request, **kwargs)[1]
+        return datetime.fromtimestamp(
+            max(changed_at(name) for name in names), utc
+        )
+
+    @require_GET
+    @with_fields
+    @condition(etag_func=etag, last_modified_func=last_modified)
+    def view(request, **kwargs):
+        fields = request.api_fields
+        return _page(request, feed(request, **kwargs)[0],
+                     lambda post: serialize_post(post, fields))
+    return view
+
+
+def _index(request):
+    return Post.objects.for_feed(), (POSTS, COMMENTS)
+
+
+def _group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return group.posts.for_feed(), (POSTS, COMMENTS)
+
+
+def _profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return author.posts.for_feed(), (POSTS, COMMENTS)
+
+
+def _follow_index(request):
+    return follow_feed(request.user), (
+        POSTS, COMMENTS, follow_version_name(request.user.pk)
+    )
+
+
+index = feed_view(_index)
+group_posts = feed_view(_group_posts)
+profile = feed_view(_profile)
+follow_index = api_login_required(feed_view(_follow_index))
+
+
+def _post_state(request, post_id):
+    """Дата правки, число комментариев и время последнего - одним запросом."""
+    if not hasattr(request, 'api_post_state'):
+        state = Post.objects.filter(pk=post_id).order_by().values(
+            'updated', 'comments_count', 'thumbnail'
+        ).annotate(last_comment=Max('comments__created')).first()
+        if state is None:
+            raise Http404('Пост не найден.')
+        request.api_post_state = state
+    return request.api_post_state
+
+
+def _post_etag(request, post_id):
+    state = _post_state(request, post_id)
+    return _etag(request, state['updated'].isoformat(),
+                 state['comments_count'], state['thumbnail'],
+                 state['last_comment'])
+
+
+def _post_last_modified(request, post_id):
+    state = _post_state(request, post_id)
+    return max(filter(None, (state['updated'], state['last_comment'])))
+
+
+post_conditions = condition(etag_func=_post_etag,
+                            last_modified_func=_post_last_modified)
+
+
+@require_GET
+@with_fields
+@post_conditions
+def post_detail(request, post_id):
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
+    return _json(serialize_post(post, request.api_fields))
+
+
+@require_GET
+@post_conditions
+def post_comments(request, post_id):
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    ).only('text', 'created', 'author__username')
+    return _page(request, comments, serialize_comment,
+                 ordering=('-created', '-id'))
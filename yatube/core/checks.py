@@ -0,0 +1,97 @@
+"""
+Проверка настроек продакшена (ENVIRONMENT = 'prod') на то, что мешает
+производительности. Выполняется при запуске manage.py (migrate,
+runserver, check) и выводит предупреждения yatube.W0xx.
+"""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+CACHED_LOADER = 'django.template.loaders.cached.Loader'
+
+
+def _uses_cached_loader(options):
+    loaders = options.get('loaders')
+    if loaders is None:
+        # Django 2.2 сам включает cached.Loader, если DEBUG выключен.
+        return not options.get('debug', settings.DEBUG)
+    return any(isinstance(loader, (list, tuple))
+               and loader[0] == CACHED_LOADER for loader in loaders)
+
+
+def _sqlite_wal():
+    journal_mode = settings.SQLITE_PRAGMAS.get('journal_mode', '')
+    return str(journal_mode).lower() == 'wal'
+
+
+def _database_checks():
+    for alias, database in settings.DATABASES.items():
+        if not database.get('CONN_MAX_AGE'):
+            yield ('W002', f'База {alias}: соединение открывается заново '
+                           f'на каждый запрос.', 'Задайте CONN_MAX_AGE.')
+        if database['ENGINE'] == 'django.db.backends.sqlite3':
+            yield ('W003', f'База {alias} - SQLite: записи из разных '
+                           f'процессов ждут одну блокировку.',
+                   'Задайте DB_ENGINE=postgresql.')
+            if not _sqlite_wal():
+                yield ('W010', f'База {alias} - SQLite без WAL: чтения ждут '
+                               f'каждую запись.',
+                       "Задайте SQLITE_PRAGMAS['journal_mode'] = 'wal'.")
+
+
+def _cache_checks():
+    for alias, cache in settings.CACHES.items():
+        if cache['BACKEND'] in LOCAL_CACHES:
+            yield ('W004', f'Кеш {alias} живет в памяти процесса: версии '
+                           f'лент и счетчики не общие для процессов.',
+                   'Задайте CACHE_BACKEND=redis или memcached.')
+    if settings.SESSION_ENGINE == 'django.contrib.sessions.backends.db':
+        yield ('W006', 'Сессия читается из базы на каждый запрос.',
+               'Используйте backends.cached_db или backends.cache.')
+
+
+def _template_checks():
+    for engine in settings.TEMPLATES:
+        if (engine['BACKEND'].endswith('DjangoTemplates')
+                and not _uses_cached_loader(engine.get('OPTIONS', {}))):
+            yield ('W005', 'Шаблоны разбираются заново на каждый запрос.',
+                   'Задайте TEMPLATES_CACHED=1.')
+    if 'Manifest' not in settings.STATICFILES_STORAGE:
+        yield ('W007', 'Имена статики без хеша: браузер не может '
+                       'кешировать ее надолго.',
+               'Используйте ManifestStaticFilesStorage.')
+
+
+def _request_checks():
+    if settings.DEBUG:
+        yield ('W001', 'DEBUG включен: каждый SQL-запрос хранится в памяти '
+                       'до конца запроса.', 'Задайте DJANGO_DEBUG=0.')
+    if settings.QUERYLOG_ENABLED or settings.PROFILING_CPROFILE_EVERY:
+        yield ('W008', 'Включен журнал SQL или cProfile: это замедляет '
+                       'каждый запрос.',
+               'Задайте QUERYLOG_ENABLED=0 и PROFILING_CPROFILE_EVERY=0.')
+    if max(settings.POSTS_PER_PAGE, settings.POSTS_COMMENTS_PER_PAGE) > 100:
+        yield ('W009', 'Больше 100 записей на странице ленты или поста.',
+               'Уменьшите POSTS_PER_PAGE и POSTS_COMMENTS_PER_PAGE.')
+
+
+CHECKS = (_request_checks, _database_checks, _cache_checks, _template_checks)
+
+
+def _checks():
+    for check in CHECKS:
+        yield from check()
+
+
+@register('performance')
+def performance_settings(app_configs, **kwargs):
+    if getattr(settings, 'ENVIRONMENT', None) != 'prod':
+        return []
+    return [
+        Warning(message, hint=hint, id=f'yatube.{code}')
+        for code, message, hint in _checks()
+    ]
@@ -0,0 +1,85 @@
+import cProfile
+import itertools
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from core import profiling
+from core.querylog import QueryInspector
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name
+
+
+class ProfilingMiddleware:
+    """
+    Метрики запросов по view (core.profiling): время ответа, число и
+    время запросов к базе, время рендеринга шаблонов, попадания в кеш и
+    размер ответа. Включается PROFILING_ENABLED. Каждый
+    PROFILING_CPROFILE_EVERY-й запрос выполняется под cProfile, профиль
+    пишется в PROFILING_CPROFILE_DIR.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        profiling.instrument()
+        self.get_response = get_response
+        self.requests = itertools.count(1)
+
+    def __call__(self, request):
+        every = settings.PROFILING_CPROFILE_EVERY
+        profiler = None
+        if every and next(self.requests) % every == 0:
+            profiler = cProfile.Profile()
+        with profiling.recording() as record:
+            started = time.perf_counter()
+            if profiler is None:
+                response = self.get_response(request)
+            else:
+                response = profiler.runcall(self.get_response, request)
+            record['time_seconds'] = time.perf_counter() - started
+        if not response.streaming:
+            record['response_bytes'] = len(response.content)
+        view = view_name(request)
+        profiling.registry.add(view, record)
+        if profiler is not None:
+            self.dump(profiler, view)
+        return response
+
+    def dump(self, profiler, view):
+        directory = settings.PROFILING_CPROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        name = f'{view.replace(":", "-")}-{time.time_ns()}-{os.getpid()}'
+        profiler.dump_stats(os.path.join(directory, f'{name}.prof'))
+
+
+class QueryInspectorMiddleware:
+    """
+    Медленные и повторяющиеся SQL-запросы (core.querylog).
+    Включается QUERYLOG_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERYLOG_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inspector = QueryInspector(request)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(inspector)
+                )
+            response = self.get_response(request)
+        inspector.check()
+        return response
@@ -0,0 +1,274 @@
+"""
+Сбор метрик запросов для core.middleware.ProfilingMiddleware.
+
+На время запроса в потоке заводится запись: обертка execute_wrapper
+считает запросы к базе и их время, обертки Template.render и методов
+get/get_many бэкендов кеша - время рендеринга и попадания в кеш.
+Время рендеринга включает запросы, которые выполнились из шаблона
+(ленивые QuerySet). Отдельно по именам шаблонов считается, сколько раз
+каждый рендерился и сколько это заняло вместе с вложенными шаблонами,
+включая встроенные {% inline_include %}.
+
+Записи складываются в registry по имени view. Для процентилей по
+каждому view хранятся последние PROFILING_SAMPLES значений, счетчики и
+суммы - с запуска процесса.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.base import Template
+
+from core.templatetags.inline_include import InlineIncludeNode
+
+# Метрика: описание для Prometheus. Имена на _seconds хранятся в секундах.
+METRICS = {
+    'time_seconds': 'Время ответа',
+    'db_time_seconds': 'Время запросов к базе',
+    'template_time_seconds': 'Время рендеринга шаблонов',
+    'queries': 'Число запросов к базе',
+    'cache_hits': 'Попадания в кеш',
+    'cache_misses': 'Промахи кеша',
+    'response_bytes': 'Размер ответа',
+}
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_local = threading.local()
+
+_instrumented = False
+
+
+def current():
+    """Запись текущего запроса или None вне запроса."""
+    return getattr(_local, 'record', None)
+
+
+def _add(name, value):
+    record = current()
+    if record is not None:
+        record[name] += value
+
+
+def _add_template(name, seconds):
+    record = current()
+    if record is not None:
+        entry = record['templates'].setdefault(name or '<string>', [0, 0])
+        entry[0] += 1
+        entry[1] += seconds
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        _add('queries', 1)
+        _add('db_time_seconds', time.perf_counter() - started)
+
+
+@contextmanager
+def recording():
+    """Заводит запись для запроса и считает запросы ко всем базам."""
+    _local.record = dict.fromkeys(METRICS, 0)
+    _local.record['templates'] = {}
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(_query_wrapper)
+                )
+            yield _local.record
+    finally:
+        _local.record = None
+
+
+def _outermost(method, on_exit, depth_name):
+    """
+    Обертка, которая вызывает on_exit(результат, секунды) только для
+    внешнего вызова: вложенные include и get_many через get не
+    считаются дважды. Обертки с одним depth_name делят счетчик
+    вложенности, поэтому get внутри get_many не считается.
+    """
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        depth = getattr(_local, depth_name, 0)
+        setattr(_local, depth_name, depth + 1)
+        started = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            setattr(_local, depth_name, depth)
+        if depth == 0 and current() is not None:
+            on_exit(args, kwargs, result, time.perf_counter() - started)
+        return result
+    wrapper.profiled = True
+    return wrapper
+
+
+def _timed(method, template_name):
+    """Обертка, которая складывает время method в record['templates']."""
+    @wraps(method)
+    def wrapper(self, context):
+        if current() is None:
+            return method(self, context)
+        started = time.perf_counter()
+        try:
+            return method(self, context)
+        finally:
+            _add_template(template_name(self), time.perf_counter() - started)
+    return wrapper
+
+
+def _rendered(args, kwargs, result, seconds):
+    _add('template_time_seconds', seconds)
+
+
+def _cache_get(args, kwargs, result, seconds):
+    default = args[2] if len(args) > 2 else kwargs.get('default')
+    _add('cache_hits' if result is not default else 'cache_misses', 1)
+
+
+def _cache_get_many(args, kwargs, result, seconds):
+    keys = list(args[1]) if len(args) > 1 else list(kwargs.get('keys', ()))
+    _add('cache_hits', len(result))
+    _add('cache_misses', len(keys) - len(result))
+
+
+def instrument():
+    """
+    Один раз оборачивает Template.render, рендеринг отдельных шаблонов
+    и get/get_many кешей.
+    """
+    global _instrumented
+    if _instrumented:
+        return
+    _instrumented = True
+    Template.render = _outermost(Template.render, _rendered,
+                                 'render_depth')
+    Template._render = _timed(Template._render, lambda self: self.name)
+    InlineIncludeNode.render = _timed(InlineIncludeNode.render,
+                                      lambda self: self.included.name)
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        if getattr(backend.get, 'profiled', False):
+            continue
+        backend.get = _outermost(backend.get, _cache_get, 'cache_depth')
+        backend.get_many = _outermost(backend.get_many, _cache_get_many,
+                                      'cache_depth')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class ViewStats:
+    """
+    Метрики одного view.
+    --------
+    Атрибуты
+    --------
+    count: int
+        число запросов с запуска процесса
+    totals: dict
+        суммы метрик с запуска процесса
+    samples: dict
+        последние значения метрик для процентилей
+    templates: dict
+        {имя шаблона: [число рендерингов, секунды]} с запуска процесса
+    """
+
+    def __init__(self, size):
+        self.count = 0
+        self.totals = dict.fromkeys(METRICS, 0)
+        self.samples = {name: deque(maxlen=size) for name in METRICS}
+        self.templates = {}
+
+    def add(self, record):
+        self.count += 1
+        for name in METRICS:
+            self.totals[name] += record[name]
+            self.samples[name].append(record[name])
+        for name, (count, seconds) in record.get('templates', {}).items():
+            entry = self.templates.setdefault(name, [0, 0])
+            entry[0] += count
+            entry[1] += seconds
+
+    def summary(self):
+        summary = {'count': self.count}
+        for name in METRICS:
+            samples = self.samples[name]
+            summary[name] = {
+                'sum': self.totals[name],
+                'max': max(samples),
+                **{f'p{round(q * 100)}': percentile(samples, q)
+                   for q in QUANTILES},
+            }
+        summary['templates'] = {
+            name: {'count': count, 'sum': seconds,
+                   'per_request': seconds / self.count}
+            for name, (count, seconds) in sorted(
+                self.templates.items(), key=lambda item: -item[1][1]
+            )
+        }
+        return summary
+
+
+class Registry:
+    """Метрики по view, общие для всех потоков процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def add(self, view, record):
+        with self.lock:
+            if view not in self.views:
+                self.views[view] = ViewStats(settings.PROFILING_SAMPLES)
+            self.views[view].add(record)
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+    def snapshot(self):
+        with self.lock:
+            return {view: stats.summary()
+                    for view, stats in sorted(self.views.items())}
+
+    def prometheus(self):
+        """Метрики в текстовом формате Prometheus (summary)."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, description in METRICS.items():
+            metric = f'yatube_view_{name}'
+            lines.append(f'# HELP {metric} {description}.')
+            lines.append(f'# TYPE {metric} summary')
+            for view, summary in snapshot.items():
+                label = f'view="{view}"'
+                for quantile in QUANTILES:
+                    value = summary[name][f'p{round(quantile * 100)}']
+                    lines.append(
+                        f'{metric}{{{label},quantile="{quantile}"}} {value}'
+                    )
+                lines.append(f'{metric}_sum{{{label}}} {summary[name]["sum"]}')
+                lines.append(f'{metric}_count{{{label}}} {summary["count"]}')
+        metric = 'yatube_template_render_seconds'
+        lines.append(f'# HELP {metric} Время рендеринга шаблона '
+                     f'с вложенными.')
+        lines.append(f'# TYPE {metric} summary')
+        for view, summary in snapshot.items():
+            for template, stats in summary['templates'].items():
+                label = f'view="{view}",template="{template}"'
+                lines.append(f'{metric}_sum{{{label}}} {stats["sum"]}')
+                lines.append(f'{metric}_count{{{label}}} {stats["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -0,0 +1,140 @@
+"""
+Журнал медленных и повторяющихся SQL-запросов.
+
+QueryInspectorMiddleware оборачивает курсор каждого соединения через
+execute_wrapper. Запрос дольше QUERYLOG_SLOW_MS пишется в лог
+yatube.queries с именем view и местом, откуда он выполнен: строкой
+шаблона и строкой кода проекта. В конце запроса в лог попадают
+повторы: один и тот же SQL с теми же параметрами больше
+QUERYLOG_MAX_DUPLICATES раз или один SQL с разными параметрами
+больше QUERYLOG_MAX_SIMILAR раз (похоже на N+1), а также превышение
+QUERYLOG_MAX_QUERIES запросов.
+
+На каждый запрос к базе приходится только подсчет в словарях; стек
+разбирается лишь для медленных запросов и первого повтора, параметры
+в лог не пишутся. При QUERYLOG_RAISE (включается тест-раннером
+core.testing.QueryBudgetRunner) нарушение бюджета - исключение
+QueryBudgetExceeded, и тест падает.
+"""
+import logging
+import os
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.template.base import Node
+
+logger = logging.getLogger('yatube.queries')
+
+SQL_LOG_LENGTH = 500
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _short(sql):
+    if len(sql) <= SQL_LOG_LENGTH:
+        return sql
+    return sql[:SQL_LOG_LENGTH] + '...'
+
+
+def origin():
+    """Строка шаблона и строка кода проекта, из которых выполнен запрос."""
+    template = code = None
+    frame = sys._getframe(1)
+    while frame is not None and (template is None or code is None):
+        node = frame.f_locals.get('self')
+        if (template is None and isinstance(node, Node)
+                and getattr(node, 'origin', None) is not None):
+            template = f'{node.origin.template_name}:{node.token.lineno}'
+        filename = frame.f_code.co_filename
+        if (code is None and filename.startswith(settings.BASE_DIR)
+                and filename != __file__):
+            path = os.path.relpath(filename, settings.BASE_DIR)
+            code = f'{path}:{frame.f_lineno}'
+        frame = frame.f_back
+    return {'template': template, 'code': code}
+
+
+class QueryInspector:
+    """
+    Счетчики SQL одного HTTP-запроса.
+    --------
+    Атрибуты
+    --------
+    count: int
+        число запросов к базе
+    similar: Counter
+        сколько раз выполнялся каждый SQL
+    identical: Counter
+        сколько раз выполнялся каждый SQL с теми же параметрами
+    origins: dict
+        откуда выполнен первый повтор каждого SQL
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.count = 0
+        self.similar = Counter()
+        self.identical = Counter()
+        self.origins = {}
+
+    def view(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else self.request.path
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, params, time.perf_counter() - started)
+
+    def record(self, sql, params, duration):
+        self.count += 1
+        self.similar[sql] += 1
+        key = (sql, repr(params))
+        self.identical[key] += 1
+        if self.identical[key] == 2 or self.similar[sql] == 2:
+            self.origins.setdefault(sql, origin())
+        if duration * 1000 >= settings.QUERYLOG_SLOW_MS:
+            where = origin()
+            logger.warning(
+                'Медленный запрос %.1f мс во view %s (шаблон %s, код %s): %s',
+                duration * 1000, self.view(), where['template'],
+                where['code'], _short(sql),
+            )
+
+    def problems(self):
+        """Нарушения бюджета: список строк для лога и исключения."""
+        problems = []
+        if self.count > settings.QUERYLOG_MAX_QUERIES:
+            problems.append(f'{self.count} запросов к базе, бюджет '
+                            f'{settings.QUERYLOG_MAX_QUERIES}')
+        for (sql, _), count in self.identical.items():
+            if count > settings.QUERYLOG_MAX_DUPLICATES:
+                problems.append(self.describe('одинаковый запрос', sql,
+                                              count))
+        for sql, count in self.similar.items():
+            if count > settings.QUERYLOG_MAX_SIMILAR:
+                problems.append(self.describe('похожие запросы (N+1?)', sql,
+                                              count))
+        return problems
+
+    def describe(self, kind, sql, count):
+        where = self.origins.get(sql, {})
+        return (f'{kind} {count} раз (шаблон {where.get("template")}, '
+                f'код {where.get("code")}): {_short(sql)}')
+
+    def check(self):
+        problems = self.problems()
+        if not problems:
+            return
+        message = f'Запросы к базе во view {self.view()}:\n' + '\n'.join(
+            f'  {problem}' for problem in problems
+        )
+        if settings.QUERYLOG_RAISE:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
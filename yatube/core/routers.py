@@ -0,0 +1,31 @@
+"""
+Разделение чтения и записи между соединениями (DATABASE_ROUTERS).
+
+Если в DATABASES есть READ_REPLICA (DB_READ_REPLICA=1), чтения идут
+в это соединение, а записи - в default. Для SQLite READ_REPLICA - тот же
+файл, открытый только для чтения: отставания нет, а случайная запись
+через него - ошибка. Внутри транзакции default чтения тоже идут
+в default, иначе они не увидят еще не закоммиченные записи этой
+транзакции, а select_for_update не заблокирует строки.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class ReadWriteRouter:
+    def db_for_read(self, model, **hints):
+        if settings.READ_REPLICA not in settings.DATABASES:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return settings.READ_REPLICA
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # В обоих соединениях одни и те же данные.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != settings.READ_REPLICA
@@ -0,0 +1,32 @@
+"""
+Прагмы соединений SQLite (сигнал connection_created).
+
+Каждое новое соединение с SQLite получает прагмы SQLITE_PRAGMAS. Они
+выполняются на соединении DB-API напрямую, мимо курсоров Django:
+в журнал и бюджет SQL-запросов (core.querylog) они не попадают.
+
+journal_mode хранится в файле базы, и сменить его может только
+соединение на запись: соединение только для чтения (mode=ro, см.
+core.routers) эту прагму пропускает и читает базу в том режиме, который
+выставило соединение на запись.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Прагмы, которые пишут в файл базы.
+WRITE_PRAGMAS = ('journal_mode',)
+
+
+def is_read_only(connection):
+    return 'mode=ro' in str(connection.settings_dict['NAME'])
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    skip = WRITE_PRAGMAS if is_read_only(connection) else ()
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        if name not in skip:
+            connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,91 @@
+from django import template
+from django.conf import settings
+from django.template import Engine
+from django.template.base import token_kwargs
+from django.template.loader_tags import (ExtendsNode, IncludeNode,
+                                         construct_relative_path)
+
+register = template.Library()
+
+
+class InlineIncludeNode(template.Node):
+    """
+    Узлы подключаемого шаблона, разобранного один раз при компиляции
+    родителя: в цикле не ищется и не рендерится отдельный Template.
+    """
+
+    def __init__(self, included, extra_context, isolated_context):
+        self.included = included
+        self.extra_context = extra_context
+        self.isolated_context = isolated_context
+
+    def render(self, context):
+        values = {
+            name: var.resolve(context)
+            for name, var in self.extra_context.items()
+        }
+        if self.isolated_context:
+            context = context.new()
+        with context.push(**values):
+            return self.included.nodelist.render(context)
+
+
+def _parse_options(bits, parser):
+    options = {}
+    while bits:
+        option = bits.pop(0)
+        if option in options:
+            raise template.TemplateSyntaxError(
+                f'The {option!r} option was specified more than once.'
+            )
+        if option == 'with':
+            value = token_kwargs(bits, parser, support_legacy=False)
+            if not value:
+                raise template.TemplateSyntaxError(
+                    '"with" in "inline_include" tag needs at least one '
+                    'keyword argument.'
+                )
+        elif option == 'only':
+            value = True
+        else:
+            raise template.TemplateSyntaxError(
+                f'Unknown argument for "inline_include" tag: {option!r}.'
+            )
+        options[option] = value
+    return options.get('with', {}), options.get('only', False)
+
+
+@register.tag('inline_include')
+def do_inline_include(parser, token):
+    """
+    Как {% include %} с постоянным именем шаблона, но шаблон встраивается
+    в родителя при компиляции:
+        {% inline_include 'includes/post_article.html' with name=True %}
+    Шаблон с {% extends %} встроить нельзя. При выключенном
+    TEMPLATES_INLINE_INCLUDES тег работает как обычный include.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            f'"{bits[0]}" tag takes at least one argument: the name of the '
+            f'template to be included.'
+        )
+    name = bits[1]
+    if len(name) < 2 or name[0] != name[-1] or name[0] not in '"\'':
+        raise template.TemplateSyntaxError(
+            f'"{bits[0]}" tag requires a quoted template name.'
+        )
+    origin = parser.origin
+    name = construct_relative_path(origin.template_name, name)
+    extra_context, isolated_context = _parse_options(bits[2:], parser)
+    if not settings.TEMPLATES_INLINE_INCLUDES:
+        return IncludeNode(parser.compile_filter(name),
+                           extra_context=extra_context,
+                           isolated_context=isolated_context)
+    engine = origin.loader.engine if origin.loader else Engine.get_default()
+    included = engine.get_template(name[1:-1])
+    if included.nodelist.get_nodes_by_type(ExtendsNode):
+        raise template.TemplateSyntaxError(
+            f'"{bits[0]}" cannot inline {name}: it uses {{% extends %}}.'
+        )
+    return InlineIncludeNode(included, extra_context, isolated_context)
@@ -0,0 +1,26 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class QueryBudgetRunner(DiscoverRunner):
+    """
+    Тест-раннер, с которым запросы сверх бюджета SQL (core.querylog)
+    поднимают QueryBudgetExceeded, и тест падает. Бюджет проверяется на
+    каждом запросе, в том числе на холодных: первый пост и первая
+    подписка пользователя исключений не имеют. Бюджет отдельного теста
+    меняется через override_settings(QUERYLOG_MAX_...).
+    Миниатюры строятся сразу (POSTS_THUMBNAIL_WORKERS = 0): задачи пула
+    потоков переживали бы тест, его MEDIA_ROOT и тестовую базу.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.query_budget = override_settings(
+            QUERYLOG_ENABLED=True, QUERYLOG_RAISE=True,
+            POSTS_THUMBNAIL_WORKERS=0,
+        )
+        self.query_budget.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.query_budget.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,516 @@
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from http import HTTPStatus
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.wsgi import get_wsgi_application
+from django.db import DEFAULT_DB_ALIAS, OperationalError
+from django.db.utils import ConnectionHandler
+from django.template import Context, Engine, TemplateSyntaxError
+from django.template.loader_tags import IncludeNode
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.asgi import WsgiToAsgi
+from core.checks import performance_settings
+from core.profiling import instrument, recording, registry
+from core.querylog import QueryBudgetExceeded
+from core.routers import ReadWriteRouter
+from core.templatetags.inline_include import InlineIncludeNode
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+def call(application, scope, body_chunks=(b'',)):
+    """Вызывает ASGI-приложение, возвращает статус, заголовки и тело."""
+    chunks = list(body_chunks)
+    sent = []
+
+    async def receive():
+        body = chunks.pop(0)
+        return {'type': 'http.request', 'body': body,
+                'more_body': bool(chunks)}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    start, body = sent
+    return start['status'], dict(start['headers']), body['body']
+
+
+def http_scope(path='/', method='GET', query=b'', headers=()):
+    return {
+        'type': 'http', 'http_version': '1.1', 'method': method,
+        'scheme': 'http', 'path': path, 'query_string': query,
+        'root_path': '', 'headers': list(headers),
+        'client': ('127.0.0.1', 5000), 'server': ('127.0.0.1', 8000),
+    }
+
+
+class WsgiToAsgiTest(SimpleTestCase):
+    def test_environ_and_body(self):
+        """Запрос передается в WSGI в потоке пула, тело - по частям"""
+        seen = {}
+
+        def wsgi_application(environ, start_response):
+            seen['environ'] = environ
+            seen['body'] = environ['wsgi.input'].read()
+            seen['thread'] = threading.current_thread().name
+            start_response('201 Created', [('X-Test', 'yes')])
+            return [b'o', b'k']
+
+        status, headers, body = call(
+            WsgiToAsgi(wsgi_application),
+            http_scope('/путь/', 'POST', b'a=1', headers=[
+                (b'content-type', b'text/plain'),
+                (b'x-forwarded-for', b'1.1.1.1'),
+                (b'x-forwarded-for', b'2.2.2.2'),
+            ]),
+            body_chunks=(b'hello ', b'world'),
+        )
+        self.assertEqual((status, body), (HTTPStatus.CREATED, b'ok'))
+        self.assertEqual(headers[b'x-test'], b'yes')
+        environ = seen['environ']
+        self.assertEqual(seen['body'], b'hello world')
+        self.assertTrue(seen['thread'].startswith('asgi'))
+        self.assertEqual(environ['PATH_INFO'].encode('latin-1').decode(),
+                         '/путь/')
+        self.assertEqual(environ['QUERY_STRING'], 'a=1')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['HTTP_X_FORWARDED_FOR'], '1.1.1.1,2.2.2.2')
+
+    def test_disconnect_skips_application(self):
+        """Клиент отключился, не дослав тело: приложение не вызывается"""
+        called, sent = [], []
+        messages = [
+            {'type': 'http.request', 'body': b'a=', 'more_body': True},
+            {'type': 'http.disconnect'},
+        ]
+
+        def wsgi_application(environ, start_response):
+            called.append(environ)
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(WsgiToAsgi(wsgi_application)(
+            http_scope('/', 'POST'), receive, send
+        ))
+        self.assertEqual((called, sent), ([], []))
+
+    def test_django_page(self):
+        """Страница Django отдается через ASGI-обертку"""
+        status, headers, body = call(
+            WsgiToAsgi(get_wsgi_application()), http_scope('/about/author/')
+        )
+        self.assertEqual(status, HTTPStatus.OK)
+        self.assertIn(b'text/html', headers[b'content-type'])
+
+
+@override_settings(PROFILING_ENABLED=True)
+class ProfilingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.staff = User.objects.create_user(username='Staff', is_staff=True)
+        author = User.objects.create_user(username='Author')
+        Post.objects.create(author=author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.client = Client()
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def test_stats_per_view(self):
+        """По view собираются время, запросы, шаблоны, кеш и размер"""
+        for _ in range(2):
+            self.client.get(reverse('posts:index'))
+        stats = self.staff_client.get(reverse('profiling')).json()
+        index = stats['posts:index']
+        self.assertEqual(index['count'], 2)
+        self.assertGreater(index['queries']['max'], 0)
+        self.assertGreater(index['template_time_seconds']['p50'], 0)
+        self.assertGreater(index['response_bytes']['p95'], 0)
+        self.assertGreater(index['cache_misses']['sum'], 0)
+        self.assertGreater(index['cache_hits']['sum'], 0)
+        self.assertLessEqual(index['db_time_seconds']['max'],
+                             index['time_seconds']['max'])
+
+    def test_get_many_counted_once(self):
+        """get внутри get_many не считается повторно"""
+        instrument()
+        cache.set('a', 1)
+        with recording() as record:
+            cache.get_many(['a', 'b'])
+        self.assertEqual((record['cache_hits'], record['cache_misses']),
+                         (1, 1))
+
+    def test_time_per_template(self):
+        """Время рендеринга считается и по каждому шаблону"""
+        self.client.get(reverse('posts:index'))
+        templates = self.staff_client.get(
+            reverse('profiling')
+        ).json()['posts:index']['templates']
+        self.assertEqual(templates['includes/post_article.html']['count'], 1)
+        self.assertGreaterEqual(templates['posts/index.html']['sum'],
+                                templates['includes/post_article.html']['sum'])
+        response = self.staff_client.get(reverse('metrics'))
+        self.assertContains(
+            response,
+            'yatube_template_render_seconds_count{view="posts:index",'
+            'template="includes/post_article.html"} 1',
+        )
+
+    def test_prometheus_metrics(self):
+        """Метрики отдаются в формате Prometheus"""
+        self.client.get(reverse('posts:index'))
+        response = self.staff_client.get(reverse('metrics'))
+        self.assertContains(response, '# TYPE yatube_view_queries summary')
+        self.assertContains(
+            response,
+            'yatube_view_time_seconds_count{view="posts:index"} 1',
+        )
+
+    def test_endpoints_are_staff_only(self):
+        """Метрики не видны обычным пользователям"""
+        for name in ('profiling', 'metrics'):
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_cprofile_sampling(self):
+        """Каждый N-й запрос профилируется в файл"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with self.settings(PROFILING_CPROFILE_EVERY=2,
+                           PROFILING_CPROFILE_DIR=directory):
+            client = Client()
+            for _ in range(4):
+                client.get(reverse('posts:index'))
+        self.assertEqual(len(os.listdir(directory)), 2)
+
+
+class InlineIncludeTest(SimpleTestCase):
+    def render(self, source, **context):
+        engine = Engine(
+            loaders=[('django.template.loaders.locmem.Loader', {
+                'page.html': '{% load inline_include %}' + source,
+                'item.html': '[{{ prefix }}{{ item }}]',
+                'child.html': '{% extends "item.html" %}',
+            })],
+            libraries={
+                'inline_include': 'core.templatetags.inline_include',
+            },
+        )
+        template = engine.get_template('page.html')
+        return template, template.render(Context(context))
+
+    def test_renders_like_include(self):
+        source = ('{% for item in items %}{% TAG "item.html" '
+                  'with prefix="#" %}{% endfor %}')
+        included = self.render(source.replace('TAG', 'include'),
+                               items=[1, 2])[1]
+        template, inlined = self.render(source.replace('TAG',
+                                                       'inline_include'),
+                                        items=[1, 2])
+        self.assertEqual(inlined, '[#1][#2]')
+        self.assertEqual(inlined, included)
+        self.assertTrue(template.nodelist.get_nodes_by_type(
+            InlineIncludeNode
+        ))
+
+    def test_only_isolates_context(self):
+        output = self.render('{% inline_include "item.html" only %}',
+                             item=1, prefix='#')[1]
+        self.assertEqual(output, '[]')
+
+    def test_extends_cannot_be_inlined(self):
+        with self.assertRaises(TemplateSyntaxError):
+            self.render('{% inline_include "child.html" %}')
+
+    def test_template_name_must_be_constant(self):
+        with self.assertRaises(TemplateSyntaxError):
+            self.render('{% inline_include name %}')
+
+    @override_settings(TEMPLATES_INLINE_INCLUDES=False)
+    def test_falls_back_to_include(self):
+        template, output = self.render(
+            '{% inline_include "item.html" with item=1 %}'
+        )
+        self.assertEqual(output, '[1]')
+        self.assertTrue(template.nodelist.get_nodes_by_type(IncludeNode))
+
+
+class QueryInspectorTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        author = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(author=author, text='Пост')
+        Comment.objects.create(post=cls.post, author=author, text='Коммент')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:post_detail', args=(self.post.pk,))
+
+    @override_settings(QUERYLOG_SLOW_MS=0, QUERYLOG_RAISE=False)
+    def test_slow_query_logged_with_origin(self):
+        """Медленный запрос пишется в лог с view и строкой шаблона"""
+        with self.assertLogs('yatube.queries', 'WARNING') as logs:
+            Client().get(self.url)
+        output = '\n'.join(logs.output)
+        self.assertIn('posts:post_detail', output)
+        self.assertIn('posts/post_detail.html:', output)
+        self.assertIn('posts/views.py:', output)
+
+    @override_settings(QUERYLOG_MAX_QUERIES=1)
+    def test_budget_exceeded_fails_request(self):
+        """Превышение бюджета запросов валит тест"""
+        with self.assertRaisesMessage(QueryBudgetExceeded,
+                                      'posts:post_detail'):
+            Client().get(self.url)
+
+    @override_settings(QUERYLOG_ENABLED=True, QUERYLOG_RAISE=True)
+    def test_first_writes_fit_budget(self):
+        """Первый пост и первая подписка нового пользователя в бюджете"""
+        client = Client()
+        client.force_login(User.objects.create_user(username='Newbie'))
+        requests = (
+            (client.post, reverse('posts:post_create'), {'text': 'Первый'}),
+            (client.get, reverse('posts:profile_follow', args=('Author',)),
+             {}),
+        )
+        for method, url, data in requests:
+            with self.subTest(url=url):
+                self.assertEqual(method(url, data).status_code,
+                                 HTTPStatus.FOUND)
+        self.assertTrue(Post.objects.filter(text='Первый').exists())
+
+    @override_settings(QUERYLOG_RAISE=False)
+    def test_duplicates_logged(self):
+        """Повторы одного SQL попадают в лог"""
+        with self.settings(QUERYLOG_MAX_SIMILAR=0, QUERYLOG_MAX_DUPLICATES=0):
+            with self.assertLogs('yatube.queries', 'WARNING') as logs:
+                Client().get(self.url)
+        self.assertIn('похожие запросы', logs.output[0])
+        self.assertIn('одинаковый запрос', logs.output[0])
+
+
+PROD_SETTINGS = {
+    'ENVIRONMENT': 'prod',
+    'DEBUG': False,
+    'DATABASES': {'default': {
+        'ENGINE': 'django.db.backends.postgresql', 'CONN_MAX_AGE': 60,
+    }},
+    'CACHES': {'default': {'BACKEND': 'django_redis.cache.RedisCache'}},
+    'TEMPLATES': [{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'OPTIONS': {'loaders': [(
+            'django.template.loaders.cached.Loader',
+            ['django.template.loaders.filesystem.Loader'],
+        )]},
+    }],
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+    'STATICFILES_STORAGE':
+        'django.contrib.staticfiles.storage.ManifestStaticFilesStorage',
+    'QUERYLOG_ENABLED': False,
+    'PROFILING_CPROFILE_EVERY': 0,
+}
+
+
+class PerformanceChecksTest(SimpleTestCase):
+    def ids(self, **overrides):
+        with self.settings(**{**PROD_SETTINGS, **overrides}):
+            return [warning.id for warning in performance_settings(None)]
+
+    def test_tuned_prod_has_no_warnings(self):
+        self.assertEqual(self.ids(), [])
+
+    def test_dev_is_not_checked(self):
+        self.assertEqual(self.ids(ENVIRONMENT='dev', DEBUG=True), [])
+
+    def test_hostile_settings_warn(self):
+        cases = {
+            'yatube.W001': {'DEBUG': True},
+            'yatube.W002': {'DATABASES': {'default': {
+                'ENGINE': 'django.db.backends.postgresql',
+            }}},
+            'yatube.W003': {'DATABASES': {'default': {
+                'ENGINE': 'django.db.backends.sqlite3', 'CONN_MAX_AGE': 60,
+            }}},
+            'yatube.W004': {'CACHES': {'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            }}},
+            'yatube.W005': {'TEMPLATES': settings.TEMPLATES},
+            'yatube.W006': {
+                'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+            },
+            'yatube.W007': {'STATICFILES_STORAGE': (
+                'django.contrib.staticfiles.storage.StaticFilesStorage'
+            )},
+            'yatube.W008': {'QUERYLOG_ENABLED': True},
+            'yatube.W009': {'POSTS_PER_PAGE': 500},
+        }
+        for expected, overrides in cases.items():
+            with self.subTest(expected=expected):
+                self.assertEqual(self.ids(**overrides), [expected])
+
+    def test_sqlite_without_wal_warns(self):
+        sqlite = {'default': {'ENGINE': 'django.db.backends.sqlite3',
+                              'CONN_MAX_AGE': 60}}
+        self.assertEqual(self.ids(DATABASES=sqlite, SQLITE_PRAGMAS={}),
+                         ['yatube.W003', 'yatube.W010'])
+
+
+class SettingsProfilesTest(SimpleTestCase):
+    def load(self, **env):
+        code = (
+            'import json, yatube.settings as s; print(json.dumps(['
+            's.ENVIRONMENT, s.DEBUG, s.BASE_DIR, '
+            's.DATABASES["default"]["CONN_MAX_AGE"], '
+            's.CACHES["default"]["BACKEND"], '
+            'repr(s.TEMPLATES[0]["OPTIONS"]["loaders"]), s.POSTS_PER_PAGE]))'
+        )
+        environ = {key: value for key, value in os.environ.items()
+                   if key not in ('DJANGO_ENV', 'SECRET_KEY', 'CACHE_BACKEND',
+                                  'DJANGO_DEBUG', 'TEMPLATES_CACHED')}
+        return subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR,
+            env={**environ, **env}, capture_output=True, text=True,
+        )
+
+    def test_dev_is_default(self):
+        result = self.load()
+        environment, debug, base_dir, *_ = json.loads(result.stdout)
+        self.assertEqual((environment, debug), ('dev', True))
+        self.assertEqual(base_dir, settings.BASE_DIR)
+
+    def test_prod_defaults(self):
+        result = self.load(DJANGO_ENV='prod', SECRET_KEY='secret',
+                           POSTS_PER_PAGE='20')
+        environment, debug, _, conn_max_age, cache, loaders, per_page = (
+            json.loads(result.stdout)
+        )
+        self.assertEqual((environment, debug), ('prod', False))
+        self.assertEqual(conn_max_age, 60)
+        self.assertEqual(cache, 'django_redis.cache.RedisCache')
+        self.assertIn('cached.Loader', loaders)
+        self.assertEqual(per_page, 20)
+
+    def test_prod_requires_secret_key(self):
+        result = self.load(DJANGO_ENV='prod')
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('SECRET_KEY', result.stderr)
+
+    def database(self, **env):
+        code = ('import json, yatube.settings as s; '
+                'print(json.dumps(s.DATABASES["default"]))')
+        environ = {key: value for key, value in os.environ.items()
+                   if not key.startswith(('DB_', 'DJANGO_ENV'))}
+        result = subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR,
+            env={**environ, **env}, capture_output=True, text=True,
+        )
+        return json.loads(result.stdout)
+
+    def test_sqlite_is_default(self):
+        database = self.database()
+        self.assertEqual(database['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(database['NAME'],
+                         os.path.join(settings.BASE_DIR, 'db.sqlite3'))
+
+    def test_postgresql_from_environment(self):
+        database = self.database(
+            DJANGO_ENV='prod', SECRET_KEY='secret', DB_ENGINE='postgresql',
+            DB_NAME='feeds', DB_HOST='db', DB_POOLER='pgbouncer',
+            DB_STATEMENT_TIMEOUT_MS='2000',
+        )
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((database['NAME'], database['HOST'],
+                          database['CONN_MAX_AGE']), ('feeds', 'db', 60))
+        self.assertTrue(database['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertEqual(database['OPTIONS']['options'],
+                         '-c statement_timeout=2000')
+
+
+class SqlitePragmasTest(SimpleTestCase):
+    def test_file_database_is_tuned_and_replica_is_read_only(self):
+        """Соединения получают прагмы, соединение для чтения не пишет"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'db.sqlite3')
+        handler = ConnectionHandler({
+            'default': {'ENGINE': 'django.db.backends.sqlite3',
+                        'NAME': path},
+            'replica': {'ENGINE': 'django.db.backends.sqlite3',
+                        'NAME': f'file:{path}?mode=ro'},
+        })
+        self.addCleanup(handler.close_all)
+        pragmas = ('journal_mode', 'synchronous', 'mmap_size',
+                   'cache_size', 'busy_timeout')
+        with handler['default'].cursor() as cursor:
+            cursor.execute('CREATE TABLE note (text TEXT)')
+            values = {}
+            for name in pragmas:
+                cursor.execute(f'PRAGMA {name}')
+                values[name] = cursor.fetchone()[0]
+        self.assertEqual(values, {
+            'journal_mode': 'wal', 'synchronous': 1,
+            'mmap_size': settings.SQLITE_PRAGMAS['mmap_size'],
+            'cache_size': settings.SQLITE_PRAGMAS['cache_size'],
+            'busy_timeout': settings.SQLITE_PRAGMAS['busy_timeout'],
+        })
+        with handler['replica'].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('SELECT COUNT(*) FROM note')
+            with self.assertRaises(OperationalError):
+                cursor.execute("INSERT INTO note VALUES ('запись')")
+
+
+REPLICA = {'ENGINE': 'django.db.backends.sqlite3',
+           'NAME': 'file:replica?mode=ro'}
+
+
+class ReadWriteRouterTest(TestCase):
+    router = ReadWriteRouter()
+
+    def test_without_replica_router_abstains(self):
+        with mock.patch.dict(settings.DATABASES):
+            settings.DATABASES.pop('replica', None)
+            self.assertIsNone(self.router.db_for_read(Post))
+
+    @mock.patch.dict(settings.DATABASES, {'replica': REPLICA})
+    def test_reads_go_to_replica_outside_transaction(self):
+        with mock.patch('core.routers.connections') as connections:
+            connections[DEFAULT_DB_ALIAS].in_atomic_block = False
+            self.assertEqual(self.router.db_for_read(Post), 'replica')
+        self.assertEqual(self.router.db_for_write(Post), DEFAULT_DB_ALIAS)
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'posts'))
+
+    @mock.patch.dict(settings.DATABASES, {'replica': REPLICA})
+    def test_reads_in_transaction_stay_on_default(self):
+        """В транзакции чтения видят ее же незакоммиченные записи"""
+        # TestCase сам выполняется в транзакции default.
+        self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+        post = Post.objects.create(
+            author=User.objects.create_user(username='Author'), text='Пост'
+        )
+        self.assertEqual(Post.objects.get(pk=post.pk), post)
@@ -1,5 +1,9 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
 
+from core.profiling import registry
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +19,14 @@ def permission_denied(request, exception):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+@staff_member_required
+def profiling_stats(request):
+    return JsonResponse(registry.snapshot())
+
+
+@staff_member_required
+def profiling_metrics(request):
+    return HttpResponse(registry.prometheus(),
+                        content_type='text/plain; version=0.0.4')
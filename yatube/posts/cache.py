@@ -0,0 +1,175 @@
+"""
+Версионированный кеш лент.
+
+Страницы лент кешируются фрагментами {% guardedcache %}, в ключ
+которых входит строка версий (см. list_cache_context). Версия "posts"
+увеличивается при любом сохранении или удалении поста и при правке
+имени автора или группы, "comments" - при добавлении или удалении
+комментария (ленты показывают последние комментарии), "follow:<id>" -
+при подписке или отписке пользователя. Старые фрагменты просто перестают
+запрашиваться и вытесняются по таймауту.
+
+Версии "group:<id>" и "author:<id>" увеличиваются при изменении поста
+группы или автора и при правке самой группы или имени автора. Они входят
+в ключи страниц группы и профиля, по ним же условные GET
+(posts.conditional) узнают о правке без агрегатов по постам.
+
+Дорогие фрагменты лент строятся через get_or_render: одновременно
+фрагмент перестраивает только один запрос (блокировка через cache.add),
+а незадолго до истечения он с вероятностью обновляется заранее
+(probabilistic early expiration), чтобы не истекать у всех разом.
+
+Число записей ленты для пагинатора тоже кешируется (cached_count): после
+смены версий старое число отдается еще POSTS_COUNT_MAX_STALENESS секунд,
+поэтому COUNT(*) выполняется не чаще раза в этот срок.
+"""
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+POSTS = 'posts'
+
+COMMENTS = 'comments'
+
+
+def _key(name):
+    return f'version:{name}'
+
+
+def _initial():
+    # Начинаем с текущего времени в мс: если ключ версии вытеснят
+    # из кеша, новая версия не совпадет ни с одной из прежних.
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    version = cache.get(_key(name))
+    if version is None:
+        cache.add(_key(name), _initial(), None)
+        version = cache.get(_key(name), _initial())
+    return version
+
+
+def bump_version(name):
+    try:
+        cache.incr(_key(name))
+    except ValueError:
+        cache.set(_key(name), _initial(), None)
+    cache.set(_changed_key(name), time.time(), None)
+
+
+def _changed_key(name):
+    return f'changed:{name}'
+
+
+def changed_at(name):
+    """
+    Время последнего bump_version (timestamp). Если оно не известно,
+    например ключ вытеснен из кеша, - текущее время: так безопаснее
+    для заголовка Last-Modified.
+    """
+    changed = cache.get(_changed_key(name))
+    if changed is None:
+        changed = time.time()
+        cache.add(_changed_key(name), changed, None)
+    return changed
+
+
+def follow_version_name(user_id):
+    return f'follow:{user_id}'
+
+
+def group_version_name(group_id):
+    return f'group:{group_id}'
+
+
+def author_version_name(user_id):
+    return f'author:{user_id}'
+
+
+def bump_post_lists(author_id, *group_ids):
+    """Версии профиля автора и групп, в ленты которых входит пост."""
+    bump_version(author_version_name(author_id))
+    for group_id in set(group_ids) - {None}:
+        bump_version(group_version_name(group_id))
+
+
+def list_cache_context(*names):
+    """Таймаут и строка версий для фрагментов страницы ленты."""
+    return {
+        'cache_timeout': settings.POSTS_CACHE_TIMEOUT,
+        'cache_version': ':'.join(
+            f'{name}={get_version(name)}' for name in names
+        ),
+    }
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _expired(entry, beta):
+    value, expires_at, delta = entry
+    # С приближением expires_at вероятность досрочного обновления растет;
+    # delta - сколько секунд фрагмент строился в прошлый раз.
+    return time.time() - delta * beta * math.log(1 - random.random()) >= (
+        expires_at
+    )
+
+
+def _render_and_store(key, render, timeout, fragment_cache):
+    started = time.time()
+    value = render()
+    delta = time.time() - started
+    fragment_cache.set(key, (value, started + timeout, delta), timeout)
+    return value
+
+
+def get_or_render(key, render, timeout, fragment_cache=cache):
+    """
+    Возвращает фрагмент из кеша или строит его вызовом render().
+    Пока один запрос перестраивает фрагмент, остальные получают старую
+    версию, а если ее нет - ждут до POSTS_CACHE_LOCK_WAIT секунд.
+    """
+    entry = fragment_cache.get(key)
+    beta = settings.POSTS_CACHE_EARLY_REFRESH_BETA
+    if entry is not None and not _expired(entry, beta):
+        return entry[0]
+    lock_key = _lock_key(key)
+    if fragment_cache.add(lock_key, 1, settings.POSTS_CACHE_LOCK_TIMEOUT):
+        try:
+            return _render_and_store(key, render, timeout, fragment_cache)
+        finally:
+            fragment_cache.delete(lock_key)
+    if entry is not None:
+        return entry[0]
+    deadline = time.time() + settings.POSTS_CACHE_LOCK_WAIT
+    while time.time() < deadline:
+        time.sleep(0.05)
+        entry = fragment_cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return render()
+
+
+def cached_count(name, versions, count):
+    """
+    Число записей списка name из кеша или вызовом count(). Свежее при
+    тех же версиях versions, устаревшее - не дольше
+    POSTS_COUNT_MAX_STALENESS секунд.
+    """
+    version = ':'.join(f'{each}={get_version(each)}' for each in versions)
+    key = f'count:{name}'
+    entry = cache.get(key)
+    if entry is not None:
+        value, cached_version, counted_at = entry
+        if (cached_version == version or time.time() - counted_at
+                < settings.POSTS_COUNT_MAX_STALENESS):
+            return value
+    value = count()
+    cache.set(key, (value, version, time.time()),
+              settings.POSTS_CACHE_TIMEOUT)
+    return value
@@ -0,0 +1,160 @@
+"""
+Условные GET для страниц группы, профиля и поста.
+
+ETag и Last-Modified считаются по дешевым данным: дате новейшего
+поста (MAX по индексу), версии группы или автора из posts.cache, которую
+увеличивает каждое изменение их постов, счетчикам, а для лент еще и по
+версии кеша комментариев. Для группы
+и профиля дата выбирается тем же запросом, что и сама группа или автор;
+объект запоминается на запросе, и view берет его оттуда же, поэтому
+проверка условий не добавляет запросов. Для поста это отдельный
+запрос без текста поста. На 304 шаблон не рендерится.
+
+В ETag входят id пользователя и полный путь: шапка и кнопки страницы
+зависят от пользователя, номер страницы - от параметров. Еще в нем
+число записей пользователя в очереди posts.writebehind: страницы
+показывают их до записи в базу.
+"""
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils.timezone import utc
+from django.views.decorators.http import condition
+
+from posts import writebehind
+from posts.cache import (COMMENTS, author_version_name, changed_at,
+                         get_version, group_version_name)
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+
+def per_request(function):
+    """Результат function(request, ...) вычисляется один раз на запрос."""
+    @wraps(function)
+    def wrapper(request, *args, **kwargs):
+        memo = request.__dict__.setdefault('conditional_memo', {})
+        key = (function.__name__, args, tuple(sorted(kwargs.items())))
+        if key not in memo:
+            memo[key] = function(request, *args, **kwargs)
+        return memo[key]
+    return wrapper
+
+
+@per_request
+def group(request, slug):
+    return get_object_or_404(
+        Group.objects.annotate(
+            newest_post=Max('posts__pub_date'),
+        ),
+        slug=slug,
+    )
+
+
+@per_request
+def author(request, username):
+    return get_object_or_404(
+        User.objects.select_related('stats').annotate(
+            newest_post=Max('posts__pub_date'),
+        ),
+        username=username,
+    )
+
+
+@per_request
+def following(request, username):
+    if not request.user.is_authenticated:
+        return False
+    pending = writebehind.pending_follow(request.user.pk,
+                                         author(request, username).pk)
+    if pending is not None:
+        return pending
+    return Follow.objects.filter(
+        user=request.user, author=author(request, username)
+    ).exists()
+
+
+@per_request
+def post_state(request, post_id):
+    """Поля поста, от которых зависит его страница, без текста."""
+    state = Post.objects.filter(pk=post_id).order_by().values(
+        'updated', 'thumbnail', 'comments_count', 'group_id',
+        'author__stats__posts_count',
+    ).annotate(last_comment=Max('comments__created')).first()
+    if state is None:
+        raise Http404('Пост не найден.')
+    return state
+
+
+def _etag(request, *parts):
+    raw = '|'.join(str(part) for part in (
+        request.user.pk, request.get_full_path(),
+        writebehind.pending(request.user.pk), *parts
+    ))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _latest(*dates):
+    return max(filter(None, dates), default=None)
+
+
+def _changed(name):
+    return datetime.fromtimestamp(changed_at(name), utc)
+
+
+def _stats(user):
+    stats = getattr(user, 'stats', None)
+    if stats is None:
+        return None
+    return (stats.posts_count, stats.followers_count, stats.following_count)
+
+
+def _group_etag(request, slug):
+    obj = group(request, slug)
+    return _etag(request, obj.title, obj.description, obj.newest_post,
+                 get_version(group_version_name(obj.pk)),
+                 get_version(COMMENTS))
+
+
+def _group_last_modified(request, slug):
+    obj = group(request, slug)
+    # Ленты показывают последние комментарии постов.
+    return _latest(obj.newest_post, _changed(group_version_name(obj.pk)),
+                   _changed(COMMENTS))
+
+
+def _profile_etag(request, username):
+    obj = author(request, username)
+    return _etag(request, obj.get_full_name(), _stats(obj), obj.newest_post,
+                 get_version(author_version_name(obj.pk)),
+                 following(request, username), get_version(COMMENTS))
+
+
+def _profile_last_modified(request, username):
+    obj = author(request, username)
+    return _latest(obj.newest_post, _changed(author_version_name(obj.pk)),
+                   _changed(COMMENTS))
+
+
+def _post_etag(request, post_id):
+    return _etag(request, *post_state(request, post_id).values())
+
+
+def _post_last_modified(request, post_id):
+    state = post_state(request, post_id)
+    return _latest(state['updated'], state['last_comment'])
+
+
+group_conditions = condition(etag_func=_group_etag,
+                             last_modified_func=_group_last_modified)
+
+profile_conditions = condition(etag_func=_profile_etag,
+                               last_modified_func=_profile_last_modified)
+
+post_conditions = condition(etag_func=_post_etag,
+                            last_modified_func=_post_last_modified)
@@ -0,0 +1,74 @@
+"""
+Денормализованные счетчики: посты, подписчики и подписки пользователя
+(AuthorStats) и комментарии поста (Post.comments_count).
+
+Счетчики сдвигаются F()-выражением в той же транзакции, что и запись,
+которая их меняет (см. posts.signals). Строка AuthorStats создается
+вместе с пользователем. Если ее нет (пользователи из bulk_create или
+loaddata), она заводится при первом увеличении счетчика и сразу
+пересчитывается целиком.
+Полный пересчет - команда `python manage.py recount_stats`.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from posts.models import AuthorStats, Comment, Follow, Post
+
+User = get_user_model()
+
+AUTHOR_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def shift_author(user_id, field, delta):
+    updated = AuthorStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta}
+    )
+    if not updated and delta > 0:
+        recount_author(user_id)
+
+
+def shift_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def recount_author(user_id):
+    counts = {
+        field: model.objects.filter(**{related: user_id}).count()
+        for field, (model, related) in AUTHOR_COUNTERS.items()
+    }
+    AuthorStats.objects.update_or_create(user_id=user_id, defaults=counts)
+
+
+def _count_subquery(model, related):
+    counts = model.objects.filter(
+        **{related: OuterRef('pk')}
+    ).order_by().values(related).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def recount_all():
+    """
+    Пересчитывает все счетчики набором UPDATE ... SET = (SELECT COUNT),
+    без выборки строк в память. Возвращает число обновленных строк.
+    """
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=pk)
+         for pk in User.objects.filter(stats__isnull=True)
+         .values_list('pk', flat=True).iterator()),
+        ignore_conflicts=True,
+    )
+    stats = AuthorStats.objects.update(**{
+        field: _count_subquery(model, related)
+        for field, (model, related) in AUTHOR_COUNTERS.items()
+    })
+    posts = Post.objects.update(
+        comments_count=_count_subquery(Comment, 'post')
+    )
+    return stats, posts
@@ -0,0 +1,229 @@
+"""
+Лента подписок с материализацией при записи (fan-out-on-write).
+
+Пост обычного автора при публикации раскладывается в FeedEntry всех его
+подписчиков, поэтому страница follow_index - один диапазон по индексу
+(user, -pub_date, -post) с LIMIT, а посты страницы выбираются по id.
+Посты популярных авторов (AuthorStats.feed_on_read) не раскладываются,
+а подмешиваются в ленту при чтении (fan-out-on-read) вторым запросом
+с тем же LIMIT по индексу (author, -pub_date).
+
+Авторов между раскладкой и чтением по FEED_FANOUT_LIMIT переводит
+refresh_popular (команда refresh_feeds по расписанию), а не запросы
+пользователей: дозаполнение лент подписчиков бывшего популярного
+автора может быть долгим.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import cached_property
+
+from posts.models import AuthorStats, FeedEntry, Follow, Post
+from posts.utils import keyset_filter
+
+POPULAR_AUTHORS_KEY = 'feed:popular_authors'
+
+# Поле FeedEntry для каждого поля сортировки постов ленты: post_id, а не
+# post - иначе Django сортирует по Meta.ordering поста через JOIN.
+ENTRY_FIELDS = {'pub_date': 'pub_date', 'id': 'post_id'}
+
+
+def popular_authors():
+    """Множество id популярных авторов, кешируется на FEED_POPULAR_TIMEOUT."""
+    authors = cache.get(POPULAR_AUTHORS_KEY)
+    if authors is None:
+        authors = frozenset(
+            AuthorStats.objects.filter(
+                feed_on_read=True
+            ).values_list('user_id', flat=True)
+        )
+        cache.set(POPULAR_AUTHORS_KEY, authors, settings.FEED_POPULAR_TIMEOUT)
+    return authors
+
+
+def _reclassify():
+    """
+    Отмечает feed_on_read по FEED_FANOUT_LIMIT. Возвращает число новых
+    популярных авторов и список id авторов, переставших быть популярными.
+    """
+    limit = settings.FEED_FANOUT_LIMIT
+    promoted = AuthorStats.objects.filter(
+        feed_on_read=False, followers_count__gt=limit
+    ).update(feed_on_read=True)
+    demoted = list(AuthorStats.objects.filter(
+        feed_on_read=True, followers_count__lte=limit
+    ).values_list('user_id', flat=True))
+    AuthorStats.objects.filter(user_id__in=demoted).update(feed_on_read=False)
+    cache.delete(POPULAR_AUTHORS_KEY)
+    return promoted, demoted
+
+
+def refresh_popular():
+    """
+    Переводит авторов между раскладкой при записи и чтением. Ленты
+    подписчиков бывших популярных авторов дозаполняются, иначе посты
+    периода популярности пропали бы из них. Возвращает (promoted,
+    demoted) - сколько авторов переведено в каждую сторону.
+    """
+    with transaction.atomic():
+        promoted, demoted = _reclassify()
+    popular = popular_authors()
+    for author_id in demoted:
+        with transaction.atomic():
+            for user_id in Follow.objects.filter(
+                author_id=author_id
+            ).values_list('user_id', flat=True):
+                backfill(user_id, author_id, popular)
+    return promoted, len(demoted)
+
+
+def _entries(user_ids, posts):
+    return [
+        FeedEntry(user_id=user_id, post_id=post_id,
+                  author_id=author_id, pub_date=pub_date)
+        for user_id in user_ids
+        for post_id, author_id, pub_date in posts
+    ]
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if post.author_id in popular_authors():
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        _entries(followers, [(post.pk, post.author_id, post.pub_date)]),
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id, popular=None):
+    """Добавляет в ленту подписчика последние посты автора."""
+    if popular is None:
+        popular = popular_authors()
+    if author_id in popular:
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values_list('pk', 'author_id', 'pub_date')
+    FeedEntry.objects.bulk_create(
+        _entries([user_id], posts[:settings.FEED_BACKFILL_SIZE]),
+        ignore_conflicts=True,
+    )
+
+
+def trim(user_id, author_id):
+    """Убирает из ленты подписчика посты автора, от которого он отписался."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild():
+    """Заполняет ленты заново по текущим подпискам, например после импорта."""
+    _reclassify()
+    popular = popular_authors()
+    FeedEntry.objects.all().delete()
+    for user_id, author_id in Follow.objects.values_list(
+        'user_id', 'author_id'
+    ).iterator():
+        backfill(user_id, author_id, popular)
+
+
+class FollowFeed:
+    """
+    Посты ленты подписок пользователя. Поддерживает то, что нужно
+    пагинаторам posts.utils: срез, count() и курсор (keyset_window).
+    Срез [a:b] - два запроса не больше чем по b строк: ключи из
+    FeedEntry и из постов популярных авторов, - затем посты страницы
+    одним запросом по id.
+    --------
+    Атрибуты
+    --------
+    user: User
+        владелец ленты
+    model: Model
+        модель записей ленты, для курсора
+    """
+
+    model = Post
+    ordering = ('-pub_date', '-id')
+
+    def __init__(self, user):
+        self.user = user
+
+    def entries(self, ordering=ordering):
+        """Материализованная часть ленты в порядке ordering постов."""
+        return FeedEntry.objects.filter(user=self.user).order_by(
+            *self._entry_ordering(ordering)
+        )
+
+    @staticmethod
+    def _entry_ordering(ordering):
+        return tuple(
+            field[:-len(name)] + ENTRY_FIELDS[name]
+            for field, name in ((field, field.lstrip('-'))
+                                for field in ordering)
+        )
+
+    @cached_property
+    def popular_ids(self):
+        """Популярные авторы, на которых подписан пользователь."""
+        popular = popular_authors()
+        if not popular:
+            return []
+        return list(Follow.objects.filter(
+            user=self.user, author_id__in=popular
+        ).values_list('author_id', flat=True))
+
+    def _keys(self, ordering, values, limit):
+        """Пары (pub_date, id) первых limit постов после курсора values."""
+        entries = self.entries(ordering)
+        if values is not None:
+            entries = entries.filter(keyset_filter(
+                FeedEntry, self._entry_ordering(ordering), values
+            ))
+        keys = list(entries.values_list('pub_date', 'post_id')[:limit])
+        if not self.popular_ids:
+            return keys
+        posts = Post.objects.filter(author_id__in=self.popular_ids)
+        if values is not None:
+            posts = posts.filter(keyset_filter(Post, ordering, values))
+        keys += posts.order_by(*ordering).values_list('pub_date',
+                                                      'pk')[:limit]
+        # Посты, разложенные до популярности автора, есть в обоих списках.
+        keys = sorted(set(keys), reverse=ordering[0].startswith('-'))
+        return keys[:limit]
+
+    def _posts(self, keys):
+        posts = Post.objects.for_feed().in_bulk([pk for _, pk in keys])
+        return [posts[pk] for _, pk in keys if pk in posts]
+
+    def keyset_window(self, ordering, values, limit):
+        return self._posts(self._keys(ordering, values, limit))
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError('Лента подписок поддерживает только срезы.')
+        start, stop = index.start or 0, index.stop
+        return self._posts(self._keys(self.ordering, None, stop)[start:])
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def count(self):
+        total = FeedEntry.objects.filter(user=self.user).count()
+        if self.popular_ids:
+            total += Post.objects.filter(
+                author_id__in=self.popular_ids
+            ).exclude(
+                pk__in=FeedEntry.objects.filter(
+                    user=self.user
+                ).values('post_id')
+            ).count()
+        return total
+
+
+def follow_feed(user):
+    """Посты ленты подписок пользователя."""
+    return FollowFeed(user)
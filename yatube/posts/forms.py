@@ -1,6 +1,7 @@
 from django import forms
 
 from .models import Comment, Post
+from .thumbnails import prepare_upload
 
 
 class PostForm(forms.ModelForm):
@@ -23,6 +24,13 @@ class PostForm(forms.ModelForm):
             raise forms.ValidationError('Вы имели в виду "блинчик" 🥞?')
         return data
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        # Только что загруженный файл, а не уже сохраненная картинка поста.
+        if image and hasattr(image, 'content_type'):
+            return prepare_upload(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
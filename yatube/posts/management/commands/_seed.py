@@ -0,0 +1,185 @@
+"""
+Генерация тестового набора данных для бенчмарков и планов запросов.
+
+Данные пишутся bulk_create пачками, поэтому сигналы не срабатывают:
+счетчики, ленты подписок и поисковый индекс после генерации
+пересчитываются целиком.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from posts import counters, feed, search
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+WORDS = (
+    'пост', 'лента', 'котик', 'погода', 'новости', 'python', 'django',
+    'город', 'книга', 'кино', 'музыка', 'путешествие', 'работа', 'код',
+    'утро', 'вечер', 'рецепт', 'блинчик', 'фото', 'спорт',
+)
+
+SIZES = {
+    'users': 200,
+    'groups': 20,
+    'posts': 20000,
+    'comments': 40000,
+    'follows': 4000,
+}
+
+AUTO_DATE_FIELDS = (
+    (Post, 'pub_date'),
+    (Post, 'updated'),
+    (Comment, 'created'),
+)
+
+
+def add_seed_arguments(parser):
+    for name, default in SIZES.items():
+        parser.add_argument(
+            f'--{name}', type=int, default=default,
+            help=f'Сколько создать: {name} (по умолчанию {default})'
+        )
+    parser.add_argument('--random-seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=1000)
+
+
+@contextmanager
+def temporary_database(verbosity=0, name=None):
+    """
+    Отдельная тестовая база: рабочие данные не затрагиваются. name -
+    файл для тестовой базы SQLite вместо базы в памяти.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings['NAME']
+    if name is not None:
+        test_settings['NAME'] = name
+    connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False
+    )
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+        test_settings['NAME'] = old_test_name
+
+
+@contextmanager
+def manual_dates():
+    """Отключает auto_now/auto_now_add, чтобы раскидать даты по времени."""
+    fields = [model._meta.get_field(name) for model, name in AUTO_DATE_FIELDS]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _batches(objects, batch_size):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _text(rnd):
+    return ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(5, 40)))
+
+
+def _popular(rnd, user_ids):
+    """Выбор автора по степенному закону: первые id выпадают чаще."""
+    def pick():
+        return user_ids[min(int(rnd.paretovariate(1.2)) - 1,
+                            len(user_ids) - 1)]
+    return pick
+
+
+def _new_posts(rnd, count, pick_author, group_ids, now):
+    for _ in range(count):
+        pub_date = now - timedelta(seconds=rnd.randint(0, 3 * 10 ** 7))
+        yield Post(
+            author_id=pick_author(),
+            group_id=rnd.choice(group_ids + [None]),
+            text=_text(rnd),
+            pub_date=pub_date,
+            updated=pub_date,
+        )
+
+
+def _new_comments(rnd, count, post_dates, user_ids):
+    for _ in range(count):
+        post_id, pub_date = rnd.choice(post_dates)
+        yield Comment(
+            post_id=post_id,
+            author_id=rnd.choice(user_ids),
+            text=_text(rnd),
+            created=pub_date + timedelta(seconds=rnd.randint(1, 10 ** 5)),
+        )
+
+
+def _new_follows(rnd, count, pick_author, user_ids):
+    pairs = set()
+    for _ in range(count * 3):
+        if len(pairs) == count:
+            break
+        user_id, author_id = rnd.choice(user_ids), pick_author()
+        if user_id != author_id:
+            pairs.add((user_id, author_id))
+    return [Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs]
+
+
+def seed(users, groups, posts, comments, follows,
+         random_seed=0, batch_size=1000, **kwargs):
+    """
+    Создает пользователей, группы, посты, комментарии и подписки.
+    Авторы выбираются по степенному закону: у немногих авторов много
+    постов и подписчиков, как в живой ленте.
+    """
+    rnd = random.Random(random_seed)
+    User.objects.bulk_create(
+        [User(username=f'seed_user_{i}', first_name=f'Имя{i}')
+         for i in range(users)]
+    )
+    Group.objects.bulk_create(
+        [Group(title=f'Группа {i}', slug=f'seed-group-{i}',
+               description=_text(rnd)) for i in range(groups)]
+    )
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    group_ids = list(Group.objects.values_list('pk', flat=True)) or [None]
+    pick_author = _popular(rnd, user_ids)
+    with manual_dates():
+        for batch in _batches(_new_posts(rnd, posts, pick_author, group_ids,
+                                         timezone.now()), batch_size):
+            Post.objects.bulk_create(batch)
+        post_dates = list(Post.objects.values_list('pk', 'pub_date'))
+        for batch in _batches(_new_comments(rnd, comments, post_dates,
+                                            user_ids), batch_size):
+            Comment.objects.bulk_create(batch)
+    Follow.objects.bulk_create(
+        _new_follows(rnd, follows, pick_author, user_ids)
+    )
+    counters.recount_all()
+    feed.rebuild()
+    search.rebuild()
+
+
+def busiest(model, related):
+    """id объекта, у которого больше всего связанных записей."""
+    return model.objects.annotate(
+        total=Count(related)
+    ).order_by('-total').values_list('pk', flat=True).first()
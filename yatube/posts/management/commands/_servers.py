@@ -0,0 +1,162 @@
+"""
+Локальные HTTP-серверы для benchmark_concurrency.
+
+WsgiServer - wsgiref с фиксированным пулом потоков: так ведут себя
+синхронные воркеры (gunicorn --workers N), медленный клиент держит
+воркер, пока не дочитан запрос и не отправлен ответ.
+
+AsgiServer - минимальный HTTP/1.1-сервер на asyncio в духе uvicorn:
+соединения читаются и пишутся в цикле событий, в ASGI-приложение тело
+передается по мере поступления. Поддерживается ровно то, что нужно
+бенчмарку: Content-Length, без chunked и keep-alive.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import unquote
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+READ_CHUNK = 64 * 1024
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class WsgiServer(WSGIServer):
+    """wsgiref, запросы которого обслуживают workers потоков."""
+
+    def __init__(self, application, workers):
+        super().__init__(('127.0.0.1', 0), _QuietHandler)
+        self.set_app(application)
+        self.pool = ThreadPoolExecutor(max_workers=workers,
+                                       thread_name_prefix='wsgi')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.shutdown()
+        self.pool.shutdown(wait=True)
+        self.server_close()
+
+
+def _scope(head, writer):
+    """Scope ASGI по строке запроса и заголовкам HTTP/1.1."""
+    request_line, *header_lines = head.decode('latin-1').split('\r\n')
+    method, target, version = request_line.split(' ', 2)
+    path, _, query = target.partition('?')
+    headers = []
+    for line in header_lines:
+        if line:
+            name, _, value = line.partition(':')
+            headers.append((name.strip().lower().encode('latin-1'),
+                            value.strip().encode('latin-1')))
+    return {
+        'type': 'http',
+        'http_version': version.split('/', 1)[1],
+        'method': method,
+        'scheme': 'http',
+        'path': unquote(path),
+        'raw_path': path.encode('latin-1'),
+        'query_string': query.encode('latin-1'),
+        'root_path': '',
+        'headers': headers,
+        'client': writer.get_extra_info('peername')[:2],
+        'server': writer.get_extra_info('sockname')[:2],
+    }
+
+
+def _receiver(reader, remaining):
+    """receive(): тело запроса кусками по READ_CHUNK до Content-Length."""
+    async def receive():
+        nonlocal remaining
+        if remaining <= 0:
+            return {'type': 'http.request', 'body': b'',
+                    'more_body': False}
+        chunk = await reader.read(min(remaining, READ_CHUNK))
+        if not chunk:
+            return {'type': 'http.disconnect'}
+        remaining -= len(chunk)
+        return {'type': 'http.request', 'body': chunk,
+                'more_body': remaining > 0}
+    return receive
+
+
+def _sender(writer):
+    """send(): статус и заголовки, затем тело ответа в writer."""
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status = HTTPStatus(message['status'])
+            lines = [f'HTTP/1.1 {status.value} {status.phrase}'.encode()]
+            lines += [name + b': ' + value
+                      for name, value in message['headers']]
+            lines.append(b'connection: close')
+            writer.write(b'\r\n'.join(lines) + b'\r\n\r\n')
+        elif message['type'] == 'http.response.body':
+            writer.write(message.get('body', b''))
+            await writer.drain()
+    return send
+
+
+class AsgiServer:
+    """HTTP-сервер на asyncio, который вызывает ASGI-приложение."""
+
+    def __init__(self, application):
+        self.application = application
+        self.loop = asyncio.new_event_loop()
+        self.server = None
+        self.port = None
+
+    def start(self):
+        ready = threading.Event()
+        threading.Thread(target=self._run, args=(ready,), daemon=True).start()
+        ready.wait()
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(asyncio.start_server(
+            self._handle, '127.0.0.1', 0
+        ))
+        self.port = self.server.sockets[0].getsockname()[1]
+        ready.set()
+        self.loop.run_forever()
+
+    def stop(self):
+        async def close():
+            self.server.close()
+            await self.server.wait_closed()
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+        scope = _scope(head, writer)
+        remaining = int(dict(scope['headers']).get(b'content-length', 0))
+        receive = _receiver(reader, remaining)
+        send = _sender(writer)
+        try:
+            await self.application(scope, receive, send)
+        finally:
+            writer.close()
@@ -0,0 +1,222 @@
+"""
+Потоковый перенос групп, постов, комментариев и подписок.
+
+Строки читаются из базы пачками по первичному ключу (pk > последнего
+выгруженного), а пишутся bulk_create пачками, поэтому память не растет
+с размером таблиц. Пользователи переносятся по username. После каждой
+пачки в каталог пишется контрольная точка, и прерванный перенос можно
+продолжить флагом --resume.
+"""
+import csv
+import json
+import os
+import time
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils.dateparse import parse_datetime
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FORMATS = ('jsonl', 'csv')
+
+# columns: колонка файла -> путь для values_list при выгрузке;
+# users: колонки с username; refs: колонки с id связанных строк.
+Table = namedtuple('Table', 'model columns users refs dates')
+
+TABLES = {
+    'group': Table(
+        Group,
+        {'id': 'pk', 'title': 'title', 'slug': 'slug',
+         'description': 'description'},
+        users=(), refs=(), dates=(),
+    ),
+    'post': Table(
+        Post,
+        {'id': 'pk', 'author': 'author__username', 'group': 'group_id',
+         'text': 'text', 'pub_date': 'pub_date', 'updated': 'updated',
+         'image': 'image'},
+        users=('author',), refs=('group',), dates=('pub_date', 'updated'),
+    ),
+    'comment': Table(
+        Comment,
+        {'id': 'pk', 'post': 'post_id', 'author': 'author__username',
+         'text': 'text', 'created': 'created'},
+        users=('author',), refs=('post',), dates=('created',),
+    ),
+    'follow': Table(
+        Follow,
+        {'id': 'pk', 'user': 'user__username',
+         'author': 'author__username'},
+        users=('user', 'author'), refs=(), dates=(),
+    ),
+}
+
+
+def add_transfer_arguments(parser):
+    parser.add_argument('directory', help='Каталог с файлами данных')
+    parser.add_argument('--format', choices=FORMATS, default='jsonl')
+    parser.add_argument(
+        '--tables', nargs='+', choices=tuple(TABLES), default=tuple(TABLES),
+        help='Какие таблицы переносить (по умолчанию все)'
+    )
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument(
+        '--resume', action='store_true',
+        help='Продолжить с контрольной точки прерванного переноса'
+    )
+
+
+def data_path(directory, name, data_format):
+    return os.path.join(directory, f'{name}.{data_format}')
+
+
+class Checkpoint:
+    """Прогресс переноса по таблицам, сохраняется после каждой пачки."""
+
+    def __init__(self, directory, name, resume):
+        self.path = os.path.join(directory, f'.{name}-checkpoint.json')
+        self.state = {}
+        if resume and os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as file:
+                self.state = json.load(file)
+
+    def get(self, table):
+        return self.state.get(table, 0)
+
+    def save(self, table, position):
+        self.state[table] = position
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(self.state, file)
+        os.replace(temporary, self.path)
+
+    def finish(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _dump(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+class JsonLinesFormat:
+    @staticmethod
+    def write(file, columns, rows):
+        for row in rows:
+            file.write(json.dumps(
+                {name: _dump(value) for name, value in zip(columns, row)},
+                ensure_ascii=False,
+            ) + '\n')
+
+    @staticmethod
+    def read(file):
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+class CsvFormat:
+    @staticmethod
+    def write(file, columns, rows):
+        writer = csv.writer(file)
+        if file.tell() == 0:
+            writer.writerow(columns)
+        writer.writerows(
+            ['' if value is None else _dump(value) for value in row]
+            for row in rows
+        )
+
+    @staticmethod
+    def read(file):
+        for row in csv.DictReader(file):
+            yield {name: value if value != '' else None
+                   for name, value in row.items()}
+
+
+SERIALIZERS = {
+    'jsonl': JsonLinesFormat,
+    'csv': CsvFormat,
+}
+
+
+class Throughput:
+    """Число строк и скорость переноса по таблицам."""
+
+    def __init__(self):
+        self.tables = {}
+
+    def measure(self, table, rows, seconds):
+        total_rows, total_seconds = self.tables.get(table, (0, 0.0))
+        self.tables[table] = (total_rows + rows, total_seconds + seconds)
+
+    def lines(self):
+        for table, (rows, seconds) in self.tables.items():
+            rate = rows / seconds if seconds else 0
+            yield (f'{table}: {rows} строк за {seconds:.2f} с '
+                   f'({rate:.0f} строк/с)')
+
+
+def export_table(table, file, serializer, chunk_size, last_pk, on_chunk):
+    """Выгружает строки с pk > last_pk пачками по chunk_size."""
+    spec = TABLES[table]
+    columns = list(spec.columns)
+    queryset = spec.model.objects.order_by('pk').values_list(
+        *spec.columns.values()
+    )
+    while True:
+        started = time.perf_counter()
+        rows = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not rows:
+            return
+        serializer.write(file, columns, rows)
+        file.flush()
+        last_pk = rows[-1][0]
+        on_chunk(len(rows), last_pk, time.perf_counter() - started)
+
+
+def _user_ids(usernames):
+    """id пользователей по username, недостающие создаются без пароля."""
+    found = dict(User.objects.filter(
+        username__in=usernames
+    ).values_list('username', 'pk'))
+    missing = set(usernames) - set(found)
+    if missing:
+        User.objects.bulk_create(
+            [User(username=name, password=make_password(None))
+             for name in missing],
+            ignore_conflicts=True,
+        )
+        found.update(User.objects.filter(
+            username__in=missing
+        ).values_list('username', 'pk'))
+    return found
+
+
+def build_objects(table, rows):
+    spec = TABLES[table]
+    user_ids = _user_ids({row[name] for row in rows for name in spec.users})
+    objects = []
+    for row in rows:
+        fields = {'pk': int(row['id'])}
+        for name in spec.columns:
+            value = row.get(name)
+            if name == 'id':
+                continue
+            if name in spec.users:
+                fields[f'{name}_id'] = user_ids[value]
+            elif name in spec.refs:
+                fields[f'{name}_id'] = int(value) if value else None
+            elif name in spec.dates:
+                fields[name] = parse_datetime(value) if value else None
+            else:
+                fields[name] = value if value is not None else ''
+        if spec.model is Post and not fields['updated']:
+            fields['updated'] = fields['pub_date']
+        objects.append(spec.model(**fields))
+    return objects
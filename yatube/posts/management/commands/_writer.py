@@ -0,0 +1,54 @@
+"""
+Процесс-писатель для benchmark_sqlite.
+
+Писатели - отдельные процессы, а не потоки: иначе они делили бы GIL с
+читателями и замер показывал бы интерпретатор, а не блокировки SQLite.
+Процессы запускаются методом spawn, поэтому модуль не импортирует
+модели на верхнем уровне: Django настраивается уже в процессе.
+"""
+import os
+import random
+import time
+
+
+def write_bursts(path, pragmas, burst, pause, number, post_ids, author_ids,
+                 done, results):
+    """
+    Пишет комментарии пачками по burst одним bulk_create в транзакции,
+    без сигналов, счетчиков и поиска. В results кладет ('ready', pid), а
+    после done - ('done', (задержки пачек в мс, ошибки)).
+    """
+    import django
+    from django.conf import settings
+
+    django.setup()
+    settings.DATABASES['default']['NAME'] = path
+    settings.SQLITE_PRAGMAS = pragmas
+
+    from django.db import OperationalError, connections, transaction
+
+    from posts.models import Comment
+
+    rnd = random.Random(number)
+    latencies, errors = [], []
+    results.put(('ready', os.getpid()))
+    try:
+        while not done.is_set():
+            comments = [
+                Comment(post_id=rnd.choice(post_ids),
+                        author_id=rnd.choice(author_ids),
+                        text='Комментарий из бенчмарка')
+                for _ in range(burst)
+            ]
+            started = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    Comment.objects.bulk_create(comments)
+            except OperationalError as error:
+                errors.append(str(error))
+            else:
+                latencies.append((time.perf_counter() - started) * 1000)
+            done.wait(pause)
+    finally:
+        connections.close_all()
+        results.put(('done', (latencies, errors)))
@@ -0,0 +1,181 @@
+import http.client
+import json
+import socket
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.middleware.csrf import CSRF_TOKEN_LENGTH
+from django.urls import reverse
+
+from core.asgi import WsgiToAsgi
+
+from ._seed import add_seed_arguments, seed, temporary_database
+from ._servers import AsgiServer, WsgiServer
+from .benchmark_views import _git_revision, _percentile
+
+SERVERS = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает WSGI с пулом воркеров и ASGI-обертку под '
+            'медленными клиентами: пока медленные клиенты по кусочку '
+            'отправляют запросы, быстрые клиенты запрашивают ленту, '
+            'и замеряется время их ответов')
+
+    def add_arguments(self, parser):
+        add_seed_arguments(parser)
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Потоков для представлений, одинаково для обоих серверов'
+        )
+        parser.add_argument('--slow-clients', type=int, default=8)
+        parser.add_argument('--fast-clients', type=int, default=4)
+        parser.add_argument(
+            '--duration', type=float, default=3.0,
+            help='За сколько секунд медленный клиент отправляет запрос'
+        )
+        parser.add_argument(
+            '--server', action='append', choices=SERVERS, dest='servers',
+            help='Замерить только этот сервер (можно повторять)'
+        )
+        parser.add_argument(
+            '--output', help='Записать JSON в файл, а не в stdout'
+        )
+        parser.add_argument(
+            '--current-db', action='store_true',
+            help='Не генерировать данные, а взять текущую базу'
+        )
+
+    def handle(self, *args, **options):
+        if options['current_db']:
+            results = self.run(options)
+        else:
+            with temporary_database():
+                seed(**options)
+                results = self.run(options)
+        output = json.dumps(results, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(
+                f'Результаты записаны в {options["output"]}'
+            ))
+        else:
+            self.stdout.write(output)
+
+    def run(self, options):
+        servers = {
+            'wsgi': lambda: WsgiServer(get_wsgi_application(),
+                                       options['workers']),
+            'asgi': lambda: AsgiServer(WsgiToAsgi(get_wsgi_application(),
+                                                  options['workers'])),
+        }
+        return {
+            'meta': {
+                'revision': _git_revision(),
+                'workers': options['workers'],
+                'slow_clients': options['slow_clients'],
+                'fast_clients': options['fast_clients'],
+                'duration': options['duration'],
+            },
+            'servers': {
+                name: self.measure(create(), options)
+                for name, create in servers.items()
+                if not options['servers'] or name in options['servers']
+            },
+        }
+
+    def measure(self, server, options):
+        server.start()
+        try:
+            fast_path = reverse('posts:index')
+            self.fast_request(server.port, fast_path)
+            slow_statuses, latencies = [], []
+            slow = [
+                threading.Thread(target=self.slow_client, args=(
+                    server.port, options['duration'], slow_statuses
+                ))
+                for _ in range(options['slow_clients'])
+            ]
+            done = threading.Event()
+            fast = [
+                threading.Thread(target=self.fast_client, args=(
+                    server.port, fast_path, done, latencies
+                ))
+                for _ in range(options['fast_clients'])
+            ]
+            started = time.perf_counter()
+            for thread in slow + fast:
+                thread.start()
+            for thread in slow:
+                thread.join()
+            done.set()
+            for thread in fast:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            server.stop()
+        result = {
+            'fast_requests': len(latencies),
+            'requests_per_second': round(len(latencies) / elapsed, 2),
+            'slow_statuses': sorted(set(filter(None, slow_statuses))),
+            'slow_failed': slow_statuses.count(None),
+        }
+        if latencies:
+            result['latency_ms'] = {
+                'min': round(min(latencies), 3),
+                'median': round(statistics.median(latencies), 3),
+                'p95': round(_percentile(latencies, 95), 3),
+                'max': round(max(latencies), 3),
+            }
+        return result
+
+    def fast_request(self, port, path):
+        connection = http.client.HTTPConnection('127.0.0.1', port,
+                                                timeout=60)
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+    def fast_client(self, port, path, done, latencies):
+        while not done.is_set():
+            started = time.perf_counter()
+            self.fast_request(port, path)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    def slow_client(self, port, duration, statuses, pieces=20):
+        """
+        Отправляет POST формы входа по кусочку за duration секунд:
+        так ведет себя клиент на медленном канале, загружающий файл.
+        Токен CSRF подходит к cookie, поэтому Django читает тело целиком.
+        """
+        token = 'a' * CSRF_TOKEN_LENGTH
+        body = (f'csrfmiddlewaretoken={token}&username=slow&password='
+                + 'x' * 4096).encode()
+        request = (
+            f'POST {reverse("users:login")} HTTP/1.1\r\n'
+            f'Host: 127.0.0.1\r\n'
+            f'Cookie: {settings.CSRF_COOKIE_NAME}={token}\r\n'
+            f'Content-Type: application/x-www-form-urlencoded\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n'
+        ).encode() + body
+        size = -(-len(request) // pieces)
+        try:
+            with socket.create_connection(('127.0.0.1', port),
+                                          timeout=60) as sock:
+                for start in range(0, len(request), size):
+                    sock.sendall(request[start:start + size])
+                    time.sleep(duration / pieces)
+                status_line = sock.makefile('rb').readline().split()
+        except OSError:
+            status_line = []
+        statuses.append(int(status_line[1]) if len(status_line) > 1
+                        else None)
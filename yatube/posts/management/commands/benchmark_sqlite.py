@@ -0,0 +1,213 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.test.utils import override_settings
+
+from posts.models import Comment, Post
+
+from ._seed import add_seed_arguments, seed, temporary_database
+from ._writer import write_bursts
+from .benchmark_views import _git_revision, _percentile
+
+# Режим: (прагмы SQLite или None - SQLITE_PRAGMAS из настроек,
+# читать ли через соединение только для чтения READ_REPLICA).
+MODES = {
+    'baseline': ({'journal_mode': 'delete'}, False),
+    'wal': (None, False),
+    'wal+replica': (None, True),
+}
+
+
+@contextmanager
+def read_replica(path):
+    """
+    На время замера READ_REPLICA - файл path только для чтения, при
+    path = None соединения для чтения нет и чтения идут в default.
+    """
+    alias = settings.READ_REPLICA
+    saved = settings.DATABASES.pop(alias, None)
+    if path is not None:
+        settings.DATABASES[alias] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': f'file:{path}?mode=ro',
+        }
+    try:
+        yield
+    finally:
+        settings.DATABASES.pop(alias, None)
+        if saved is not None:
+            settings.DATABASES[alias] = saved
+
+
+def _summary(values):
+    if not values:
+        return None
+    return {
+        'min': round(min(values), 3),
+        'median': round(statistics.median(values), 3),
+        'p95': round(_percentile(values, 95), 3),
+        'max': round(max(values), 3),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Замеряет чтение ленты из нескольких потоков, пока отдельные '
+            'процессы пачками пишут комментарии, в SQLite с журналом по '
+            'умолчанию, с прагмами SQLITE_PRAGMAS (WAL) и с чтением через '
+            'соединение только для чтения')
+
+    def add_arguments(self, parser):
+        add_seed_arguments(parser)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=1)
+        parser.add_argument(
+            '--burst', type=int, default=200,
+            help='Комментариев в одной транзакции записи'
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help='Пауза между пачками записи, секунд'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=5.0,
+            help='Сколько секунд длится замер каждого режима'
+        )
+        parser.add_argument(
+            '--mode', action='append', choices=MODES, dest='modes',
+            help='Замерить только этот режим (можно повторять)'
+        )
+        parser.add_argument(
+            '--output', help='Записать JSON в файл, а не в stdout'
+        )
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('Бенчмарк только для SQLite.')
+        # База - файл: WAL и блокировки базы в памяти устроены иначе.
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'benchmark.sqlite3')
+            with read_replica(None), temporary_database(name=path):
+                seed(**options)
+                results = self.run(path, options)
+        output = json.dumps(results, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(
+                f'Результаты записаны в {options["output"]}'
+            ))
+        else:
+            self.stdout.write(output)
+
+    def run(self, path, options):
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        author_ids = list(Post.objects.values_list('author_id', flat=True)
+                          .distinct())
+        return {
+            'meta': {
+                'revision': _git_revision(),
+                'sqlite': sqlite3.sqlite_version,
+                'pragmas': settings.SQLITE_PRAGMAS,
+                'readers': options['readers'],
+                'writers': options['writers'],
+                'burst': options['burst'],
+                'pause': options['pause'],
+                'duration': options['duration'],
+            },
+            'modes': {
+                name: self.measure(path, pragmas, replica, post_ids,
+                                   author_ids, options)
+                for name, (pragmas, replica) in MODES.items()
+                if not options['modes'] or name in options['modes']
+            },
+        }
+
+    def measure(self, path, pragmas, replica, post_ids, author_ids, options):
+        if pragmas is None:
+            pragmas = settings.SQLITE_PRAGMAS
+        # Прагмы выставляются при открытии соединения: закрываем все, и
+        # первое новое соединение переключает журнал файла.
+        connections.close_all()
+        with override_settings(SQLITE_PRAGMAS=pragmas), \
+                read_replica(path if replica else None):
+            with connections['default'].cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+            connections.close_all()
+            context = multiprocessing.get_context('spawn')
+            done, results = context.Event(), context.Queue()
+            writers = [
+                context.Process(target=write_bursts, args=(
+                    path, pragmas, options['burst'], options['pause'],
+                    number, post_ids, author_ids, done, results,
+                ))
+                for number in range(options['writers'])
+            ]
+            for writer in writers:
+                writer.start()
+            # Замер начинается, когда все писатели настроили Django.
+            for _ in writers:
+                results.get()
+            reads, read_errors = [], []
+            threads = [
+                threading.Thread(target=self.reader,
+                                 args=(done, reads, read_errors))
+                for _ in range(options['readers'])
+            ]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            time.sleep(options['duration'])
+            done.set()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            bursts, write_errors = [], []
+            for _ in writers:
+                _, (latencies, errors) = results.get()
+                bursts += latencies
+                write_errors += errors
+            for writer in writers:
+                writer.join()
+        return {
+            'journal_mode': journal_mode,
+            'reads': len(reads),
+            'reads_per_second': round(len(reads) / elapsed, 2),
+            'read_latency_ms': _summary(reads),
+            'read_errors': len(read_errors),
+            'writes_per_second': round(
+                len(bursts) * options['burst'] / elapsed, 2
+            ),
+            'write_burst_ms': _summary(bursts),
+            'write_errors': len(write_errors),
+        }
+
+    def reader(self, done, latencies, errors):
+        """Читает первую страницу ленты с комментариями, как index."""
+        try:
+            while not done.is_set():
+                started = time.perf_counter()
+                try:
+                    posts = list(
+                        Post.objects.for_feed()[:settings.POSTS_PER_PAGE]
+                    )
+                    Comment.objects.latest_per_post(
+                        [post.pk for post in posts if post.comments_count],
+                        settings.POSTS_FEED_COMMENTS,
+                    )
+                except OperationalError as error:
+                    errors.append(str(error))
+                    continue
+                latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            connections.close_all()
@@ -0,0 +1,191 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from itertools import count
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+from ._seed import add_seed_arguments, busiest, seed, temporary_database
+
+User = get_user_model()
+
+VIEWS = (
+    'index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+    'post_create', 'add_comment',
+)
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'), cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время ответа, число запросов к БД и размер страницы '
+            'для представлений posts на сгенерированных данных и выводит '
+            'результат в JSON')
+
+    def add_arguments(self, parser):
+        add_seed_arguments(parser)
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Сколько запросов делать к каждому представлению'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=3,
+            help='Сколько запросов сделать до замеров'
+        )
+        parser.add_argument(
+            '--pages', type=int, default=3,
+            help='По скольким страницам лент ходить по кругу'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом'
+        )
+        parser.add_argument(
+            '--view', action='append', choices=VIEWS, dest='views',
+            help='Замерить только это представление (можно повторять)'
+        )
+        parser.add_argument(
+            '--output', help='Записать JSON в файл, а не в stdout'
+        )
+        parser.add_argument(
+            '--current-db', action='store_true',
+            help=('Не генерировать данные, а взять текущую базу '
+                  '(записи бенчмарка откатываются)')
+        )
+
+    def handle(self, *args, **options):
+        if options['current_db']:
+            results = self.run(options)
+        else:
+            with temporary_database():
+                seed(**options)
+                results = self.run(options)
+        output = json.dumps(results, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(
+                f'Результаты записаны в {options["output"]}'
+            ))
+        else:
+            self.stdout.write(output)
+
+    def run(self, options):
+        cache.clear()
+        with transaction.atomic():
+            results = {
+                'meta': self.meta(options),
+                'views': {
+                    name: self.measure(request, options)
+                    for name, request in self.scenarios(options).items()
+                    if not options['views'] or name in options['views']
+                },
+            }
+            transaction.set_rollback(True)
+        cache.clear()
+        return results
+
+    def meta(self, options):
+        return {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'dataset': {
+                model.__name__.lower(): model.objects.count()
+                for model in (User, Group, Post, Comment, Follow)
+            },
+            'requests': options['requests'],
+            'cold_cache': options['cold'],
+        }
+
+    def scenarios(self, options):
+        """Функции, каждая из которых делает один запрос к представлению."""
+        author = User.objects.get(pk=busiest(User, 'posts'))
+        reader = User.objects.get(pk=busiest(User, 'follower'))
+        group = Group.objects.get(pk=busiest(Group, 'posts'))
+        post_id = busiest(Post, 'comments')
+        anonymous, client = Client(), Client()
+        client.force_login(reader)
+        pages = count()
+
+        def page():
+            return {'page': next(pages) % options['pages'] + 1}
+
+        return {
+            'index': lambda: anonymous.get(reverse('posts:index'), page()),
+            'group_posts': lambda: anonymous.get(
+                reverse('posts:group_list', args=(group.slug,)), page()),
+            'profile': lambda: client.get(
+                reverse('posts:profile', args=(author.username,)), page()),
+            'post_detail': lambda: anonymous.get(
+                reverse('posts:post_detail', args=(post_id,))),
+            'follow_index': lambda: client.get(
+                reverse('posts:follow_index'), page()),
+            'post_create': lambda: client.post(
+                reverse('posts:post_create'),
+                {'text': 'Пост из бенчмарка', 'group': group.pk}),
+            'add_comment': lambda: client.post(
+                reverse('posts:add_comment', args=(post_id,)),
+                {'text': 'Комментарий из бенчмарка'}),
+        }
+
+    def measure(self, request, options):
+        for _ in range(options['warmup']):
+            request()
+        latencies, queries, sizes, statuses = [], [], [], set()
+        for _ in range(options['requests']):
+            if options['cold']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = request()
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context))
+            sizes.append(len(response.content))
+            statuses.add(response.status_code)
+        return {
+            'status': sorted(statuses),
+            'latency_ms': {
+                'min': round(min(latencies), 3),
+                'median': round(statistics.median(latencies), 3),
+                'p95': round(_percentile(latencies, 95), 3),
+                'max': round(max(latencies), 3),
+            },
+            'queries': {
+                'min': min(queries),
+                'mean': round(statistics.mean(queries), 2),
+                'max': max(queries),
+            },
+            'bytes': {
+                'min': min(sizes),
+                'mean': round(statistics.mean(sizes)),
+                'max': max(sizes),
+            },
+        }
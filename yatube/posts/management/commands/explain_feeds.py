@@ -0,0 +1,86 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts.feed import follow_feed
+from posts.models import Comment, Follow, Group, Post
+
+from ._seed import add_seed_arguments, busiest, seed, temporary_database
+
+User = get_user_model()
+
+INDEXED_MODELS = (Post, Comment, Follow)
+
+
+class Command(BaseCommand):
+    help = ('Показывает планы запросов лент с индексами из Meta.indexes '
+            'и без них на сгенерированных данных; с --current-db - только '
+            'планы на текущей базе')
+
+    def add_arguments(self, parser):
+        add_seed_arguments(parser)
+        parser.add_argument(
+            '--current-db', action='store_true',
+            help=('Не генерировать данные, а показать планы на текущей '
+                  'базе; индексы не удаляются, сравнения без них нет')
+        )
+
+    def handle(self, *args, **options):
+        if options['current_db']:
+            self.print_plans('С индексами')
+            return
+        with temporary_database():
+            seed(**options)
+            self.report()
+
+    def feed_queries(self):
+        per_page = settings.POSTS_PER_PAGE
+        author_id = busiest(User, 'posts')
+        reader_id = busiest(User, 'follower')
+        post_id = busiest(Post, 'comments')
+        group_id = busiest(Group, 'posts')
+        return {
+            'index': Post.objects.for_feed()[:per_page],
+            'group_posts': Post.objects.for_feed().filter(
+                group_id=group_id)[:per_page],
+            'profile': Post.objects.for_feed().filter(
+                author_id=author_id)[:per_page],
+            'profile: подписка': Follow.objects.filter(
+                user_id=reader_id, author_id=author_id),
+            'follow_index': follow_feed(User(pk=reader_id)).entries(
+            ).values_list('pub_date', 'post_id')[:per_page],
+            'post_detail: комментарии': Comment.objects.filter(
+                post_id=post_id).select_related('author')[:per_page],
+            'fan-out: подписчики автора': Follow.objects.filter(
+                author_id=author_id).values_list('user_id', flat=True),
+        }
+
+    def print_plans(self, title):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name, queryset in self.feed_queries().items():
+            started = time.perf_counter()
+            list(queryset)
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(self.style.SUCCESS(f'{name}: {elapsed:.2f} мс'))
+            for line in queryset.explain().splitlines():
+                self.stdout.write(f'    {line}')
+
+    def report(self):
+        """Планы с индексами и без них; только для временной базы."""
+        self.print_plans('С индексами')
+        indexes = [(model, index) for model in INDEXED_MODELS
+                   for index in model._meta.indexes]
+        # Индексы удаляются с фиксацией, а не в откатываемой транзакции:
+        # иначе sqlite3 продолжает выполнять закешированные планы.
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.remove_index(model, index)
+        try:
+            self.print_plans('Без индексов')
+        finally:
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.add_index(model, index)
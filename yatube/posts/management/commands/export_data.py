@@ -0,0 +1,38 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from ._transfer import (SERIALIZERS, Checkpoint, Throughput,
+                        add_transfer_arguments, data_path, export_table)
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в файлы '
+            'JSON Lines или CSV, по файлу на таблицу')
+
+    def add_arguments(self, parser):
+        add_transfer_arguments(parser)
+
+    def handle(self, *args, **options):
+        directory, data_format = options['directory'], options['format']
+        os.makedirs(directory, exist_ok=True)
+        checkpoint = Checkpoint(directory, 'export', options['resume'])
+        throughput = Throughput()
+        for table in options['tables']:
+            last_pk = checkpoint.get(table)
+            # Без --resume файл пишется заново, с ним - дописывается.
+            mode = 'a' if last_pk else 'w'
+            path = data_path(directory, table, data_format)
+
+            def on_chunk(rows, last_pk, seconds, table=table):
+                checkpoint.save(table, last_pk)
+                throughput.measure(table, rows, seconds)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{table}: pk <= {last_pk}')
+
+            with open(path, mode, encoding='utf-8', newline='') as file:
+                export_table(table, file, SERIALIZERS[data_format],
+                             options['chunk_size'], last_pk, on_chunk)
+        checkpoint.finish()
+        for line in throughput.lines():
+            self.stdout.write(self.style.SUCCESS(line))
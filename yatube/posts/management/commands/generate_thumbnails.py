@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Строит недостающие и устаревшие миниатюры картинок постов, '
+            'например для постов, созданных до появления миниатюр')
+
+    def handle(self, *args, **options):
+        built = 0
+        posts = Post.objects.exclude(image='').only(
+            'image', 'thumbnail', 'renditions'
+        )
+        for post in posts.iterator():
+            if thumbnails.is_stale(post):
+                thumbnails.generate(post.pk, post.image.name)
+                built += 1
+        self.stdout.write(self.style.SUCCESS(f'Построено миниатюр: {built}'))
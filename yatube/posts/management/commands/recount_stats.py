@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount_all
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счетчики постов, комментариев '
+            'и подписок')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            stats, posts = recount_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано: пользователей - {stats}, постов - {posts}'
+        ))
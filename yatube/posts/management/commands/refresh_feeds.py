@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts.feed import refresh_popular
+
+
+class Command(BaseCommand):
+    help = ('Переводит авторов между раскладкой постов по лентам подписок '
+            'и чтением по FEED_FANOUT_LIMIT и дозаполняет ленты '
+            'подписчиков бывших популярных авторов. Запускается по '
+            'расписанию, например раз в FEED_POPULAR_TIMEOUT')
+
+    def handle(self, *args, **options):
+        promoted, demoted = refresh_popular()
+        self.stdout.write(self.style.SUCCESS(
+            f'Популярных авторов добавлено: {promoted}, '
+            f'снято: {demoted}'
+        ))
@@ -0,0 +1,50 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:05
+
+from django.db import migrations
+
+FTS_TABLE = 'posts_search_fts'
+
+OLD_TABLE = 'posts_search_fts_old'
+
+
+def _recreate(schema_editor, columns, copy, where=''):
+    # Без FTS5 таблицы нет (0013_search_index): поиск идет по SearchPosting.
+    connection = schema_editor.connection
+    if (connection.vendor != 'sqlite'
+            or FTS_TABLE not in connection.introspection.table_names()):
+        return
+    schema_editor.execute(f'ALTER TABLE {FTS_TABLE} RENAME TO {OLD_TABLE}')
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} "
+        f"USING fts5({columns}, tokenize = 'unicode61')"
+    )
+    schema_editor.execute(
+        f'INSERT INTO {FTS_TABLE} (rowid, text, comments{copy[0]}) '
+        f'SELECT rowid, text, comments{copy[1]} FROM {OLD_TABLE}{where}'
+    )
+    schema_editor.execute(f'DROP TABLE {OLD_TABLE}')
+
+
+def comment_rows(apps, schema_editor):
+    # Прежние строки - посты с термами всех комментариев - переносятся
+    # как есть, чтобы поиск не пустел. Строки по комментариям появятся
+    # после `python manage.py rebuild_search_index`.
+    _recreate(schema_editor, 'post_id UNINDEXED, text, comments',
+              (', post_id', ', rowid'))
+
+
+def post_rows(apps, schema_editor):
+    # Строки комментариев (rowid < 0) в прежней схеме не нужны; термы
+    # комментариев вернет rebuild_search_index.
+    _recreate(schema_editor, 'text, comments', ('', ''), ' WHERE rowid > 0')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_feed_keyset'),
+    ]
+
+    operations = [
+        migrations.RunPython(comment_rows, post_rows),
+    ]
@@ -1,12 +1,37 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connections, models
+from django.db.models import F, OuterRef, Q, Subquery, Window
 from django.db.models.constraints import UniqueConstraint
+from django.db.models.functions import RowNumber
 
 from core.models import CreateModel
 
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """
+        Посты для лент (index, group_posts, profile, follow_index).
+        Автор и группа подтягиваются одним JOIN, из них выбираются
+        только поля, которые выводит includes/post_article.html.
+        """
+        return self.select_related('author', 'group').only(
+            'text',
+            'pub_date',
+            'updated',
+            'image',
+            'thumbnail',
+            'renditions',
+            'comments_count',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+            'group__title',
+            'group__slug',
+        )
+
+
 class Group(models.Model):
     """
     Модель для хранения групп.
@@ -51,10 +76,21 @@ class Post(models.Model):
         текст поста
     pub_date: DateTimeField
         дата публикации поста
+    updated: DateTimeField
+        дата последнего изменения, входит в ключ кеша фрагмента поста
     author: ForeignKey
         автор поста
     group: ForeignKey
         группа поста
+    comments_count: PositiveIntegerField
+        денормализованный счетчик комментариев, см. posts.counters
+    thumbnail: ImageField
+        миниатюра картинки для лент, строится в фоне, см. posts.thumbnails
+    renditions: TextField
+        JSON с вариантами миниатюры по форматам и ширинам для srcset
+    loaded_group_id: int
+        группа поста при загрузке из базы: при переносе поста меняются
+        ленты обеих групп
     """
 
     text = models.TextField(
@@ -65,6 +101,10 @@ class Post(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -86,15 +126,120 @@ class Post(models.Model):
         blank=True,
         help_text='Вы можете загрузить изображение'
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев'
+    )
+    thumbnail = models.ImageField(
+        'Миниатюра',
+        upload_to='posts/thumbnails/',
+        blank=True,
+        editable=False,
+    )
+    renditions = models.TextField(
+        'Варианты миниатюры',
+        blank=True,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date'],
+                         name='post_author_pub_date_idx'),
+            # Частичный: посты без группы в индекс не попадают.
+            models.Index(fields=['group', '-pub_date'],
+                         name='post_group_pub_date_idx',
+                         condition=Q(group__isnull=False)),
+        ]
 
     def __str__(self):
         return f'{self.text[:15]}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        post.loaded_group_id = post.__dict__.get('group_id')
+        return post
+
+
+class CommentQuerySet(models.QuerySet):
+    def latest_per_post(self, post_ids, limit):
+        """
+        Последние limit комментариев каждого поста одним запросом,
+        username автора - через JOIN (comment.author_username).
+        Запрос выбирается по базе: в PostgreSQL - LATERAL с LIMIT на
+        каждый пост (при limit = 1 - DISTINCT ON), где есть оконные
+        функции - ROW_NUMBER() по post_id, иначе коррелированный
+        подзапрос. Возвращает словарь {post_id: [комментарии от новых
+        к старым]}.
+        """
+        comments = {}
+        if not post_ids or limit <= 0:
+            return comments
+        connection = connections[self.db]
+        recent = self.filter(post_id__in=post_ids).annotate(
+            author_username=F('author__username')
+        )
+        if limit == 1 and connection.features.can_distinct_on_fields:
+            rows = recent.order_by('post_id', '-created', '-id').distinct(
+                'post_id'
+            )
+        elif connection.vendor == 'postgresql':
+            rows = self._latest_lateral(connection, post_ids, limit)
+        elif connection.features.supports_over_clause:
+            ranked = recent.annotate(comment_rank=Window(
+                RowNumber(),
+                partition_by=[F('post_id')],
+                order_by=[F('created').desc(), F('id').desc()],
+            )).order_by()
+            sql, params = ranked.query.sql_with_params()
+            rows = self.raw(
+                f'SELECT * FROM ({sql}) ranked WHERE comment_rank <= %s '
+                f'ORDER BY post_id, comment_rank',
+                (*params, limit),
+            )
+        else:
+            # Без оконных функций - коррелированный подзапрос с LIMIT.
+            latest = self.filter(post_id=OuterRef('post_id')).order_by(
+                '-created', '-id'
+            ).values('pk')[:limit]
+            rows = recent.filter(pk__in=Subquery(latest)).order_by(
+                'post_id', '-created', '-id'
+            )
+        for comment in rows:
+            comments.setdefault(comment.post_id, []).append(comment)
+        return comments
+
+    def _latest_lateral(self, connection, post_ids, limit):
+        # Для каждого поста - свой проход по индексу (post, -created)
+        # с LIMIT, а не нумерация всех комментариев постов страницы.
+        qn = connection.ops.quote_name
+        meta, user_meta = self.model._meta, User._meta
+        table, pk = qn(meta.db_table), qn(meta.pk.column)
+        post, created, author = (qn(meta.get_field(name).column)
+                                 for name in ('post', 'created', 'author'))
+        username = qn(user_meta.get_field('username').column)
+        order = f'{created} DESC, {pk} DESC'
+        return self.raw(
+            f'SELECT latest.*, users.{username} AS author_username '
+            f'FROM unnest(%s) AS page(post_id) CROSS JOIN LATERAL ('
+            f'SELECT * FROM {table} WHERE {table}.{post} = page.post_id '
+            f'ORDER BY {order} LIMIT %s) AS latest '
+            f'JOIN {qn(user_meta.db_table)} AS users '
+            f'ON users.{qn(user_meta.pk.column)} = latest.{author} '
+            f'ORDER BY latest.{post}, latest.{created} DESC, '
+            f'latest.{pk} DESC',
+            (list(post_ids), limit),
+        )
+
 
 class Comment(CreateModel):
     post = models.ForeignKey(
@@ -114,10 +259,16 @@ class Comment(CreateModel):
         help_text='Место ввода комментария'
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['post', '-created'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return f'{self.text[:15]}'
@@ -142,8 +293,167 @@ class Follow(models.Model):
             UniqueConstraint(fields=['user', 'author'],
                              name='unique_subscription')
         ]
+        # Пару (user, author) индексирует уникальное ограничение, а этот
+        # индекс отдает подписчиков автора без обращения к таблице.
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
         verbose_name = 'Подписка(пользоваетль - автор)'
         verbose_name_plural = 'Подписки'
 
     def __str__(self):
         return f'{ self.user.username} - {self.author.username}'
+
+
+class AuthorStats(models.Model):
+    """
+    Денормализованные счетчики пользователя, см. posts.counters.
+    --------
+    Атрибуты
+    --------
+    user: OneToOneField
+        пользователь
+    posts_count: PositiveIntegerField
+        количество постов пользователя
+    followers_count: PositiveIntegerField
+        количество подписчиков
+    following_count: PositiveIntegerField
+        количество подписок
+    feed_on_read: BooleanField
+        посты автора подмешиваются в ленты подписок при чтении, а не
+        раскладываются при записи, см. posts.feed.refresh_popular
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        verbose_name='Подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок'
+    )
+    feed_on_read = models.BooleanField(
+        default=False,
+        verbose_name='Лента при чтении'
+    )
+
+    class Meta:
+        # Популярных авторов единицы: частичный индекс только по ним.
+        indexes = [
+            models.Index(fields=['feed_on_read'],
+                         name='stats_feed_on_read_idx',
+                         condition=Q(feed_on_read=True)),
+        ]
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+    def __str__(self):
+        return f'{self.user_id}'
+
+
+class FeedEntry(models.Model):
+    """
+    Материализованная лента подписок: строка на пару (подписчик, пост).
+    Заполняется при публикации поста (fan-out-on-write), дополняется
+    при подписке и очищается при отписке, см. posts.feed.
+    --------
+    Атрибуты
+    --------
+    user: ForeignKey
+        владелец ленты (подписчик)
+    post: ForeignKey
+        пост в ленте
+    author: ForeignKey
+        автор поста, нужен для очистки ленты при отписке
+    pub_date: DateTimeField
+        копия даты публикации поста для сортировки по индексу
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['user', 'post'],
+                             name='unique_feed_entry')
+        ]
+        indexes = [
+            # Страница ленты - диапазон этого индекса в порядке
+            # (-pub_date, -post) без сортировки.
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='feed_user_author_idx'),
+        ]
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Ленты подписок'
+
+    def __str__(self):
+        return f'{self.user_id} - {self.post_id}'
+
+
+class SearchPosting(models.Model):
+    """
+    Запись инвертированного индекса поиска, см. posts.search.
+    Используется, если в SQLite нет FTS5 или база не SQLite.
+    --------
+    Атрибуты
+    --------
+    term: CharField
+        основа слова
+    post: ForeignKey
+        пост, в тексте или комментариях которого встречается терм
+    weight: PositiveIntegerField
+        сколько раз встречается терм, вхождения в текст поста
+        считаются с весом POSTS_SEARCH_TEXT_WEIGHT
+    """
+
+    term = models.CharField(max_length=64, verbose_name='Терм')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пост'
+    )
+    weight = models.PositiveIntegerField(verbose_name='Вес')
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['term', 'post'],
+                             name='unique_search_posting')
+        ]
+        verbose_name = 'Запись поискового индекса'
+        verbose_name_plural = 'Поисковый индекс'
+
+    def __str__(self):
+        return f'{self.term} - {self.post_id}'
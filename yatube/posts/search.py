@@ -0,0 +1,353 @@
+"""
+Полнотекстовый поиск по постам и комментариям.
+
+Текст поста и его комментарии разбиваются на термы (posts.stemmer) и
+записываются в инвертированный индекс. В SQLite с FTS5 это виртуальная
+таблица posts_search_fts с ранжированием bm25, иначе - таблица
+SearchPosting с ранжированием tf-idf; выбор - POSTS_SEARCH_BACKEND.
+Индекс поста переписывается целиком при сохранении поста, а новый или
+удаленный комментарий меняет только свои термы: в FTS5 у каждого
+комментария своя строка, в SearchPosting веса сдвигаются F()-выражением
+(см. posts.signals). Полная перестройка -
+`python manage.py rebuild_search_index`.
+
+Найденные id постов кешируются, в ключ входит версия "search", которая
+меняется при любой записи в индекс.
+"""
+import hashlib
+import math
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+
+from posts.cache import bump_version, get_version
+from posts.models import Comment, Post, SearchPosting
+from posts.stemmer import tokenize
+
+SEARCH = 'search'
+
+FTS_TABLE = 'posts_search_fts'
+
+_fts_tables = {}
+
+_deleting = threading.local()
+
+
+def _fts_table_exists():
+    name = connection.settings_dict['NAME']
+    if name not in _fts_tables:
+        _fts_tables[name] = connection.vendor == 'sqlite' and (
+            FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_tables[name]
+
+
+def _terms(text):
+    return [term[:64] for term in tokenize(text)]
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+class Fts5Index:
+    """
+    Индекс в виртуальной таблице FTS5. У поста строка с rowid = id поста
+    и колонкой text, у каждого комментария - строка с rowid = -id
+    комментария и колонкой comments; колонка post_id не индексируется.
+    """
+
+    def _delete(self, cursor, post_ids):
+        if not post_ids:
+            return
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN '
+            f'({_placeholders(post_ids)})',
+            post_ids,
+        )
+        # Строки комментариев ищутся по rowid: фильтр по post_id
+        # перебрал бы всю таблицу.
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ('
+            f'SELECT -id FROM {Comment._meta.db_table} '
+            f'WHERE post_id IN ({_placeholders(post_ids)}))',
+            post_ids,
+        )
+
+    def _insert_comments(self, cursor, comments):
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, post_id, text, comments) '
+            f"VALUES (%s, %s, '', %s)",
+            [(-comment_id, post_id, ' '.join(terms))
+             for post_id, comment_id, terms in comments],
+        )
+
+    def write(self, documents):
+        with connection.cursor() as cursor:
+            self._delete(cursor, [post_id for post_id, _, _ in documents])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, post_id, text, comments) '
+                f"VALUES (%s, %s, %s, '')",
+                [(post_id, post_id, ' '.join(text))
+                 for post_id, text, _ in documents],
+            )
+            self._insert_comments(cursor, [
+                (post_id, comment_id, terms)
+                for post_id, _, comments in documents
+                for comment_id, terms in comments
+            ])
+
+    def add_comments(self, comments):
+        with connection.cursor() as cursor:
+            self._insert_comments(cursor, comments)
+
+    def remove_comments(self, comments):
+        rowids = [-comment_id for _, comment_id, _ in comments]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN '
+                f'({_placeholders(rowids)})',
+                rowids,
+            )
+
+    def remove(self, post_ids):
+        with connection.cursor() as cursor:
+            self._delete(cursor, post_ids)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def search(self, terms, limit):
+        # Термы поста разнесены по строкам текста и комментариев, поэтому
+        # каждый терм ищется отдельно, а пост должен найтись по всем.
+        # Термы - только буквы и цифры, в кавычках они не станут
+        # операторами FTS5.
+        # bm25() нельзя звать в подзапросе, а скрытую колонку rank -
+        # можно; веса колонок задает условие rank MATCH.
+        weights = f'bm25(0.0, {float(settings.POSTS_SEARCH_TEXT_WEIGHT)}, 1.0)'
+        matches = ' UNION ALL '.join(
+            f'SELECT post_id, {number} AS term, rank FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rank MATCH %s'
+            for number in range(len(terms))
+        )
+        params = [value for term in terms for value in (f'"{term}"', weights)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT post_id FROM ({matches}) GROUP BY post_id '
+                f'HAVING COUNT(DISTINCT term) = %s '
+                f'ORDER BY SUM(rank), post_id DESC LIMIT %s',
+                (*params, len(terms), limit),
+            )
+            return [post_id for post_id, in cursor.fetchall()]
+
+
+class TableIndex:
+    """Индекс в таблице SearchPosting: одна строка на пару терм - пост."""
+
+    def write(self, documents):
+        self.remove([post_id for post_id, _, _ in documents])
+        text_weight = settings.POSTS_SEARCH_TEXT_WEIGHT
+        postings = []
+        for post_id, text, comments in documents:
+            weights = Counter(
+                term for _, terms in comments for term in terms
+            )
+            for term, count in Counter(text).items():
+                weights[term] += count * text_weight
+            postings.extend(
+                SearchPosting(term=term, post_id=post_id, weight=weight)
+                for term, weight in weights.items()
+            )
+        SearchPosting.objects.bulk_create(postings)
+
+    @staticmethod
+    def _counts(comments):
+        """{id поста: {сколько раз: [термы]}} по термам комментариев."""
+        counts = defaultdict(Counter)
+        for post_id, _, terms in comments:
+            counts[post_id].update(terms)
+        return {
+            post_id: _by_count(terms) for post_id, terms in counts.items()
+        }
+
+    def _shift(self, post_id, by_count, sign):
+        for count, terms in by_count.items():
+            SearchPosting.objects.filter(
+                post_id=post_id, term__in=terms
+            ).update(weight=F('weight') + sign * count)
+
+    def add_comments(self, comments):
+        postings = []
+        for post_id, by_count in self._counts(comments).items():
+            existing = set(SearchPosting.objects.filter(
+                post_id=post_id,
+                term__in=[term for terms in by_count.values()
+                          for term in terms],
+            ).values_list('term', flat=True))
+            self._shift(post_id, {
+                count: [term for term in terms if term in existing]
+                for count, terms in by_count.items()
+            }, 1)
+            postings.extend(
+                SearchPosting(term=term, post_id=post_id, weight=count)
+                for count, terms in by_count.items()
+                for term in terms if term not in existing
+            )
+        SearchPosting.objects.bulk_create(postings)
+
+    def remove_comments(self, comments):
+        counts = self._counts(comments)
+        for post_id, by_count in counts.items():
+            self._shift(post_id, by_count, -1)
+        SearchPosting.objects.filter(post_id__in=counts, weight=0).delete()
+
+    def remove(self, post_ids):
+        if post_ids:
+            SearchPosting.objects.filter(post_id__in=post_ids).delete()
+
+    def clear(self):
+        SearchPosting.objects.all().delete()
+
+    def search(self, terms, limit):
+        postings = SearchPosting.objects.filter(term__in=terms).order_by()
+        frequencies = dict(
+            postings.values_list('term').annotate(total=Count('pk'))
+        )
+        if len(frequencies) < len(terms):
+            return []
+        posts_total = Post.objects.count()
+        idf = Case(
+            *[When(term=term, then=Value(math.log(1 + posts_total / total)))
+              for term, total in frequencies.items()],
+            output_field=FloatField(),
+        )
+        return list(
+            postings.values('post_id').annotate(
+                matched=Count('term'),
+                rank=Sum(F('weight') * idf, output_field=FloatField()),
+            ).filter(matched=len(terms)).order_by(
+                '-rank', '-post_id'
+            ).values_list('post_id', flat=True)[:limit]
+        )
+
+
+def _by_count(counter):
+    by_count = defaultdict(list)
+    for term, count in counter.items():
+        by_count[count].append(term)
+    return by_count
+
+
+INDEXES = {
+    'fts5': Fts5Index,
+    'table': TableIndex,
+}
+
+
+def get_index():
+    backend = settings.POSTS_SEARCH_BACKEND
+    if backend == 'auto':
+        backend = 'fts5' if _fts_table_exists() else 'table'
+    return INDEXES[backend]()
+
+
+def _documents(post_ids):
+    texts = dict(Post.objects.filter(pk__in=post_ids).values_list(
+        'pk', 'text'
+    ))
+    comments = defaultdict(list)
+    for post_id, comment_id, text in Comment.objects.filter(
+        post_id__in=texts
+    ).values_list('post_id', 'pk', 'text'):
+        comments[post_id].append((comment_id, _terms(text)))
+    return [(post_id, _terms(text), comments[post_id])
+            for post_id, text in texts.items()]
+
+
+def index_posts(post_ids):
+    get_index().write(_documents(post_ids))
+    bump_version(SEARCH)
+
+
+def post_saved(post, created):
+    if created:
+        get_index().write([(post.pk, _terms(post.text), [])])
+        bump_version(SEARCH)
+    else:
+        index_posts([post.pk])
+
+
+def _deleting_posts():
+    if not hasattr(_deleting, 'post_ids'):
+        _deleting.post_ids = set()
+    return _deleting.post_ids
+
+
+def post_deleting(post_id):
+    """
+    Пост удаляется: его строки убираются, пока комментарии еще в базе,
+    а комментарии, удаляемые каскадом, индекс по одному не меняют.
+    """
+    _deleting_posts().add(post_id)
+    get_index().remove([post_id])
+
+
+def post_deleted(post_id):
+    _deleting_posts().discard(post_id)
+    bump_version(SEARCH)
+
+
+def _comment_terms(comments):
+    return [(comment.post_id, comment.pk, _terms(comment.text))
+            for comment in comments
+            if comment.post_id not in _deleting_posts()]
+
+
+def comments_added(comments):
+    """Добавляет в индекс термы новых комментариев."""
+    comments = _comment_terms(comments)
+    if comments:
+        get_index().add_comments(comments)
+        bump_version(SEARCH)
+
+
+def comments_removed(comments):
+    """Убирает из индекса термы удаленных комментариев."""
+    comments = _comment_terms(comments)
+    if comments:
+        get_index().remove_comments(comments)
+        bump_version(SEARCH)
+
+
+def search_posts(query):
+    """
+    id постов, в тексте или комментариях которых есть все слова запроса,
+    по убыванию релевантности (не больше POSTS_SEARCH_MAX_RESULTS).
+    """
+    terms = list(dict.fromkeys(_terms(query)))[
+        :settings.POSTS_SEARCH_MAX_TERMS
+    ]
+    if not terms:
+        return []
+    digest = hashlib.md5(' '.join(terms).encode()).hexdigest()
+    return cache.get_or_set(
+        f'search:{get_version(SEARCH)}:{digest}',
+        lambda: get_index().search(terms, settings.POSTS_SEARCH_MAX_RESULTS),
+        settings.POSTS_CACHE_TIMEOUT,
+    )
+
+
+def rebuild(chunk_size=500):
+    """Строит индекс заново по всем постам. Возвращает число постов."""
+    index = get_index()
+    index.clear()
+    post_ids = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(post_ids), chunk_size):
+        index.write(_documents(post_ids[start:start + chunk_size]))
+    bump_version(SEARCH)
+    return len(post_ids)
@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from posts import counters, feed, search, thumbnails
+from posts.cache import (COMMENTS, POSTS, author_version_name,
+                         bump_post_lists, bump_version, follow_version_name,
+                         group_version_name)
+from posts.models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Поля пользователя, которые ленты выводят как имя автора.
+AUTHOR_NAME_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if created:
+        # Строка счетчиков заводится сразу: первый пост и первая подписка
+        # сдвигают ее F()-выражением, без пересчета COUNT(*).
+        if not raw:
+            AuthorStats.objects.create(user=instance)
+    elif update_fields is None or AUTHOR_NAME_FIELDS & set(update_fields):
+        # Вход пишет только last_login, ленты от этого не меняются.
+        bump_version(author_version_name(instance.pk))
+        bump_version(POSTS)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if not created:
+        bump_version(group_version_name(instance.pk))
+        bump_version(POSTS)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    bump_version(POSTS)
+    bump_post_lists(instance.author_id, instance.group_id,
+                    getattr(instance, 'loaded_group_id', None))
+    thumbnails.schedule(instance)
+    search.post_saved(instance, created)
+    if created:
+        counters.shift_author(instance.author_id, 'posts_count', 1)
+        feed.fan_out(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    search.post_deleting(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_version(POSTS)
+    bump_post_lists(instance.author_id, instance.group_id)
+    counters.shift_author(instance.author_id, 'posts_count', -1)
+    search.post_deleted(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.shift_comments(instance.post_id, 1)
+        search.comments_added([instance])
+        bump_version(COMMENTS)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.shift_comments(instance.post_id, -1)
+    search.comments_removed([instance])
+    bump_version(COMMENTS)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.shift_author(instance.author_id, 'followers_count', 1)
+        counters.shift_author(instance.user_id, 'following_count', 1)
+        feed.backfill(instance.user_id, instance.author_id)
+        bump_version(follow_version_name(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.shift_author(instance.author_id, 'followers_count', -1)
+    counters.shift_author(instance.user_id, 'following_count', -1)
+    feed.trim(instance.user_id, instance.author_id)
+    bump_version(follow_version_name(instance.user_id))
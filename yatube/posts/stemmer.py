@@ -0,0 +1,124 @@
+"""
+Разбиение текста на термы для поиска (posts.search).
+
+Русские слова приводятся к основе по алгоритму Snowball (Porter) для
+русского языка, остальные слова только переводятся в нижний регистр.
+"""
+import re
+from functools import lru_cache
+
+VOWELS = 'аеиоуыэюя'
+
+WORD_RE = re.compile(r'\w+')
+
+CYRILLIC_RE = re.compile('[а-я]')
+
+STOP_WORDS = frozenset((
+    'а', 'б', 'бы', 'в', 'во', 'вот', 'да', 'для', 'до', 'же', 'за', 'и',
+    'из', 'или', 'к', 'ко', 'ли', 'на', 'не', 'ни', 'но', 'о', 'об', 'от',
+    'по', 'под', 'с', 'со', 'то', 'у', 'уж', 'что', 'это', 'я', 'ты',
+    'он', 'она', 'оно', 'мы', 'вы', 'они', 'как', 'так', 'the', 'a', 'an',
+    'and', 'or', 'of', 'to', 'in', 'is',
+))
+
+
+def _endings(group_1='', group_2=''):
+    """
+    Окончания по убыванию длины. Окончания первой группы снимаются,
+    только если перед ними стоит "а" или "я".
+    """
+    endings = [(ending, True) for ending in group_1.split()]
+    endings += [(ending, False) for ending in group_2.split()]
+    return sorted(endings, key=lambda item: -len(item[0]))
+
+
+PERFECTIVE_GERUND = _endings('в вши вшись', 'ив ивши ившись ыв ывши ывшись')
+ADJECTIVE = _endings(group_2=(
+    'ее ие ые ое ими ыми ей ий ый ой ем им ым ом его ого ему ому их ых ую '
+    'юю ая яя ою ею'
+))
+PARTICIPLE = _endings('ем нн вш ющ щ', 'ивш ывш ующ')
+REFLEXIVE = _endings(group_2='ся сь')
+VERB = _endings(
+    'ла на ете йте ли й л ем н ло но ет ют ны ть ешь нно',
+    'ила ыла ена ейте уйте ите или ыли ей уй ил ыл им ым ен ило ыло ено ят '
+    'ует уют ит ыт ены ить ыть ишь ую ю',
+)
+NOUN = _endings(group_2=(
+    'а ев ов ие ье е иями ями ами еи ии и ией ей ой ий й иям ям ием ем ам '
+    'ом о у ах иях ях ы ь ию ью ю ия ья я'
+))
+DERIVATIONAL = _endings(group_2='ост ость')
+SUPERLATIVE = _endings(group_2='ейш ейше')
+
+
+def _regions(word):
+    """Начала областей RV и R2 алгоритма Snowball."""
+    rv = next(
+        (i + 1 for i, letter in enumerate(word) if letter in VOWELS),
+        len(word),
+    )
+
+    def after_vowel_consonant(start):
+        for i in range(start + 1, len(word)):
+            if word[i - 1] in VOWELS and word[i] not in VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = after_vowel_consonant(0)
+    return rv, after_vowel_consonant(r1)
+
+
+def _remove(word, region, endings):
+    """
+    Снимает самое длинное из окончаний, целиком лежащее в области.
+    Возвращает None, если снять нечего.
+    """
+    for ending, after_a in endings:
+        start = len(word) - len(ending)
+        if not word.endswith(ending) or start < region:
+            continue
+        if after_a and (start - 1 < region or word[start - 1] not in 'ая'):
+            return None
+        return word[:start]
+    return None
+
+
+# Слова повторяются по закону Ципфа: основы частых слов не пересчитываем.
+@lru_cache(maxsize=100000)
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    result = _remove(word, rv, PERFECTIVE_GERUND)
+    if result is None:
+        word = _remove(word, rv, REFLEXIVE) or word
+        result = _remove(word, rv, ADJECTIVE)
+        if result is not None:
+            result = _remove(result, rv, PARTICIPLE) or result
+        else:
+            result = _remove(word, rv, VERB)
+            if result is None:
+                result = _remove(word, rv, NOUN)
+    if result is not None:
+        word = result
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    word = _remove(word, r2, DERIVATIONAL) or word
+    superlative = _remove(word, rv, SUPERLATIVE)
+    if superlative is not None:
+        word = superlative
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        word = word[:-1]
+    elif superlative is None and word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Термы текста в порядке появления, без стоп-слов."""
+    terms = []
+    for word in WORD_RE.findall(text.lower().replace('ё', 'е')):
+        if word in STOP_WORDS:
+            continue
+        terms.append(stem(word) if CYRILLIC_RE.search(word) else word)
+    return terms
@@ -0,0 +1,55 @@
+from django import template
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode
+
+from posts.cache import get_or_render
+
+register = template.Library()
+
+
+class GuardedCacheNode(CacheNode):
+    def render(self, context):
+        try:
+            expire_time = int(self.expire_time_var.resolve(context))
+        except (ValueError, TypeError, template.VariableDoesNotExist):
+            raise template.TemplateSyntaxError(
+                f'"guardedcache" tag got a non-integer timeout value: '
+                f'{self.expire_time_var.var!r}'
+            )
+        try:
+            fragment_cache = caches['template_fragments']
+        except InvalidCacheBackendError:
+            fragment_cache = caches['default']
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        key = make_template_fragment_key(self.fragment_name, vary_on)
+        return get_or_render(
+            key,
+            lambda: self.nodelist.render(context),
+            expire_time,
+            fragment_cache,
+        )
+
+
+@register.tag('guardedcache')
+def do_guarded_cache(parser, token):
+    """
+    Как {% cache %}, но с защитой от одновременной перестройки:
+        {% guardedcache [timeout] [name] [var1] [var2] ... %}
+        ...
+        {% endguardedcache %}
+    """
+    nodelist = parser.parse(('endguardedcache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'"{tokens[0]}" tag requires at least 2 arguments.'
+        )
+    return GuardedCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+        None,
+    )
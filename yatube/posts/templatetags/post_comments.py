@@ -0,0 +1,29 @@
+from django import template
+from django.conf import settings
+
+from posts.models import Comment
+
+register = template.Library()
+
+
+@register.simple_tag
+def load_latest_comments(posts):
+    """
+    Подгружает в post.latest_comments последние POSTS_FEED_COMMENTS
+    комментариев постов страницы одним запросом. Тег стоит внутри
+    кешируемого фрагмента ленты: для страницы из кеша запроса нет.
+    Посты без комментариев (comments_count = 0) в запрос не попадают.
+    post.latest_comment_ids - id этих комментариев строкой, для ключа
+    кеша фрагмента поста.
+    """
+    posts = list(posts)
+    comments = Comment.objects.latest_per_post(
+        [post.pk for post in posts if post.comments_count],
+        settings.POSTS_FEED_COMMENTS,
+    )
+    for post in posts:
+        post.latest_comments = comments.get(post.pk, [])
+        post.latest_comment_ids = ','.join(
+            str(comment.pk) for comment in post.latest_comments
+        )
+    return ''
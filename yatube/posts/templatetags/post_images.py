@@ -0,0 +1,21 @@
+from django import template
+from django.conf import settings
+
+from posts.thumbnails import JPEG, srcsets
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/post_picture.html')
+def post_picture(post):
+    """Картинка поста: <picture> из готовых миниатюр или оригинал."""
+    sources = srcsets(post)
+    return {
+        'post': post,
+        'sources': [(mime, srcset) for mime, srcset in sources
+                    if mime != JPEG],
+        'fallback_srcset': dict(sources).get(JPEG),
+        'sizes': settings.POSTS_PICTURE_SIZES,
+        'width': settings.POSTS_THUMBNAIL_SIZE[0],
+        'height': settings.POSTS_THUMBNAIL_SIZE[1],
+    }
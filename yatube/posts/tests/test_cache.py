@@ -0,0 +1,65 @@
+import importlib.util
+import time
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.cache import POSTS, bump_version, get_or_render, get_version
+from yatube.settings.base import cache_settings
+
+REDIS_FAKE_INSTALLED = all(
+    importlib.util.find_spec(module)
+    for module in ('django_redis', 'fakeredis', 'lupa')
+)
+
+
+class GuardedCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def render(self):
+        self.calls += 1
+        return f'фрагмент {self.calls}'
+
+    def test_fragment_rendered_once(self):
+        """Фрагмент строится один раз и дальше берется из кеша"""
+        for _ in range(3):
+            value = get_or_render('key', self.render, 60)
+        self.assertEqual(value, 'фрагмент 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_fragment_served_while_locked(self):
+        """Пока фрагмент перестраивается, остальные получают старую версию"""
+        cache.set('key', ('старый', time.time() - 1, 0), 60)
+        cache.add('key:lock', 1, 60)
+        self.assertEqual(get_or_render('key', self.render, 60), 'старый')
+        self.assertEqual(self.calls, 0)
+
+    @override_settings(POSTS_CACHE_LOCK_WAIT=0)
+    def test_missing_fragment_rendered_after_wait(self):
+        """Без старой версии запрос не ждет блокировку бесконечно"""
+        cache.add('key:lock', 1, 60)
+        self.assertEqual(get_or_render('key', self.render, 60), 'фрагмент 1')
+
+    @override_settings(POSTS_CACHE_EARLY_REFRESH_BETA=10 ** 6)
+    def test_early_refresh(self):
+        """Фрагмент, который строится дольше остатка жизни, обновляется"""
+        cache.set('key', ('старый', time.time() + 5, 1), 60)
+        self.assertEqual(get_or_render('key', self.render, 60), 'фрагмент 1')
+        self.assertFalse(cache.get('key:lock'))
+
+
+@skipUnless(REDIS_FAKE_INSTALLED, 'нужны django-redis, fakeredis и lupa')
+class RedisFakeBackendTest(TestCase):
+    def test_feed_pages_on_redis_protocol_backend(self):
+        """Ленты и версии работают на Redis-совместимом бэкенде"""
+        with override_settings(CACHES=cache_settings('redis-fake')):
+            cache.clear()
+            version = get_version(POSTS)
+            bump_version(POSTS)
+            self.assertEqual(get_version(POSTS), version + 1)
+            response = Client().get(reverse('posts:index'))
+            self.assertEqual(response.status_code, 200)
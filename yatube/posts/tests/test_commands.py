@@ -0,0 +1,207 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from posts.management.commands.benchmark_views import VIEWS
+from posts.models import AuthorStats, Comment, Follow, Group, Post
+from posts.search import search_posts
+
+User = get_user_model()
+
+
+class BenchmarkViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        author = User.objects.create_user(username='Author')
+        reader = User.objects.create_user(username='Reader')
+        group = Group.objects.create(title='Группа', slug='group')
+        post = Post.objects.create(author=author, group=group, text='Пост')
+        Comment.objects.create(post=post, author=reader, text='Коммент')
+        Follow.objects.create(user=reader, author=author)
+
+    def test_results_for_every_view(self):
+        """Бенчмарк выдает JSON с замерами по каждому представлению"""
+        out = StringIO()
+        call_command('benchmark_views', current_db=True, requests=2,
+                     warmup=0, stdout=out)
+        results = json.loads(out.getvalue())
+        self.assertEqual(results['meta']['dataset']['post'], 1)
+        self.assertEqual(set(results['views']), set(VIEWS))
+        for name, result in results['views'].items():
+            with self.subTest(view=name):
+                self.assertTrue(set(result['status']) <= {200, 302})
+                self.assertGreater(result['queries']['max'], 0)
+
+    def test_writes_are_rolled_back(self):
+        """Посты и комментарии бенчмарка не остаются в базе"""
+        call_command('benchmark_views', current_db=True, requests=2,
+                     warmup=0, view=['post_create', 'add_comment'],
+                     stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+
+
+class ExplainFeedsTest(TestCase):
+    def test_current_db_keeps_indexes(self):
+        """На текущей базе команда только показывает планы"""
+        Post.objects.create(
+            author=User.objects.create_user(username='Author'), text='Пост'
+        )
+        out = StringIO()
+        call_command('explain_feeds', current_db=True, stdout=out)
+        self.assertIn('С индексами', out.getvalue())
+        self.assertNotIn('Без индексов', out.getvalue())
+        plan = Post.objects.order_by('-pub_date', '-id')[:10].explain()
+        self.assertIn('post_pub_date_id_idx', plan)
+
+
+class BenchmarkConcurrencyTest(TransactionTestCase):
+    # Потоки читают вне транзакции: при DB_READ_REPLICA=1 - через
+    # соединение для чтения.
+    databases = '__all__'
+
+    def test_both_servers_answer(self):
+        """Оба сервера отвечают быстрым и медленным клиентам"""
+        Post.objects.create(
+            author=User.objects.create_user(username='Author'), text='Пост'
+        )
+        out = StringIO()
+        call_command('benchmark_concurrency', current_db=True, workers=2,
+                     slow_clients=2, fast_clients=1, duration=0.2,
+                     stdout=out)
+        results = json.loads(out.getvalue())
+        for name, result in results['servers'].items():
+            with self.subTest(server=name):
+                self.assertGreater(result['fast_requests'], 0)
+                self.assertEqual(result['slow_statuses'], [200])
+                self.assertEqual(result['slow_failed'], 0)
+
+
+class BenchmarkSqliteTest(SimpleTestCase):
+    def test_every_mode_reads_during_writes(self):
+        """Во всех режимах SQLite чтения идут, пока пишутся пачки"""
+        # Отдельный процесс: бенчмарку нужна база-файл, а тестовая база
+        # этого процесса - в памяти.
+        environ = {key: value for key, value in os.environ.items()
+                   if not key.startswith(('DB_', 'DJANGO_ENV'))}
+        result = subprocess.run(
+            [sys.executable, 'manage.py', 'benchmark_sqlite', '--users=5',
+             '--groups=1', '--posts=30', '--comments=30', '--follows=5',
+             '--readers=2', '--burst=5', '--duration=0.3'],
+            cwd=settings.BASE_DIR, env=environ, capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        modes = json.loads(result.stdout)['modes']
+        self.assertEqual(
+            {name: mode['journal_mode'] for name, mode in modes.items()},
+            {'baseline': 'delete', 'wal': 'wal', 'wal+replica': 'wal'},
+        )
+        for name, mode in modes.items():
+            with self.subTest(mode=name):
+                self.assertGreater(mode['reads'], 0)
+                self.assertGreater(mode['writes_per_second'], 0)
+                self.assertEqual(mode['read_errors'], 0)
+
+
+class TransferDataTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        author = User.objects.create_user(username='Author')
+        reader = User.objects.create_user(username='Reader')
+        group = Group.objects.create(title='Группа', slug='group')
+        cls.posts = [
+            Post.objects.create(author=author, group=group, text='Котики'),
+            Post.objects.create(author=author, text='Погода, "кавычки"'),
+        ]
+        Comment.objects.create(post=cls.posts[0], author=reader,
+                               text='Комментарий')
+        Follow.objects.create(user=reader, author=author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def snapshot(self):
+        return (
+            list(Group.objects.values_list('pk', 'slug')),
+            list(Post.objects.values_list(
+                'pk', 'author__username', 'group', 'text', 'pub_date')),
+            list(Comment.objects.values_list(
+                'pk', 'post', 'author__username', 'text', 'created')),
+            list(Follow.objects.values_list(
+                'user__username', 'author__username')),
+        )
+
+    def clear(self):
+        Group.objects.all().delete()
+        User.objects.all().delete()
+
+    def test_round_trip(self):
+        """Выгруженные данные загружаются обратно без потерь"""
+        before = self.snapshot()
+        for data_format in ('jsonl', 'csv'):
+            with self.subTest(format=data_format):
+                call_command('export_data', self.directory,
+                             format=data_format, chunk_size=1,
+                             stdout=StringIO())
+                self.clear()
+                call_command('import_data', self.directory,
+                             format=data_format, stdout=StringIO())
+                self.assertEqual(self.snapshot(), before)
+                stats = AuthorStats.objects.get(user__username='Author')
+                self.assertEqual(stats.posts_count, 2)
+                self.assertEqual(stats.followers_count, 1)
+                self.assertEqual(len(search_posts('котик')), 1)
+
+    def test_refuses_non_empty_tables(self):
+        """Загрузка в непустую таблицу не привязывает строки к чужим id"""
+        call_command('export_data', self.directory, stdout=StringIO())
+        before = self.snapshot()
+        with self.assertRaisesMessage(CommandError, 'post, comment, follow'):
+            call_command('import_data', self.directory,
+                         tables=['post', 'comment', 'follow'],
+                         stdout=StringIO())
+        self.assertEqual(self.snapshot(), before)
+
+    def test_sequences_reset_after_import(self):
+        """После загрузки последовательности id сдвигаются за новые строки"""
+        call_command('export_data', self.directory, stdout=StringIO())
+        self.clear()
+        with mock.patch.object(connection.ops, 'sequence_reset_sql',
+                               return_value=[]) as reset:
+            call_command('import_data', self.directory, stdout=StringIO())
+        reset.assert_called_once()
+        self.assertEqual(reset.call_args[0][1],
+                         [Group, Post, Comment, Follow])
+        post = Post.objects.create(author=User.objects.get(username='Author'),
+                                   text='Новый пост')
+        self.assertGreater(post.pk, self.posts[1].pk)
+
+    def test_resume_from_checkpoint(self):
+        """Прерванная загрузка продолжается с контрольной точки"""
+        call_command('export_data', self.directory, stdout=StringIO())
+        self.clear()
+        with open(os.path.join(self.directory,
+                               '.import-checkpoint.json'), 'w') as file:
+            json.dump({'group': 1, 'post': 1, 'comment': 1, 'follow': 1},
+                      file)
+        out = StringIO()
+        call_command('import_data', self.directory, resume=True, stdout=out)
+        self.assertIn('post: 1 строк', out.getvalue())
+        self.assertEqual(Post.objects.get().pk, self.posts[1].pk)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.directory, '.import-checkpoint.json')))
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from posts import feed
+from posts.feed import follow_feed
+from posts.models import AuthorStats, FeedEntry, Follow, Post
+from posts.utils import KeysetPaginator
+
+User = get_user_model()
+
+
+class FollowFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.other = User.objects.create_user(username='Other')
+        cls.old_post = Post.objects.create(author=cls.author,
+                                           text='Старый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_follow_backfills_feed(self):
+        """Подписка добавляет в ленту уже опубликованные посты автора"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+        self.assertIn(self.old_post, follow_feed(self.reader))
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков и только в них"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertIn(post, follow_feed(self.reader))
+        self.assertNotIn(post, follow_feed(self.other))
+
+    def test_unfollow_trims_feed(self):
+        """Отписка убирает посты автора из ленты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(follow_feed(self.reader).count(), 0)
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_popular_author_is_read_on_demand(self):
+        """Посты популярного автора подмешиваются в ленту при чтении"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        self.assertEqual(feed.refresh_popular(), (1, 0))
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        self.assertEqual(
+            list(follow_feed(self.reader)), [post, self.old_post]
+        )
+        self.assertEqual(follow_feed(self.reader).count(), 2)
+
+    def test_demoted_author_is_backfilled(self):
+        """Ленты подписчиков бывшего популярного автора дозаполняются"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.filter(user=self.author).update(feed_on_read=True)
+        cache.clear()
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        self.assertEqual(feed.refresh_popular(), (0, 1))
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=post).exists())
+
+    def test_page_is_index_range_scan(self):
+        """Страница ленты - диапазон по индексу, без сортировки"""
+        plan = follow_feed(self.reader).entries().values_list(
+            'pub_date', 'post_id')[:10].explain()
+        self.assertIn('feed_user_pub_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_keyset_pages_merge_popular_authors(self):
+        """Курсор проходит по ленте с популярным автором без пропусков"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other)
+        Follow.objects.create(user=self.other, author=self.author)
+        feed.refresh_popular()
+        for number in range(3):
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+            Post.objects.create(author=self.other, text=f'Пост {number}')
+        expected = list(Post.objects.filter(
+            author__in=(self.author, self.other)).order_by('-pub_date', '-id'))
+        paginator = KeysetPaginator(follow_feed(self.reader), 3)
+        page = paginator.get_page(None)
+        posts = list(page)
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            posts += list(page)
+        self.assertEqual(posts, expected)
+        previous = paginator.get_page(page.previous_cursor)
+        self.assertEqual(list(previous), expected[3:6])
@@ -1,7 +1,13 @@
+from io import StringIO
+from unittest import mock, skipUnless
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from ..models import Group, Post
+from ..models import AuthorStats, Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -57,3 +63,119 @@ class PostModelTest(TestCase):
                 self.assertEqual(
                     self.post._meta.get_field(field).verbose_name,
                     expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def assert_counters(self):
+        author = AuthorStats.objects.get(user=self.author)
+        reader = AuthorStats.objects.get(user=self.reader)
+        self.post.refresh_from_db()
+        expected = (
+            (author.posts_count, self.author.posts.count()),
+            (author.followers_count, self.author.following.count()),
+            (reader.following_count, self.reader.follower.count()),
+            (self.post.comments_count, self.post.comments.count()),
+        )
+        for counter, real in expected:
+            with self.subTest(counter=counter):
+                self.assertEqual(counter, real)
+
+    def test_counters_follow_writes(self):
+        """Счетчики меняются при создании и удалении записей"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Comment.objects.create(post=self.post, author=self.reader, text='К')
+        Post.objects.create(author=self.author, text='Еще пост')
+        self.assert_counters()
+        self.assertEqual(self.post.comments_count, 1)
+
+        Comment.objects.all().delete()
+        Follow.objects.all().delete()
+        Post.objects.exclude(pk=self.post.pk).delete()
+        self.assert_counters()
+
+    def test_stats_created_with_user(self):
+        """Первый пост и подписка сдвигают готовую строку счетчиков"""
+        user = User.objects.create_user(username='newbie')
+        with mock.patch('posts.counters.recount_author') as recount:
+            Post.objects.create(author=user, text='Первый пост')
+            Follow.objects.create(user=user, author=self.author)
+        recount.assert_not_called()
+        stats = AuthorStats.objects.get(user=user)
+        self.assertEqual((stats.posts_count, stats.following_count), (1, 1))
+
+    def test_recount_stats_command(self):
+        """recount_stats восстанавливает испорченные счетчики"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Comment.objects.create(post=self.post, author=self.reader, text='К')
+        AuthorStats.objects.update(posts_count=100, followers_count=100,
+                                   following_count=100)
+        Post.objects.update(comments_count=100)
+        call_command('recount_stats', stdout=StringIO())
+        self.assert_counters()
+
+
+class LatestCommentsTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Reader')
+        author = User.objects.create_user(username='Author')
+        cls.busy = Post.objects.create(author=author, text='Обсуждаемый')
+        cls.quiet = Post.objects.create(author=author, text='Тихий')
+        cls.empty = Post.objects.create(author=author, text='Пустой')
+        for number in range(5):
+            Comment.objects.create(post=cls.busy, author=cls.user,
+                                   text=f'Комментарий {number}')
+        Comment.objects.create(post=cls.quiet, author=cls.user, text='Один')
+
+    def check_latest(self):
+        post_ids = [self.busy.pk, self.quiet.pk, self.empty.pk]
+        with self.assertNumQueries(1):
+            comments = Comment.objects.latest_per_post(post_ids, 3)
+        self.assertEqual(
+            [comment.text for comment in comments[self.busy.pk]],
+            ['Комментарий 4', 'Комментарий 3', 'Комментарий 2'],
+        )
+        self.assertEqual(len(comments[self.quiet.pk]), 1)
+        self.assertNotIn(self.empty.pk, comments)
+        self.assertEqual(comments[self.quiet.pk][0].author_username,
+                         'Reader')
+
+    def test_latest_per_post_with_window(self):
+        """Последние комментарии постов выбираются одним запросом"""
+        self.check_latest()
+
+    def test_latest_per_post_without_window(self):
+        """Без оконных функций работает подзапрос с LIMIT"""
+        with mock.patch.object(connection.features, 'supports_over_clause',
+                               False):
+            self.check_latest()
+
+    def test_latest_one_per_post(self):
+        """При limit = 1 у каждого поста ровно последний комментарий"""
+        with self.assertNumQueries(1):
+            comments = Comment.objects.latest_per_post(
+                [self.busy.pk, self.quiet.pk], 1
+            )
+        self.assertEqual(
+            {post_id: [comment.text for comment in latest]
+             for post_id, latest in comments.items()},
+            {self.busy.pk: ['Комментарий 4'], self.quiet.pk: ['Один']},
+        )
+        self.assertEqual(comments[self.busy.pk][0].author_username, 'Reader')
+
+    @skipUnless(connection.vendor == 'postgresql', 'только PostgreSQL')
+    def test_postgresql_uses_lateral_and_distinct_on(self):
+        """В PostgreSQL - LATERAL с LIMIT, при limit = 1 - DISTINCT ON"""
+        for limit, clause in ((3, 'LATERAL'), (1, 'DISTINCT ON')):
+            with CaptureQueriesContext(connection) as queries:
+                Comment.objects.latest_per_post([self.busy.pk], limit)
+            self.assertIn(clause, queries[0]['sql'])
+        self.check_latest()
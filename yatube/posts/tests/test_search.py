@@ -0,0 +1,148 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post
+from posts.search import get_index, search_posts
+from posts.stemmer import stem, tokenize
+
+User = get_user_model()
+
+
+class StemmerTest(TestCase):
+    def test_word_forms_share_stem(self):
+        """Формы одного слова приводятся к одной основе"""
+        for forms in (('котик', 'котики', 'котиков', 'котиками'),
+                      ('погода', 'погоды', 'погоде'),
+                      ('новость', 'новости', 'новостью')):
+            with self.subTest(forms=forms):
+                self.assertEqual(len({stem(word) for word in forms}), 1)
+
+    def test_tokenize(self):
+        """Стоп-слова отбрасываются, ё приравнивается к е"""
+        self.assertEqual(tokenize('Ёлки и Python'), ['елк', 'python'])
+
+
+class SearchTestMixin:
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.cats = Post.objects.create(
+            author=cls.author, text='Котики гуляли под дождем')
+        cls.weather = Post.objects.create(
+            author=cls.author, text='Какая сегодня погода?')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_inflected_word_found(self):
+        """Пост находится по другой форме слова"""
+        self.assertEqual(search_posts('котиков'), [self.cats.pk])
+
+    def test_all_words_required(self):
+        """Находятся только посты со всеми словами запроса"""
+        self.assertEqual(search_posts('котик дождь'), [self.cats.pk])
+        self.assertEqual(search_posts('котик погода'), [])
+
+    def test_comments_are_indexed(self):
+        """Комментарии ищутся, но весят меньше текста поста"""
+        comment = Comment.objects.create(
+            post=self.cats, author=self.author, text='Отличная погода!')
+        self.assertEqual(search_posts('погода'),
+                         [self.weather.pk, self.cats.pk])
+        comment.delete()
+        self.assertEqual(search_posts('погода'), [self.weather.pk])
+
+    def test_comment_indexes_only_its_terms(self):
+        """Новый комментарий не перечитывает остальные комментарии поста"""
+        Comment.objects.create(post=self.cats, author=self.author,
+                               text='Первый')
+        with CaptureQueriesContext(connection) as context:
+            Comment.objects.create(post=self.cats, author=self.author,
+                                   text='Второй')
+        self.assertFalse(any(
+            'FROM "posts_comment"' in query['sql']
+            for query in context.captured_queries
+        ))
+        self.assertEqual(search_posts('первый второй'), [self.cats.pk])
+
+    def test_repeated_term_removed_with_last_comment(self):
+        """Терм из двух комментариев ищется, пока жив хотя бы один"""
+        first, second = (
+            Comment.objects.create(post=self.cats, author=self.author,
+                                   text='Хорошая погода')
+            for _ in range(2)
+        )
+        first.delete()
+        self.assertIn(self.cats.pk, search_posts('погода'))
+        second.delete()
+        self.assertEqual(search_posts('погода'), [self.weather.pk])
+        self.assertEqual(search_posts('дождь'), [self.cats.pk])
+
+    def test_edit_and_delete_update_index(self):
+        """Изменение и удаление поста сразу отражаются в поиске"""
+        post = Post.objects.get(pk=self.cats.pk)
+        post.text = 'Собаки гуляли'
+        post.save()
+        self.assertEqual(search_posts('котики'), [])
+        self.assertEqual(search_posts('собака'), [post.pk])
+        post.delete()
+        self.assertEqual(search_posts('собака'), [])
+
+    def test_rebuild_command(self):
+        """Команда перестраивает индекс по всем постам"""
+        get_index().clear()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search_posts('погоды'), [self.weather.pk])
+
+
+@override_settings(POSTS_SEARCH_BACKEND='fts5')
+class Fts5SearchTest(SearchTestMixin, TestCase):
+    pass
+
+
+@override_settings(POSTS_SEARCH_BACKEND='table')
+class TableSearchTest(SearchTestMixin, TestCase):
+    pass
+
+
+@override_settings(POSTS_PER_PAGE=1)
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        author = User.objects.create_user(username='Author')
+        for text in ('Первый пост про котиков', 'Второй пост про котика'):
+            Post.objects.create(author=author, text=text)
+
+    def test_search_page(self):
+        """Страница поиска выводит найденные посты с пагинацией по запросу"""
+        cache.clear()
+        response = Client().get(reverse('posts:search'), {'q': 'котики'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 2)
+        self.assertIsInstance(page_obj[0], Post)
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%82%D0%B8%D0%BA%D0%B8'
+                                      '&amp;page=2')
+
+    @override_settings(POSTS_PAGINATION_MODES={'posts:search': 'keyset'})
+    def test_search_ignores_keyset_mode(self):
+        """Поиск листается по номерам страниц и в режиме keyset"""
+        cache.clear()
+        response = Client().get(reverse('posts:search'), {'q': 'котики'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.context['page_obj'][0], Post)
+        self.assertContains(response, '&amp;page=2')
+
+    def test_empty_query(self):
+        """Без запроса выводится только форма"""
+        response = Client().get(reverse('posts:search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].paginator.count, 0)
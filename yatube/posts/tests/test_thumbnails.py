@@ -0,0 +1,148 @@
+import io
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import thumbnails
+from posts.forms import PostForm
+from posts.models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_post(self, name='small.gif'):
+        return Post.objects.create(
+            author=self.author, text='Пост с картинкой',
+            image=SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        )
+
+    def test_thumbnail_generated_on_save(self):
+        """Миниатюра строится при сохранении и лежит по постоянному пути"""
+        post = Post.objects.get(pk=self.create_post().pk)
+        self.assertEqual(post.thumbnail.name,
+                         thumbnails.thumbnail_name(post.image.name))
+        with default_storage.open(post.thumbnail.name) as file:
+            self.assertEqual(Image.open(file).size,
+                             settings.POSTS_THUMBNAIL_SIZE)
+
+    def test_feed_does_not_touch_pillow(self):
+        """Ленты выводят готовую миниатюру без обращения к Pillow"""
+        post = Post.objects.get(pk=self.create_post().pk)
+        with mock.patch('PIL.Image.open') as image_open:
+            response = Client().get(reverse('posts:index'))
+        image_open.assert_not_called()
+        self.assertContains(response, post.thumbnail.url)
+
+    def test_renditions_for_every_width_and_format(self):
+        """Миниатюры строятся во всех ширинах и форматах для srcset"""
+        post = Post.objects.get(pk=self.create_post().pk)
+        renditions = json.loads(post.renditions)
+        self.assertEqual(set(renditions), set(thumbnails.image_formats()))
+        for mime, variants in renditions.items():
+            with self.subTest(mime=mime):
+                self.assertEqual(
+                    [width for width, name in variants],
+                    [width for width, height in thumbnails.sizes()],
+                )
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, 'srcset=')
+
+    def test_unchanged_image_is_not_rebuilt(self):
+        """Сохранение поста без смены картинки не строит миниатюру заново"""
+        post = Post.objects.get(pk=self.create_post().pk)
+        with mock.patch('posts.thumbnails.render') as render:
+            post.text = 'Новый текст'
+            post.save()
+        render.assert_not_called()
+
+    def test_command_skips_fresh_thumbnails(self):
+        """generate_thumbnails проверяет посты одним запросом"""
+        self.create_post()
+        with self.assertNumQueries(1):
+            call_command('generate_thumbnails', stdout=io.StringIO())
+
+    @override_settings(POSTS_THUMBNAIL_WORKERS=2)
+    def test_original_shown_until_thumbnail_ready(self):
+        """Пока фоновая миниатюра не готова, выводится оригинал"""
+        post = self.create_post()
+        self.assertFalse(Post.objects.get(pk=post.pk).thumbnail)
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, post.image.url)
+
+
+@override_settings(POSTS_IMAGE_MAX_SIZE=(100, 100))
+class PrepareUploadTest(TestCase):
+    def upload(self, size, image_format='JPEG', exif=None):
+        content = io.BytesIO()
+        options = {'exif': exif} if exif else {}
+        Image.new('RGB', size, 'red').save(content, image_format, **options)
+        return SimpleUploadedFile(f'photo.{image_format.lower()}',
+                                  content.getvalue(), 'image/jpeg')
+
+    def clean_image(self, upload):
+        form = PostForm(data={'text': 'Пост'}, files={'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        upload = form.cleaned_data['image']
+        upload.seek(0)
+        return upload, Image.open(upload)
+
+    def test_large_image_is_capped(self):
+        """Слишком большая картинка уменьшается с сохранением пропорций"""
+        upload, image = self.clean_image(self.upload((400, 200)))
+        self.assertEqual(image.size, (100, 50))
+        self.assertEqual(upload.name, 'photo.jpeg')
+
+    def test_exif_is_stripped(self):
+        """EXIF удаляется, ориентация применяется к пикселям"""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90 по часовой
+        exif[0x010F] = 'Camera'
+        upload, image = self.clean_image(self.upload((40, 20), exif=exif))
+        self.assertFalse(image.getexif())
+        self.assertEqual(image.size, (20, 40))
+
+    def test_small_image_is_kept_as_is(self):
+        """Картинку без EXIF в пределах размера не перекодируем"""
+        original = self.upload((40, 20), 'PNG')
+        content = original.read()
+        original.seek(0)
+        upload, image = self.clean_image(original)
+        upload.seek(0)
+        self.assertEqual(upload.read(), content)
@@ -0,0 +1,186 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import urlsafe_base64_encode
+
+from posts.cache import POSTS, bump_version
+from posts.models import Group, Post
+from posts.utils import CachedCountPaginator, KeysetPage, KeysetPaginator
+
+User = get_user_model()
+
+KEYSET_MODES = {
+    'posts:index': 'keyset',
+    'posts:profile': 'keyset',
+}
+
+
+@override_settings(POSTS_PAGINATION_MODES=KEYSET_MODES)
+class KeysetPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='AuthUser')
+        cls.count_of_test_posts = settings.POSTS_PER_PAGE * 2 + 3
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Тестовый пост {i}')
+            for i in range(cls.count_of_test_posts)
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def walk(self, url, cursor_name):
+        pages = []
+        cursor = None
+        while True:
+            response = self.guest_client.get(
+                url, {'cursor': cursor} if cursor else {}
+            )
+            page = response.context['page_obj']
+            pages.append(list(page))
+            cursor = getattr(page, cursor_name)
+            if cursor is None:
+                return pages, page
+
+    def test_keyset_page_in_context(self):
+        """В режиме keyset в контекст передается KeysetPage"""
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertIsInstance(response.context['page_obj'], KeysetPage)
+        self.assertNotContains(response, '?page=')
+        self.assertContains(response, '?cursor=')
+
+    def test_keyset_walks_all_posts_in_order(self):
+        """Переход по курсорам выдает все посты без пропусков и дублей"""
+        pages, last_page = self.walk(
+            reverse('posts:profile', args=(self.user.username,)),
+            'next_cursor',
+        )
+        posts = [post for page in pages for post in page]
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(
+            [post.pk for post in posts],
+            list(Post.objects.order_by('-pub_date', '-id')
+                 .values_list('pk', flat=True)),
+        )
+        self.assertFalse(last_page.has_next())
+        self.assertTrue(last_page.has_previous())
+
+        previous = self.guest_client.get(
+            reverse('posts:index'),
+            {'cursor': last_page.previous_cursor},
+        ).context['page_obj']
+        self.assertEqual(list(previous), pages[1])
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор отдает первую страницу"""
+        response = self.guest_client.get(
+            reverse('posts:index'), {'cursor': 'испорчен'}
+        )
+        page = response.context['page_obj']
+        self.assertFalse(page.has_previous())
+        self.assertEqual(len(page), settings.POSTS_PER_PAGE)
+
+    def test_crafted_cursor_returns_first_page(self):
+        """Курсор с нескалярными или чужими значениями - первая страница"""
+        paginator = KeysetPaginator(Post.objects.all(), 5)
+        for values in (['n', {}, 1], ['n', [1], 1], ['n', 'вчера', 'x'],
+                       ['n', 1, 1.5e300],
+                       ['n', '2020-01-01T00:00:00+00:00', 10 ** 30]):
+            with self.subTest(values=values):
+                page = paginator.get_page(urlsafe_base64_encode(
+                    json.dumps(values).encode()
+                ))
+                self.assertIsNone(page.direction)
+                self.assertEqual(len(page), 5)
+
+    def test_page_cost_does_not_depend_on_depth(self):
+        """Любая страница - один запрос, без COUNT(*) и OFFSET"""
+        paginator = KeysetPaginator(Post.objects.all(), 5)
+        page = paginator.get_page(None)
+        for _ in range(3):
+            with self.assertNumQueries(1) as context:
+                list(page)
+            sql = context.captured_queries[0]['sql']
+            self.assertNotIn('COUNT', sql)
+            self.assertNotIn('OFFSET', sql)
+            page = paginator.get_page(page.next_cursor)
+
+
+class CachedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='AuthUser')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        for i in range(settings.POSTS_PER_PAGE + 2):
+            Post.objects.create(author=cls.user, group=cls.group,
+                                text=f'Тестовый пост {i}')
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def paginator(self):
+        return CachedCountPaginator(Post.objects.all(), 5,
+                                    count_name='test',
+                                    count_versions=(POSTS,))
+
+    def test_known_count_skips_count_query(self):
+        paginator = CachedCountPaginator(Post.objects.all(), 5, count=12)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(paginator.get_page(3)), 2)
+        self.assertEqual(paginator.num_pages, 3)
+
+    def test_count_is_cached_until_versions_change(self):
+        self.assertEqual(self.paginator().count, 12)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.paginator().count, 12)
+        with override_settings(POSTS_COUNT_MAX_STALENESS=0):
+            bump_version(POSTS)
+            with self.assertNumQueries(1):
+                self.paginator().count
+
+    def test_stale_count_does_not_cut_page(self):
+        """Устаревшее число не прячет новые записи с последней страницы"""
+        self.paginator().count
+        Post.objects.create(author=self.user, text='Новый пост')
+        paginator = self.paginator()
+        self.assertEqual(paginator.count, 12)
+        self.assertEqual(len(paginator.get_page(3)), 3)
+
+    def test_elided_page_range(self):
+        paginator = CachedCountPaginator(Post.objects.all(), 1, count=50)
+        self.assertEqual(
+            list(paginator.get_elided_page_range(10)),
+            [1, 2, '…', 7, 8, 9, 10, 11, 12, 13, '…', 49, 50],
+        )
+        self.assertEqual(list(paginator.get_elided_page_range(2)),
+                         [1, 2, 3, 4, 5, '…', 49, 50])
+        small = CachedCountPaginator(Post.objects.all(), 5, count=12)
+        self.assertEqual(list(small.get_elided_page_range(1)), [1, 2, 3])
+
+    def test_feeds_do_not_count_on_hot_path(self):
+        """Профиль берет счетчик, главная и группа - число из кеша"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as context:
+                    response = self.guest_client.get(url)
+                self.assertEqual(response.context['page_obj'].paginator.count,
+                                 settings.POSTS_PER_PAGE + 2)
+                self.assertFalse(any('SELECT COUNT(*)' in query['sql']
+                                     for query in context.captured_queries))
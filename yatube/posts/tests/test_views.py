@@ -6,7 +6,9 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from posts.forms import CommentForm, PostForm
@@ -118,7 +120,7 @@ class PostsPagesTests(TestCase):
                     args=self.info['p_detail'][1])))
 
         self.correct_value_fields_post(response.context.get('post'))
-        self.assertEqual(response.context.get('comments').last(), self.comment)
+        self.assertEqual(response.context.get('comments')[-1], self.comment)
         self.assertEqual(response.context.get('form').__class__, CommentForm)
 
     def test_post_create_show_correct_context(self):
@@ -258,3 +260,365 @@ class IndexFormCacheTest(TestCase):
         posts_count_2 = response_2.content
 
         self.assertEqual(posts_count, posts_count_2)
+
+
+class FeedQueryBudgetTest(TestCase):
+    """Число запросов ленты не зависит от количества постов на странице."""
+
+    QUERY_BUDGET = {
+        'posts:index': 4,
+        'posts:group_list': 5,
+        'posts:profile': 6,
+        'posts:follow_index': 4,
+    }
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user_author = User.objects.create_user(
+            username='AuthUser', first_name='Имя', last_name='Фамилия'
+        )
+        cls.just_user = User.objects.create_user(username='JustUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.just_user, author=cls.user_author)
+        cls.urls = {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse('posts:group_list',
+                                        args=(cls.group.slug,)),
+            'posts:profile': reverse('posts:profile',
+                                     args=(cls.user_author.username,)),
+            'posts:follow_index': reverse('posts:follow_index'),
+        }
+
+    def setUp(self):
+        self.authorized_user = Client()
+        self.authorized_user.force_login(self.just_user)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.authorized_user.get(url)
+        return len(context)
+
+    def create_posts(self, count):
+        Post.objects.bulk_create(
+            Post(author=self.user_author, group=self.group, text='Пост')
+            for _ in range(count)
+        )
+
+    def test_feed_query_budget(self):
+        """Лента укладывается в бюджет запросов при любом размере страницы"""
+        self.create_posts(1)
+        single = {name: self.count_queries(url)
+                  for name, url in self.urls.items()}
+        self.create_posts(settings.POSTS_PER_PAGE)
+        for name, url in self.urls.items():
+            with self.subTest(url=url):
+                full_page = self.count_queries(url)
+                self.assertEqual(full_page, single[name])
+                self.assertLessEqual(full_page, self.QUERY_BUDGET[name])
+
+
+class VersionedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.just_user = User.objects.create_user(username='JustUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.just_user,
+            group=cls.group,
+            text='Тестовый пост',
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(cls.group.slug,)),
+            reverse('posts:profile', args=(cls.just_user.username,)),
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_cached_page_skips_posts_query(self):
+        """Повторный показ страницы не выбирает посты из базы"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.guest_client.get(url)
+                with CaptureQueriesContext(connection) as context:
+                    self.guest_client.get(url)
+                self.assertFalse(any(
+                    'posts_post"."text"' in query['sql']
+                    for query in context.captured_queries
+                ))
+
+    @override_settings(POSTS_COUNT_MAX_STALENESS=0)
+    def test_group_count_follows_group_version(self):
+        """Число постов группы из кеша меняется с новым постом группы"""
+        url = self.urls[1]
+        response = self.guest_client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        Post.objects.create(author=self.just_user, group=self.group,
+                            text='Новый пост')
+        response = self.guest_client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+
+    def test_writes_invalidate_cached_pages(self):
+        """Новый, измененный и удаленный пост сразу видны на страницах"""
+        for url in self.urls:
+            self.guest_client.get(url)
+        new_post = Post.objects.create(
+            author=self.just_user, group=self.group, text='Новый пост'
+        )
+        self.post.text = 'Измененный пост'
+        self.post.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Новый пост')
+                self.assertContains(response, 'Измененный пост')
+        new_post.delete()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertNotContains(response, 'Новый пост')
+
+    def test_renames_invalidate_cached_pages(self):
+        """Новое имя автора и название группы сразу видны в лентах"""
+        for url in self.urls:
+            self.guest_client.get(url)
+        self.just_user.first_name, self.just_user.last_name = 'Лев', 'Толстой'
+        self.just_user.save()
+        self.group.title = 'Новая группа'
+        self.group.save()
+        index, group_list, profile = self.urls
+        expected = (
+            (index, 'Автор: Лев Толстой'),
+            (index, 'все записи группы Новая группа'),
+            (group_list, 'Автор: Лев Толстой'),
+            (profile, 'все записи группы Новая группа'),
+        )
+        for url, text in expected:
+            with self.subTest(url=url, text=text):
+                self.assertContains(self.guest_client.get(url), text)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост'
+        )
+        cls.urls = (
+            reverse('posts:group_list', args=(cls.group.slug,)),
+            reverse('posts:profile', args=(cls.author.username,)),
+            reverse('posts:post_detail', args=(cls.post.pk,)),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_unchanged_page_not_modified(self):
+        """Неизменная страница отдается 304 без рендеринга шаблона"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                with CaptureQueriesContext(connection) as context:
+                    repeated = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(repeated.status_code, 304)
+                self.assertEqual(repeated.templates, [])
+                self.assertFalse(any(
+                    'posts_post"."text"' in query['sql']
+                    for query in context.captured_queries
+                ))
+                repeated = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(repeated.status_code, 304)
+
+    def test_changes_update_etag(self):
+        """Новый пост, комментарий и подписка меняют ETag страниц"""
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        Post.objects.create(author=self.author, group=self.group,
+                            text='Новый пост')
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+        profile = self.urls[1]
+        etag = self.client.get(profile)['ETag']
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(profile, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Отписаться')
+
+    def test_post_edit_updates_etag(self):
+        """Правка и перенос поста меняют ETag обеих групп и профиля"""
+        other = Group.objects.create(title='Другая группа', slug='other')
+        urls = (*self.urls[:2],
+                reverse('posts:group_list', args=(other.slug,)))
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = other
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+
+    def test_conditions_do_not_scan_posts(self):
+        """Условия страниц не агрегируют дату правки постов"""
+        for url in self.urls[:2]:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as context:
+                    self.client.get(url)
+                self.assertFalse(any(
+                    '"posts_post"."updated")' in query['sql']
+                    for query in context.captured_queries
+                ))
+
+    def test_etag_depends_on_user(self):
+        """Страница другого пользователя не совпадает по ETag"""
+        url = self.urls[2]
+        etag = self.client.get(url)['ETag']
+        response = Client().get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(POSTS_COMMENTS_PER_PAGE=5)
+class PostDetailCommentsTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:post_detail', args=(self.post.pk,))
+
+    def create_comments(self, count):
+        start = Comment.objects.count()
+        for number in range(start, start + count):
+            user = User.objects.create_user(username=f'Reader{number}')
+            Comment.objects.create(post=self.post, author=user,
+                                   text=f'Комментарий {number}')
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = Client().get(self.url)
+        return response, len(context)
+
+    def test_comments_paginated_without_n_plus_one(self):
+        """Комментарии выводятся страницами, авторы - без лишних запросов"""
+        self.create_comments(1)
+        response, single = self.count_queries()
+        self.create_comments(11)
+        response, full_page = self.count_queries()
+        self.assertEqual(full_page, single)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 5)
+        self.assertEqual(comments.paginator.num_pages, 3)
+        self.assertEqual(comments[0].text, 'Комментарий 11')
+        response = Client().get(self.url, {'page': 3})
+        self.assertEqual(len(response.context['comments']), 2)
+
+
+@override_settings(POSTS_FEED_COMMENTS=2)
+class FeedCommentsTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(cls.group.slug,)),
+            reverse('posts:profile', args=(cls.author.username,)),
+            reverse('posts:follow_index'),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def create_commented_posts(self, count):
+        for number in range(count):
+            post = Post.objects.create(author=self.author, group=self.group,
+                                       text=f'Пост {number}')
+            for comment in range(3):
+                Comment.objects.create(post=post, author=self.reader,
+                                       text=f'Коммент {number}-{comment}')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        return response, len(context)
+
+    def test_latest_comments_in_feeds(self):
+        """Ленты показывают число и последние комментарии без N+1"""
+        self.create_commented_posts(1)
+        single = {url: self.count_queries(url)[1] for url in self.urls}
+        self.create_commented_posts(settings.POSTS_PER_PAGE - 1)
+        for url in self.urls:
+            with self.subTest(url=url):
+                response, queries = self.count_queries(url)
+                self.assertEqual(queries, single[url])
+                self.assertContains(response, 'Комментариев: 3')
+                self.assertContains(response, 'Коммент 0-2')
+                self.assertContains(response, 'Коммент 0-1')
+                self.assertNotContains(response, 'Коммент 0-0')
+
+    def test_new_comment_refreshes_feed(self):
+        """Новый комментарий сразу виден в закешированной ленте"""
+        self.create_commented_posts(1)
+        url = self.urls[0]
+        self.client.get(url)
+        Comment.objects.create(post=Post.objects.get(), author=self.reader,
+                               text='Свежий коммент')
+        response = self.client.get(url)
+        self.assertContains(response, 'Свежий коммент')
+        self.assertContains(response, 'Комментариев: 4')
+
+    def test_replaced_comment_refreshes_post(self):
+        """Комментарий с тем же началом текста не отдает старый фрагмент"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        url = self.urls[0]
+        old = Comment.objects.create(post=post, author=self.reader,
+                                     text='Общее начало текста: первый')
+        self.client.get(url)
+        old.delete()
+        Comment.objects.create(post=post, author=self.reader,
+                               text='Общее начало текста: второй')
+        response = self.client.get(url)
+        self.assertContains(response, 'второй')
@@ -0,0 +1,178 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from posts import writebehind
+from posts.cache import COMMENTS, get_version
+from posts.models import AuthorStats, Comment, FeedEntry, Follow, Post
+from posts.search import search_posts
+
+User = get_user_model()
+
+
+@override_settings(POSTS_WRITE_BEHIND=True, POSTS_WRITE_BEHIND_INTERVAL=0,
+                   POSTS_WRITE_BEHIND_BATCH=100)
+class WriteBehindTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(writebehind, 'queue',
+                                    writebehind.WriteBehindQueue())
+        self.queue = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def comment(self, text, post=None):
+        return self.client.post(
+            reverse('posts:add_comment', args=((post or self.post).pk,)),
+            {'text': text},
+        )
+
+    def test_comment_is_queued_and_shown_to_its_author(self):
+        """Комментарий ждет в очереди, но автор уже видит его на посте"""
+        self.comment('Из очереди')
+        self.assertFalse(Comment.objects.exists())
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.assertContains(self.client.get(url), 'Из очереди')
+        other = Client()
+        other.force_login(self.author)
+        self.assertNotContains(other.get(url), 'Из очереди')
+
+    def test_flush_writes_comments_in_one_batch(self):
+        """Очередь пишется пачкой, счетчик и версия кеша сдвигаются"""
+        self.comment('Первый')
+        self.comment('Второй')
+        version = get_version(COMMENTS)
+        with self.assertNumQueries(9):
+            self.assertEqual(writebehind.flush(), 2)
+        self.assertEqual(
+            set(self.post.comments.values_list('text', flat=True)),
+            {'Первый', 'Второй'},
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        self.assertNotEqual(get_version(COMMENTS), version)
+        self.assertEqual(len(self.queue), 0)
+
+    def test_flushed_comment_keeps_queued_time(self):
+        """Дата комментария - время добавления, а не записи очереди"""
+        self.comment('Первый')
+        queued_at = self.queue.comments[0][3]
+        with mock.patch('django.utils.timezone.now',
+                        return_value=queued_at + timedelta(hours=1)):
+            writebehind.flush()
+        self.assertEqual(Comment.objects.get().created, queued_at)
+
+    def test_flushed_comments_are_searchable(self):
+        """Комментарии из очереди ищутся и уходят из поиска с удалением"""
+        self.comment('Котики')
+        self.comment('Погода')
+        writebehind.flush()
+        self.assertEqual(search_posts('котик'), [self.post.pk])
+        Comment.objects.get(text='Котики').delete()
+        self.assertEqual(search_posts('котик'), [])
+        self.assertEqual(search_posts('погода'), [self.post.pk])
+
+    def test_comment_to_deleted_post_is_dropped(self):
+        """Комментарий к удаленному посту отбрасывается при записи"""
+        post = Post.objects.create(author=self.author, text='Удалят')
+        self.comment('Потеряется', post)
+        post.delete()
+        writebehind.flush()
+        self.assertFalse(Comment.objects.exists())
+
+    def test_follow_is_visible_before_flush(self):
+        """Подписка видна в профиле до записи, лента подписок ее пишет"""
+        self.client.get(reverse('posts:profile_follow', args=('Author',)))
+        self.assertFalse(Follow.objects.exists())
+        response = self.client.get(reverse('posts:profile',
+                                           args=('Author',)))
+        self.assertTrue(response.context['following'])
+        # Запрос сам пишет очередь: это запросы записи, а не чтения ленты.
+        with override_settings(QUERYLOG_MAX_QUERIES=30):
+            response = self.client.get(reverse('posts:follow_index'))
+        self.assertIn(self.post, response.context['page_obj'])
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author).exists())
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).followers_count, 1
+        )
+
+    def test_follow_and_unfollow_coalesce(self):
+        """Подписка и отписка одной пары до записи не пишут ничего"""
+        self.client.get(reverse('posts:profile_follow', args=('Author',)))
+        self.client.get(reverse('posts:profile_unfollow', args=('Author',)))
+        with self.assertNumQueries(4):
+            writebehind.flush()
+        self.assertFalse(Follow.objects.exists())
+
+    def test_unfollow_deletes_and_trims_feed(self):
+        """Отписка из очереди удаляет подписку и чистит ленту"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.get(reverse('posts:profile_unfollow', args=('Author',)))
+        response = self.client.get(reverse('posts:profile',
+                                           args=('Author',)))
+        self.assertFalse(response.context['following'])
+        writebehind.flush()
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+
+    def test_unknown_author_is_404(self):
+        response = self.client.get(reverse('posts:profile_follow',
+                                           args=('Nobody',)))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(self.queue), 0)
+
+    @override_settings(POSTS_WRITE_BEHIND_BATCH=2)
+    def test_full_batch_is_flushed(self):
+        """Набралась пачка - очередь пишется сразу"""
+        self.comment('Первый')
+        self.assertFalse(Comment.objects.exists())
+        self.comment('Второй')
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_failed_flush_keeps_queue(self):
+        """Если запись упала, записи остаются в очереди"""
+        self.comment('Повторить')
+        with mock.patch.object(writebehind, 'write',
+                               side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                writebehind.flush()
+        self.assertEqual(len(self.queue), 1)
+        writebehind.flush()
+        self.assertTrue(Comment.objects.filter(text='Повторить').exists())
+
+
+@override_settings(POSTS_WRITE_BEHIND=True, POSTS_WRITE_BEHIND_INTERVAL=0.05)
+class WriteBehindThreadTest(TransactionTestCase):
+    # Потоки читают вне транзакции: при DB_READ_REPLICA=1 - через
+    # соединение для чтения.
+    databases = '__all__'
+
+    def test_background_thread_flushes_queue(self):
+        """Фоновый поток сам пишет очередь через INTERVAL"""
+        author = User.objects.create_user(username='Author')
+        post = Post.objects.create(author=author, text='Пост')
+        queue = writebehind.WriteBehindQueue()
+        queue.add_comment(post.pk, author.pk, 'Из потока')
+        self.assertIsNotNone(queue.thread)
+        deadline = time.monotonic() + 5
+        while len(queue) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        with queue.flushing:
+            self.assertTrue(
+                Comment.objects.filter(text='Из потока').exists()
+            )
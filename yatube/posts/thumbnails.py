@@ -0,0 +1,203 @@
+"""
+Миниатюры картинок постов.
+
+Миниатюры строятся один раз после сохранения поста с новой картинкой в
+пуле потоков (POSTS_THUMBNAIL_WORKERS), поэтому при выводе лент Pillow
+не вызывается. Для каждой ширины из POSTS_THUMBNAIL_WIDTHS картинка
+обрезается по центру с пропорциями POSTS_THUMBNAIL_SIZE и сохраняется
+в JPEG и в современных форматах из POSTS_IMAGE_FORMATS, которые
+поддерживает установленный Pillow. Пути зависят только от имени
+картинки и размера. Самый широкий JPEG записывается в Post.thumbnail,
+список всех вариантов - в Post.renditions (JSON) для srcset.
+Пока миниатюр нет, шаблоны выводят оригинал.
+При POSTS_THUMBNAIL_WORKERS = 0 миниатюры строятся сразу, в том же потоке.
+
+Оригинал при загрузке через PostForm уменьшается до POSTS_IMAGE_MAX_SIZE
+и лишается EXIF (prepare_upload).
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps, features
+
+from posts.cache import POSTS, bump_post_lists, bump_version
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+JPEG = 'image/jpeg'
+
+# MIME-тип: (формат Pillow, расширение, имя модуля для features.check).
+FORMATS = {
+    'image/avif': ('AVIF', 'avif', 'avif'),
+    'image/webp': ('WEBP', 'webp', 'webp'),
+    JPEG: ('JPEG', 'jpg', None),
+}
+
+_executor = None
+
+
+def image_formats():
+    """MIME-типы вариантов: сначала современные форматы, JPEG последним."""
+    available = [
+        mime for mime in settings.POSTS_IMAGE_FORMATS
+        if mime in FORMATS and mime != JPEG
+        and features.check(FORMATS[mime][2])
+    ]
+    return available + [JPEG]
+
+
+def sizes():
+    width, height = settings.POSTS_THUMBNAIL_SIZE
+    return [(min(w, width), round(min(w, width) * height / width))
+            for w in sorted(set(settings.POSTS_THUMBNAIL_WIDTHS) | {width})]
+
+
+def rendition_name(image_name, size, mime=JPEG):
+    width, height = size
+    digest = hashlib.sha1(image_name.encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    extension = FORMATS[mime][1]
+    return f'posts/thumbnails/{width}x{height}/{stem}-{digest}.{extension}'
+
+
+def thumbnail_name(image_name):
+    return rendition_name(image_name, tuple(settings.POSTS_THUMBNAIL_SIZE))
+
+
+def is_stale(post):
+    if not post.image:
+        return bool(post.thumbnail)
+    return (post.thumbnail.name != thumbnail_name(post.image.name)
+            or not post.renditions)
+
+
+def _save(image, name, mime):
+    content = io.BytesIO()
+    image.save(content, FORMATS[mime][0],
+               quality=settings.POSTS_THUMBNAIL_QUALITY, optimize=True)
+    # Имя детерминировано: старый файл заменяем, а не получаем name_xyz.jpg.
+    default_storage.delete(name)
+    return default_storage.save(name, ContentFile(content.getvalue()))
+
+
+def render(image_name):
+    """
+    Строит все варианты картинки. Возвращает словарь
+    {MIME-тип: [[ширина, путь], ...]} по возрастанию ширины.
+    """
+    with default_storage.open(image_name) as source:
+        original = ImageOps.exif_transpose(Image.open(source))
+        original = original.convert('RGB')
+    renditions = {}
+    for size in sizes():
+        image = ImageOps.fit(original, size, Image.LANCZOS)
+        for mime in image_formats():
+            name = _save(image, rendition_name(image_name, size, mime), mime)
+            renditions.setdefault(mime, []).append([size[0], name])
+    return renditions
+
+
+def prepare_upload(upload):
+    """
+    Уменьшает загруженную картинку до POSTS_IMAGE_MAX_SIZE и убирает
+    EXIF (с поворотом по тегу Orientation). Картинки, которые не нужно
+    менять, и анимации возвращаются как есть, без перекодирования.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    image_format = image.format
+    max_size = settings.POSTS_IMAGE_MAX_SIZE
+    too_big = image.width > max_size[0] or image.height > max_size[1]
+    if getattr(image, 'is_animated', False) or not (
+        too_big or image.getexif()
+    ):
+        upload.seek(0)
+        return upload
+    icc_profile = image.info.get('icc_profile')
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(max_size, Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    content = io.BytesIO()
+    options = {'icc_profile': icc_profile} if icc_profile else {}
+    if image_format == 'JPEG':
+        options['quality'] = settings.POSTS_IMAGE_QUALITY
+    image.save(content, image_format, **options)
+    return SimpleUploadedFile(upload.name, content.getvalue(),
+                              upload.content_type)
+
+
+def generate(post_id, image_name):
+    """Строит миниатюры, если картинка поста за это время не сменилась."""
+    try:
+        renditions = render(image_name)
+        if Post.objects.filter(pk=post_id, image=image_name).update(
+            thumbnail=renditions[JPEG][-1][1],
+            renditions=json.dumps(renditions),
+        ):
+            bump_version(POSTS)
+            bump_post_lists(*Post.objects.filter(pk=post_id).values_list(
+                'author_id', 'group_id').get())
+    except Exception:
+        logger.exception('Не удалось построить миниатюры %s', image_name)
+
+
+def srcsets(post):
+    """
+    Пары (MIME-тип, srcset) для <picture>, JPEG последним.
+    Пусто, пока миниатюры не построены.
+    """
+    try:
+        renditions = json.loads(post.renditions)
+    except ValueError:
+        return []
+    if not isinstance(renditions, dict):
+        return []
+    return [
+        (mime, ', '.join(f'{default_storage.url(name)} {width}w'
+                         for width, name in renditions[mime]))
+        for mime in FORMATS if mime in renditions
+    ]
+
+
+def _run_in_worker(post_id, image_name):
+    try:
+        generate(post_id, image_name)
+    finally:
+        connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.POSTS_THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def schedule(post):
+    """Ставит построение миниатюр в очередь, если картинка сменилась."""
+    if not is_stale(post):
+        return
+    if not post.image:
+        Post.objects.filter(pk=post.pk).update(thumbnail='', renditions='')
+        return
+    if not settings.POSTS_THUMBNAIL_WORKERS:
+        generate(post.pk, post.image.name)
+        return
+    post_id, image_name = post.pk, post.image.name
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run_in_worker, post_id, image_name)
+    )
@@ -1,8 +1,299 @@
+import json
+from collections.abc import Sequence
+
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from posts.cache import cached_count
+
+OFFSET = 'offset'
+KEYSET = 'keyset'
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def _serialize(value):
+    # isoformat() без усечения микросекунд, иначе курсор теряет точность.
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{value!r} не сериализуется в курсор')
+
+
+def encode_cursor(direction, values):
+    """Упаковывает направление и значения ключа в непрозрачный токен."""
+    raw = json.dumps([direction, *values], default=_serialize)
+    return urlsafe_base64_encode(raw.encode())
+
+
+def decode_cursor(token):
+    """Распаковывает токен. Для испорченного токена возвращает None."""
+    try:
+        direction, *values = json.loads(urlsafe_base64_decode(token))
+    except (TypeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS):
+        return None
+    if not all(isinstance(value, (str, int, float)) for value in values):
+        return None
+    return direction, values
+
+
+class KeysetPage(Sequence):
+    """
+    Страница курсорной пагинации.
+
+    Выбирает на одну запись больше, чем помещается на страницу, чтобы
+    узнать о существовании следующей страницы без COUNT(*) и OFFSET.
+    Запрос к базе выполняется лениво, при первом обращении к записям.
+    """
+
+    is_keyset = True
+
+    def __init__(self, paginator, direction=None, values=None):
+        self.paginator = paginator
+        self.direction = direction
+        self.values = values
+
+    @cached_property
+    def _window(self):
+        queryset = self.paginator.object_list
+        ordering = self.paginator.ordering
+        if self.direction == PREVIOUS:
+            ordering = tuple(invert_ordering(field) for field in ordering)
+        per_page = self.paginator.per_page
+        if hasattr(queryset, 'keyset_window'):
+            # Список не QuerySet (posts.feed.FollowFeed): окно строит сам.
+            rows = queryset.keyset_window(ordering, self.values,
+                                          per_page + 1)
+        else:
+            if self.values is not None:
+                queryset = queryset.filter(
+                    keyset_filter(queryset.model, ordering, self.values)
+                )
+            rows = list(queryset.order_by(*ordering)[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if self.direction == PREVIOUS:
+            rows.reverse()
+        return rows, has_more
+
+    @property
+    def object_list(self):
+        return self._window[0]
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __repr__(self):
+        return '<Keyset page of %s>' % len(self)
+
+    def has_next(self):
+        if self.direction == PREVIOUS:
+            return True
+        return self._window[1]
+
+    def has_previous(self):
+        if self.direction == PREVIOUS:
+            return self._window[1]
+        return self.direction == NEXT
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator.cursor_for(NEXT, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self.paginator.cursor_for(PREVIOUS, self.object_list[0])
+
+
+class KeysetPaginator:
+    """
+    Курсорный (keyset) пагинатор.
+    --------
+    Атрибуты
+    --------
+    object_list: QuerySet
+        набор записей для постраничного вывода
+    per_page: int
+        количество записей на странице
+    ordering: tuple
+        уникальный ключ сортировки, по которому строится курсор
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    def get_page(self, cursor):
+        """Возвращает страницу по курсору; без курсора - первую."""
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            return KeysetPage(self)
+        direction, values = decoded
+        if len(values) != len(self.ordering):
+            return KeysetPage(self)
+        model = self.object_list.model
+        try:
+            values = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            return KeysetPage(self)
+        # Число вне BIGINT база не примет (OverflowError).
+        if any(isinstance(value, int) and not -2 ** 63 <= value < 2 ** 63
+               for value in values):
+            return KeysetPage(self)
+        return KeysetPage(self, direction, values)
+
+    def cursor_for(self, direction, obj):
+        return encode_cursor(direction, [
+            getattr(obj, obj._meta.get_field(field.lstrip('-')).attname)
+            for field in self.ordering
+        ])
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Пагинатор без COUNT(*) на каждый запрос.
+    --------
+    Атрибуты
+    --------
+    known_count: int
+        готовое число записей, например денормализованный счетчик
+    count_name: str
+        имя списка для cached_count, если числа нет
+    count_versions: tuple
+        версии кеша, при смене которых число пересчитывается
+    counted: bool
+        число посчитано COUNT(*) в этом запросе, а не взято из кеша
+    """
+
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, count=None, count_name=None,
+                 count_versions=(), **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.known_count = count
+        self.count_name = count_name
+        self.count_versions = tuple(count_versions)
+        self.counted = False
+
+    @cached_property
+    def count(self):
+        if self.known_count is not None:
+            return self.known_count
+        if self.count_name is None:
+            return super().count
+        return cached_count(self.count_name, self.count_versions,
+                            self._count)
+
+    def _count(self):
+        self.counted = True
+        return super().count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_name is None or self.counted:
+            return super().page(number)
+        # Число из кеша может быть устаревшим, поэтому страница не
+        # обрезается по нему, как в Paginator.page: новые записи не
+        # пропадают с нее.
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if number == self.num_pages:
+            top += self.orphans
+        return self._get_page(self.object_list[bottom:top], number, self)
+
+    def _get_page(self, *args, **kwargs):
+        # Обычный Page, номера для paginator.html - атрибутом.
+        page = super()._get_page(*args, **kwargs)
+        page.elided_page_range = list(
+            self.get_elided_page_range(page.number)
+        )
+        return page
+
+    def get_elided_page_range(self, number=1, on_each_side=3, on_ends=2):
+        """
+        Номера страниц вокруг текущей и по краям, пропуски - ELLIPSIS:
+        1 2 … 7 8 9 10 11 … 49 50.
+        """
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > on_each_side + on_ends + 2:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1,
+                             self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+
+def invert_ordering(field):
+    if field.startswith('-'):
+        return field[1:]
+    return '-' + field
+
+
+def keyset_filter(model, ordering, values):
+    """
+    Условие "строго после курсора" для лексикографической сортировки,
+    например для ('-pub_date', '-id'):
+        pub_date < x OR (pub_date = x AND id < y)
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = model._meta.get_field(field.lstrip('-')).attname
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def get_pagination_mode(request):
+    """Режим пагинации для текущего view из POSTS_PAGINATION_MODES."""
+    match = getattr(request, 'resolver_match', None)
+    modes = getattr(settings, 'POSTS_PAGINATION_MODES', {})
+    if match is None:
+        return OFFSET
+    return modes.get(match.view_name, OFFSET)
 
 
-def paginate_posts(request, list_object):
-    paginator = Paginator(list_object, settings.POSTS_PER_PAGE)
+def paginate_posts(request, list_object, **count_options):
+    """
+    Страница списка в режиме из POSTS_PAGINATION_MODES. count_options
+    (count, count_name, count_versions) - откуда взять число записей
+    вместо COUNT(*), см. CachedCountPaginator.
+    """
+    if get_pagination_mode(request) == KEYSET:
+        paginator = KeysetPaginator(list_object, settings.POSTS_PER_PAGE)
+        return paginator.get_page(request.GET.get('cursor'))
+    paginator = CachedCountPaginator(list_object, settings.POSTS_PER_PAGE,
+                                     **count_options)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
@@ -1,62 +1,117 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
-
+from posts import conditional, writebehind
+from posts.cache import (COMMENTS, POSTS, author_version_name,
+                         follow_version_name, group_version_name,
+                         list_cache_context)
+from posts.feed import follow_feed
 from posts.forms import CommentForm, PostForm
-from posts.models import Follow, Group, Post
-from posts.utils import paginate_posts
+from posts.models import Follow, Post
+from posts.search import SEARCH, search_posts
+from posts.utils import CachedCountPaginator, paginate_posts
 
 User = get_user_model()
 
 
-@cache_page(20, key_prefix='index_page')
 def index(request):
     template = 'posts/index.html'
     context = {
-        'page_obj': paginate_posts(request, Post.objects.all()),
+        'page_obj': paginate_posts(request, Post.objects.for_feed(),
+                                   count_name='index',
+                                   count_versions=(POSTS,)),
+        **list_cache_context(POSTS, COMMENTS),
     }
     return render(request, template, context)
 
 
+@conditional.group_conditions
 def group_posts(request, slug):
     template = 'posts/group_list.html'
-    group = get_object_or_404(Group, slug=slug)
-    posts_group = group.posts.all()
+    group = conditional.group(request, slug)
+    posts_group = group.posts.for_feed()
     context = {
         'group': group,
-        'page_obj': paginate_posts(request, posts_group),
+        'page_obj': paginate_posts(
+            request, posts_group, count_name=f'group:{group.pk}',
+            count_versions=(group_version_name(group.pk),),
+        ),
+        **list_cache_context(POSTS, COMMENTS, group_version_name(group.pk)),
+    }
+    return render(request, template, context)
+
+
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    # Результат поиска - список id, а не QuerySet: курсоры к нему не
+    # применимы, страницы всегда по номерам (POSTS_PAGINATION_MODES
+    # для поиска не действует).
+    paginator = CachedCountPaginator(search_posts(query),
+                                     settings.POSTS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    # В пагинаторе только id: посты страницы берутся одним запросом.
+    posts = Post.objects.for_feed().in_bulk(page_obj.object_list)
+    page_obj.object_list = [
+        posts[pk] for pk in page_obj.object_list if pk in posts
+    ]
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+        **list_cache_context(POSTS, COMMENTS, SEARCH),
     }
     return render(request, template, context)
 
 
+def _posts_count(author):
+    # Счетчик AuthorStats; пока строки нет, число считается COUNT(*).
+    stats = getattr(author, 'stats', None)
+    return stats.posts_count if stats is not None else None
+
+
+@conditional.profile_conditions
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    user_posts = author.posts.all()
-    following = (request.user.is_authenticated
-                 and Follow.objects.filter(user=request.user,
-                                           author=author).exists())
+    author = conditional.author(request, username)
+    user_posts = author.posts.for_feed()
     context = {
         'author': author,
-        'page_obj': paginate_posts(request, user_posts),
-        'following': following,
+        'page_obj': paginate_posts(request, user_posts,
+                                   count=_posts_count(author)),
+        'following': conditional.following(request, username),
+        **list_cache_context(POSTS, COMMENTS,
+                             author_version_name(author.pk)),
     }
     return render(request, template, context)
 
 
+@conditional.post_conditions
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    comments = get_object_or_404(Post, pk=post_id).comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    # Число комментариев хранится в посте, COUNT(*) не нужен.
+    paginator = CachedCountPaginator(post.comments.select_related('author'),
+                                     settings.POSTS_COMMENTS_PER_PAGE,
+                                     count=post.comments_count)
     context = {
-        'post': get_object_or_404(Post, pk=post_id),
+        'post': post,
         'form': CommentForm(),
-        'comments': comments,
+        'comments': paginator.get_page(request.GET.get('page')),
+        'pending_comments': writebehind.pending_comments(post.pk,
+                                                         request.user),
     }
     return render(request, template, context)
 
 
 @login_required
+@transaction.atomic
 def post_create(request):
     template = 'posts/create_post.html'
     form = PostForm(
@@ -74,7 +129,7 @@ def post_create(request):
 def post_edit(request, post_id):
     template = 'posts/create_post.html'
     current_post = get_object_or_404(Post, pk=post_id)
-    if request.user != current_post.author:
+    if current_post.author_id != request.user.pk:
         return redirect('posts:post_detail', current_post.pk)
     form = PostForm(
         request.POST or None,
@@ -82,7 +137,10 @@ def post_edit(request, post_id):
         instance=current_post,
     )
     if form.is_valid():
-        current_post.save()
+        # comments_count меняется F()-выражением, его не перезаписываем.
+        current_post.save(
+            update_fields=(*PostForm.Meta.fields, 'updated')
+        )
         return redirect('posts:post_detail', current_post.pk)
     context = {
         'form': form,
@@ -92,9 +150,14 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     form = CommentForm(request.POST or None)
-    if form.is_valid():
+    if form.is_valid() and writebehind.enabled():
+        # Пост проверяется при записи очереди, здесь запроса нет.
+        writebehind.add_comment(post_id, request.user.pk,
+                                form.cleaned_data['text'])
+    elif form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = get_object_or_404(Post, pk=post_id)
@@ -105,16 +168,32 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    posts = Post.objects.filter(author__following__user=request.user)
+    writebehind.flush_for(request.user.pk)
     context = {
-        'page_obj': paginate_posts(request, posts),
+        'page_obj': paginate_posts(
+            request, follow_feed(request.user),
+            count_name=f'follow:{request.user.pk}',
+            count_versions=(POSTS, follow_version_name(request.user.pk)),
+        ),
+        **list_cache_context(POSTS, COMMENTS,
+                             follow_version_name(request.user.pk)),
     }
     return render(request, template, context)
 
 
+def _user_id(username):
+    return get_object_or_404(User.objects.values_list('pk', flat=True),
+                             username=username)
+
+
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
-    if username != request.user.username:
+    if username == request.user.username:
+        return redirect('posts:profile', username)
+    if writebehind.enabled():
+        writebehind.follow(request.user.pk, _user_id(username))
+    else:
         Follow.objects.get_or_create(
             user=request.user,
             author=User.objects.get(username=username)
@@ -123,9 +202,13 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
-    Follow.objects.filter(
-        user=request.user,
-        author=User.objects.get(username=username)
-    ).delete()
+    if writebehind.enabled():
+        writebehind.unfollow(request.user.pk, _user_id(username))
+    else:
+        Follow.objects.filter(
+            user=request.user,
+            author=User.objects.get(username=username)
+        ).delete()
     return redirect('posts:profile', username)
@@ -0,0 +1,322 @@
+"""
+Отложенная запись комментариев и подписок (POSTS_WRITE_BEHIND).
+
+add_comment, profile_follow и profile_unfollow не пишут в базу, а ставят
+запись в очередь процесса. Фоновый поток раз в
+POSTS_WRITE_BEHIND_INTERVAL секунд (или сразу, когда в очереди набралось
+POSTS_WRITE_BEHIND_BATCH записей) пишет очередь одной короткой
+транзакцией: комментарии - bulk_create, подписки - bulk_create с
+ignore_conflicts, отписки - одним DELETE. Подписка и отписка одной пары
+до записи схлопываются: пишется последнее действие.
+
+bulk_create не отправляет сигналы, поэтому то, что для одиночной записи
+делает posts.signals, здесь делается на всю пачку: сдвиг счетчиков,
+переиндексация постов для поиска, дозаполнение лент и смена версий кеша.
+Комментарии к удаленным постам и подписки на удаленных пользователей
+отбрасываются.
+
+Read-your-writes для автора записей: пока запись не в базе, страница
+поста показывает его комментарии из очереди, профиль - состояние
+подписки из очереди, а лента подписок перед чтением записывает очередь.
+Очередь своя у каждого процесса, поэтому это верно, пока запросы
+пользователя попадают в тот же процесс. При выходе процесса очередь
+записывается (atexit).
+
+При POSTS_WRITE_BEHIND_INTERVAL = 0 фонового потока нет: очередь
+пишется, когда наберется пачка, при чтении ленты подписок и при выходе.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import Case, DateTimeField, Q, Value, When
+from django.utils import timezone
+
+from posts import counters, feed, search
+from posts.cache import COMMENTS, bump_version, follow_version_name
+from posts.models import Comment, Follow, Post
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+class WriteBehindQueue:
+    """
+    Очередь записей процесса.
+    --------
+    Атрибуты
+    --------
+    comments: list
+        комментарии (post_id, author_id, text, created) в порядке
+        добавления
+    follows: dict
+        {(user_id, author_id): True - подписка, False - отписка}
+    in_flight: tuple
+        (comments, follows), которые сейчас пишутся: до коммита они
+        видны автору так же, как очередь
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flushing = threading.Lock()
+        self.wakeup = threading.Event()
+        self.comments = []
+        self.follows = {}
+        self.in_flight = ([], {})
+        self.thread = None
+
+    def __len__(self):
+        with self.lock:
+            return len(self.comments) + len(self.follows)
+
+    def add_comment(self, post_id, author_id, text):
+        with self.lock:
+            self.comments.append((post_id, author_id, text, timezone.now()))
+        self._added()
+
+    def set_follow(self, user_id, author_id, following):
+        with self.lock:
+            self.follows[user_id, author_id] = following
+        self._added()
+
+    def _added(self):
+        interval = settings.POSTS_WRITE_BEHIND_INTERVAL
+        if interval and self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(
+                        target=self._run, args=(interval,),
+                        name='writebehind', daemon=True,
+                    )
+                    self.thread.start()
+        if len(self) >= settings.POSTS_WRITE_BEHIND_BATCH:
+            if self.thread is not None:
+                self.wakeup.set()
+            else:
+                self.flush()
+
+    def _run(self, interval):
+        while True:
+            self.wakeup.wait(interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось записать очередь, '
+                                 'повтор через %s с', interval)
+            finally:
+                connections.close_all()
+
+    def pending_comments(self, post_id, author_id):
+        """Комментарии автора к посту, которых еще нет в базе."""
+        with self.lock:
+            queued = self.in_flight[0] + self.comments
+        return [item for item in queued
+                if item[0] == post_id and item[1] == author_id]
+
+    def pending_follow(self, user_id, author_id):
+        """True/False, если подписка или отписка еще не в базе, иначе None."""
+        with self.lock:
+            for follows in (self.follows, self.in_flight[1]):
+                if (user_id, author_id) in follows:
+                    return follows[user_id, author_id]
+        return None
+
+    def pending(self, user_id):
+        """Сколько записей пользователя еще не в базе."""
+        with self.lock:
+            comments = self.in_flight[0] + self.comments
+            follows = [*self.in_flight[1], *self.follows]
+        return (sum(1 for item in comments if item[1] == user_id)
+                + sum(1 for pair in follows if pair[0] == user_id))
+
+    def flush(self):
+        """Пишет очередь одной транзакцией. Возвращает число записей."""
+        with self.flushing:
+            with self.lock:
+                comments, follows = self.comments, self.follows
+                self.comments, self.follows = [], {}
+                self.in_flight = (comments, follows)
+            if not comments and not follows:
+                return 0
+            try:
+                with transaction.atomic():
+                    write(comments, follows)
+            except Exception:
+                with self.lock:
+                    self.comments = comments + self.comments
+                    self.follows = {**follows, **self.follows}
+                raise
+            finally:
+                with self.lock:
+                    self.in_flight = ([], {})
+            return len(comments) + len(follows)
+
+
+def _existing_users(comments, follows):
+    ids = {item[1] for item in comments}
+    for user_id, author_id in follows:
+        ids.update((user_id, author_id))
+    if not ids:
+        return set()
+    return set(User.objects.filter(pk__in=ids).values_list('pk', flat=True))
+
+
+def _write_comments(comments, users):
+    if not comments:
+        return
+    posts = set(Post.objects.filter(
+        pk__in={item[0] for item in comments}
+    ).order_by().values_list('pk', flat=True))
+    comments = [item for item in comments
+                if item[0] in posts and item[1] in users]
+    created = Comment.objects.bulk_create(
+        Comment(post_id=post_id, author_id=author_id, text=text)
+        for post_id, author_id, text, _ in comments
+    )
+    if not created:
+        return
+    if created[0].pk is None:
+        # bulk_create в SQLite не возвращает id, а поиску они нужны.
+        # SQLite пишет одно соединение за раз, транзакция еще открыта:
+        # последние len(created) id по порядку - наши комментарии.
+        ids = list(Comment.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        )[:len(created)])
+        for comment, pk in zip(created, reversed(ids)):
+            comment.pk = pk
+    _restore_created(created, [item[3] for item in comments])
+    per_post = Counter(comment.post_id for comment in created)
+    for post_id, delta in per_post.items():
+        counters.shift_comments(post_id, delta)
+    search.comments_added(created)
+    bump_version(COMMENTS)
+
+
+def _restore_created(comments, queued_at):
+    # created - auto_now_add: bulk_create ставит время записи очереди.
+    # Время добавления комментария возвращается одним UPDATE.
+    for comment, created in zip(comments, queued_at):
+        comment.created = created
+    field = DateTimeField()
+    Comment.objects.filter(pk__in=[comment.pk for comment in comments]).update(
+        created=Case(
+            *(When(pk=comment.pk,
+                   then=Value(comment.created, output_field=field))
+              for comment in comments),
+            output_field=field,
+        )
+    )
+
+
+def _write_unfollows(pairs):
+    if not pairs:
+        return
+    by_user = defaultdict(list)
+    for user_id, author_id in pairs:
+        by_user[user_id].append(author_id)
+    # QuerySet.delete() отправляет post_delete для каждой строки:
+    # счетчики и ленты правит posts.signals.follow_deleted.
+    Follow.objects.filter(reduce(or_, (
+        Q(user_id=user_id, author_id__in=authors)
+        for user_id, authors in by_user.items()
+    ))).delete()
+
+
+def _write_follows(pairs, users):
+    pairs = [(user_id, author_id) for user_id, author_id in pairs
+             if user_id != author_id
+             and user_id in users and author_id in users]
+    if not pairs:
+        return
+    existing = set(Follow.objects.filter(
+        user_id__in={user_id for user_id, _ in pairs},
+        author_id__in={author_id for _, author_id in pairs},
+    ).values_list('user_id', 'author_id'))
+    new = [pair for pair in pairs if pair not in existing]
+    Follow.objects.bulk_create(
+        (Follow(user_id=user_id, author_id=author_id)
+         for user_id, author_id in new),
+        ignore_conflicts=True,
+    )
+    for author_id, delta in Counter(a for _, a in new).items():
+        counters.shift_author(author_id, 'followers_count', delta)
+    for user_id, delta in Counter(u for u, _ in new).items():
+        counters.shift_author(user_id, 'following_count', delta)
+    popular = feed.popular_authors()
+    for user_id, author_id in new:
+        feed.backfill(user_id, author_id, popular)
+    for user_id in {user_id for user_id, _ in new}:
+        bump_version(follow_version_name(user_id))
+
+
+def write(comments, follows):
+    """Пишет пачку записей; вызывается внутри транзакции."""
+    users = _existing_users(comments, follows)
+    _write_comments(comments, users)
+    _write_unfollows([pair for pair, value in follows.items() if not value])
+    _write_follows([pair for pair, value in follows.items() if value], users)
+
+
+queue = WriteBehindQueue()
+
+
+def enabled():
+    return settings.POSTS_WRITE_BEHIND
+
+
+def add_comment(post_id, author_id, text):
+    queue.add_comment(post_id, author_id, text)
+
+
+def follow(user_id, author_id):
+    queue.set_follow(user_id, author_id, True)
+
+
+def unfollow(user_id, author_id):
+    queue.set_follow(user_id, author_id, False)
+
+
+def pending(user_id):
+    return queue.pending(user_id) if user_id is not None else 0
+
+
+def pending_follow(user_id, author_id):
+    return queue.pending_follow(user_id, author_id)
+
+
+def pending_comments(post_id, user):
+    """Несохраненные Comment пользователя к посту, новые первыми."""
+    if not user.is_authenticated:
+        return []
+    return [
+        Comment(post_id=post_id, author=user, text=text, created=created)
+        for _, _, text, created in reversed(
+            queue.pending_comments(post_id, user.pk)
+        )
+    ]
+
+
+def flush_for(user_id):
+    """Пишет очередь, если в ней есть записи пользователя."""
+    if queue.pending(user_id):
+        queue.flush()
+
+
+def flush():
+    return queue.flush()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        queue.flush()
+    except Exception:
+        logger.exception('Очередь отложенной записи не записана при выходе')
@@ -0,0 +1,11 @@
+"""
+Настройки проекта: base - общие, dev - разработка и тесты (по умолчанию),
+prod - продакшен. Профиль выбирается переменной окружения DJANGO_ENV,
+настройки внутри профиля - переменными окружения (см. dev и prod).
+"""
+import os
+
+if os.getenv('DJANGO_ENV', 'dev') == 'prod':
+    from .prod import *  # noqa: F401,F403
+else:
+    from .dev import *  # noqa: F401,F403
@@ -0,0 +1,388 @@
+"""
+Общие настройки. DEBUG, SECRET_KEY, ALLOWED_HOSTS, базу, кеш, шаблоны
+и сессии задают профили dev и prod (см. __init__) функциями
+*_settings отсюда.
+"""
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)
+)))
+
+
+def env_bool(name, default):
+    value = os.getenv(name)
+    return default if value is None else value == '1'
+
+
+def env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def env_list(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+INSTALLED_APPS = [
+    'posts.apps.PostsConfig',
+    'about.apps.AboutConfig',
+    'core.apps.CoreConfig',
+    'users.apps.UsersConfig',
+    'api.apps.ApiConfig',
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'sorl.thumbnail',
+]
+
+MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.QueryInspectorMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'yatube.urls'
+
+# Тесты падают, если запрос превышает бюджет SQL-запросов (core.querylog).
+TEST_RUNNER = 'core.testing.QueryBudgetRunner'
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+# {% inline_include %} встраивает шаблон в родителя при компиляции;
+# при False тег работает как обычный {% include %}.
+TEMPLATES_INLINE_INCLUDES = True
+
+
+def template_settings(cached):
+    """
+    С cached.Loader шаблоны разбираются один раз на процесс, без него
+    правки шаблонов видны без перезапуска.
+    """
+    loaders = TEMPLATE_LOADERS
+    if cached:
+        loaders = [('django.template.loaders.cached.Loader', loaders)]
+    return [
+        {
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'DIRS': [TEMPLATES_DIR],
+            'OPTIONS': {
+                'loaders': loaders,
+                'context_processors': [
+                    'django.template.context_processors.debug',
+                    'django.template.context_processors.request',
+                    'django.contrib.auth.context_processors.auth',
+                    'django.contrib.messages.context_processors.messages',
+                    'core.context_processors.year.year',
+                ],
+            },
+        },
+    ]
+
+
+WSGI_APPLICATION = 'yatube.wsgi.application'
+
+# Потоков для представлений под ASGI (yatube/asgi.py, core.asgi).
+ASGI_THREADS = env_int('ASGI_THREADS', 8)
+
+
+# База выбирается переменными окружения:
+#   DB_ENGINE   - sqlite (по умолчанию) или postgresql (нужен psycopg2);
+#   DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT - параметры
+#                 соединения с PostgreSQL;
+#   DB_POOLER   - pgbouncer, если соединения идут через PgBouncer
+#                 в режиме transaction: серверные курсоры iterator()
+#                 не переживают смену соединения между транзакциями;
+#   DB_STATEMENT_TIMEOUT_MS - предел времени одного запроса в PostgreSQL;
+#   DB_READ_REPLICA - 1, чтобы чтения шли в отдельное соединение
+#                 READ_REPLICA (см. core.routers): для SQLite это тот же
+#                 файл, открытый только для чтения.
+# Пул соединений - постоянные соединения Django (CONN_MAX_AGE): каждый
+# поток держит свое соединение между запросами; общий пул на несколько
+# процессов дает PgBouncer.
+READ_REPLICA = 'replica'
+
+DATABASE_ROUTERS = ['core.routers.ReadWriteRouter']
+
+# Прагмы каждого нового соединения с SQLite (core.sqlite):
+#   journal_mode=wal  - читатели не ждут писателя, писатель - читателей;
+#   synchronous=normal - в режиме WAL fsync только при checkpoint,
+#                       транзакции не теряются при падении процесса;
+#   mmap_size         - страницы читаются из отображенного файла без
+#                       копирования в кеш соединения;
+#   cache_size        - кеш страниц соединения, отрицательное - в КиБ;
+#   busy_timeout      - сколько миллисекунд ждать блокировку записи
+#                       вместо ошибки "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+}
+
+DB_ENGINES = {
+    'sqlite': 'django.db.backends.sqlite3',
+    'postgresql': 'django.db.backends.postgresql',
+}
+
+
+def database_settings(conn_max_age):
+    """conn_max_age - сколько секунд держать соединение (0 - один запрос)."""
+    engine = os.getenv('DB_ENGINE', 'sqlite')
+    if engine == 'sqlite':
+        name = os.path.join(BASE_DIR, 'db.sqlite3')
+        databases = {
+            'default': {
+                'ENGINE': DB_ENGINES[engine],
+                'NAME': name,
+                'CONN_MAX_AGE': conn_max_age,
+            }
+        }
+        if env_bool('DB_READ_REPLICA', False):
+            databases[READ_REPLICA] = {
+                'ENGINE': DB_ENGINES[engine],
+                'NAME': f'file:{name}?mode=ro',
+                'CONN_MAX_AGE': conn_max_age,
+                'TEST': {'MIRROR': 'default'},
+            }
+        return databases
+    options = {'connect_timeout': env_int('DB_CONNECT_TIMEOUT', 5)}
+    statement_timeout = env_int('DB_STATEMENT_TIMEOUT_MS', 0)
+    if statement_timeout:
+        options['options'] = f'-c statement_timeout={statement_timeout}'
+    return {
+        'default': {
+            'ENGINE': DB_ENGINES[engine],
+            'NAME': os.getenv('DB_NAME', 'yatube'),
+            'USER': os.getenv('DB_USER', 'yatube'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', '127.0.0.1'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': conn_max_age,
+            'DISABLE_SERVER_SIDE_CURSORS':
+                os.getenv('DB_POOLER') == 'pgbouncer',
+            'OPTIONS': options,
+        }
+    }
+
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+# Кеш выбирается переменными окружения:
+#   CACHE_BACKEND  - locmem (свой у каждого процесса, по умолчанию в dev),
+#                    file, memcached, redis (по умолчанию в prod)
+#                    или redis-fake;
+#   CACHE_LOCATION - адрес сервера или каталог, по умолчанию свой для
+#                    каждого бэкенда;
+#   DEPLOY_ID      - идентификатор выкладки, входит в префикс ключей,
+#                    чтобы выкладки не читали фрагменты друг друга.
+# redis требует пакет django-redis (есть в requirements.txt), redis-fake -
+# еще и fakeredis с lupa
+# (без lupa не работает EVAL, на котором django-redis строит incr):
+# это Redis-совместимая замена сервера внутри процесса для тестов.
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'yatube'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache',
+             os.path.join(BASE_DIR, 'cache')),
+    'memcached': ('django.core.cache.backends.memcached.MemcachedCache',
+                  '127.0.0.1:11211'),
+    'redis': ('django_redis.cache.RedisCache', 'redis://127.0.0.1:6379/1'),
+    'redis-fake': ('django_redis.cache.RedisCache', 'redis://fake/0'),
+}
+
+
+def cache_settings(backend):
+    caches = {
+        'default': {
+            'BACKEND': CACHE_BACKENDS[backend][0],
+            'LOCATION': os.getenv('CACHE_LOCATION',
+                                  CACHE_BACKENDS[backend][1]),
+            'KEY_PREFIX': 'yatube:' + os.getenv('DEPLOY_ID', 'dev'),
+        }
+    }
+    if backend == 'redis-fake':
+        import fakeredis
+
+        caches['default']['OPTIONS'] = {
+            'CONNECTION_POOL_KWARGS': {
+                'connection_class': fakeredis.FakeConnection,
+                'server': fakeredis.FakeServer(),
+            },
+        }
+    return caches
+
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+LOGIN_URL = 'users:login'
+
+LOGIN_REDIRECT_URL = 'posts:index'
+
+# LOGOUT_REDIRECT_URL = 'posts:index'
+
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+
+LANGUAGE_CODE = 'ru'
+
+TIME_ZONE = 'UTC'
+
+CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = True
+
+STATIC_URL = '/static/'
+
+STATIC_ROOT = os.getenv('STATIC_ROOT', os.path.join(BASE_DIR, 'collected'))
+
+POSTS_PER_PAGE = env_int('POSTS_PER_PAGE', 10)
+
+# Комментариев на странице поста.
+POSTS_COMMENTS_PER_PAGE = env_int('POSTS_COMMENTS_PER_PAGE', 50)
+
+# Сколько последних комментариев показывать под постом в лентах.
+POSTS_FEED_COMMENTS = 3
+
+# Время жизни фрагментов лент в кеше. Устаревшие фрагменты не отдаются:
+# их ключи содержат версию, которая меняется при записи (posts.cache).
+POSTS_CACHE_TIMEOUT = 60 * 15
+
+# Сколько секунд пагинатор ленты может показывать устаревшее число
+# записей после изменений, прежде чем пересчитать его COUNT(*).
+POSTS_COUNT_MAX_STALENESS = 30
+
+# Защита от "набега" на кеш лент: фрагмент перестраивает один запрос под
+# блокировкой, остальные отдают старую версию; незадолго до истечения
+# фрагмент с вероятностью обновляется заранее (чем больше BETA, тем раньше).
+POSTS_CACHE_LOCK_TIMEOUT = 10
+
+POSTS_CACHE_LOCK_WAIT = 0.5
+
+POSTS_CACHE_EARLY_REFRESH_BETA = 1.0
+
+# Режим пагинации по view: 'offset' (номера страниц, по умолчанию)
+# или 'keyset' (курсоры ?cursor=, без COUNT(*) и OFFSET).
+POSTS_PAGINATION_MODES = {
+    'posts:index': 'offset',
+    'posts:group_list': 'offset',
+    'posts:profile': 'offset',
+    'posts:follow_index': 'offset',
+}
+
+# Лента подписок (posts.feed): посты авторов, у которых подписчиков больше
+# FEED_FANOUT_LIMIT, подмешиваются в ленту при чтении, а не при записи.
+# Авторов по этому порогу переводит команда refresh_feeds (по расписанию).
+FEED_FANOUT_LIMIT = 1000
+
+# Сколько секунд процессы помнят множество популярных авторов.
+FEED_POPULAR_TIMEOUT = 60
+
+# Сколько последних постов автора попадает в ленту при подписке.
+FEED_BACKFILL_SIZE = 100
+
+# Миниатюры картинок постов (posts.thumbnails): наибольший размер, ширины
+# для srcset, дополнительные форматы (если их поддерживает Pillow), качество
+# и число фоновых потоков; при 0 миниатюры строятся в потоке запроса.
+POSTS_THUMBNAIL_SIZE = (960, 339)
+
+POSTS_THUMBNAIL_WIDTHS = (320, 640, 960)
+
+POSTS_IMAGE_FORMATS = ('image/avif', 'image/webp')
+
+POSTS_THUMBNAIL_QUALITY = 80
+
+POSTS_THUMBNAIL_WORKERS = 2
+
+# Атрибут sizes для <picture>: какую ширину картинка занимает на странице.
+POSTS_PICTURE_SIZES = '(min-width: 992px) 720px, 100vw'
+
+# Загруженные картинки больше этого размера уменьшаются, EXIF удаляется.
+POSTS_IMAGE_MAX_SIZE = (2048, 2048)
+
+POSTS_IMAGE_QUALITY = 90
+
+# Поиск (posts.search): 'fts5' - виртуальная таблица SQLite FTS5, 'table' -
+# таблица SearchPosting, 'auto' - FTS5, если миграция смогла ее создать.
+POSTS_SEARCH_BACKEND = 'auto'
+
+# Во сколько раз слово из текста поста весомее слова из комментария.
+POSTS_SEARCH_TEXT_WEIGHT = 2
+
+POSTS_SEARCH_MAX_TERMS = 8
+
+POSTS_SEARCH_MAX_RESULTS = 1000
+
+# Отложенная запись комментариев и подписок (posts.writebehind): запросы
+# ставят запись в очередь, фоновый поток пишет ее пачкой раз в INTERVAL
+# секунд или когда наберется BATCH записей. При INTERVAL = 0 потока нет.
+POSTS_WRITE_BEHIND = env_bool('POSTS_WRITE_BEHIND', False)
+
+POSTS_WRITE_BEHIND_INTERVAL = 0.5
+
+POSTS_WRITE_BEHIND_BATCH = 200
+
+# JSON API (api): наибольшее число записей на странице (?limit=).
+POSTS_API_MAX_LIMIT = 100
+
+# Профилирование запросов (core.middleware.ProfilingMiddleware): метрики
+# по view видны сотрудникам на /-/profiling/ (JSON) и /-/metrics/
+# (Prometheus). Процентили считаются по последним PROFILING_SAMPLES
+# запросам каждого view. Каждый PROFILING_CPROFILE_EVERY-й запрос
+# профилируется cProfile (0 - выключено).
+PROFILING_ENABLED = env_bool('PROFILING_ENABLED', False)
+
+PROFILING_SAMPLES = 1000
+
+PROFILING_CPROFILE_EVERY = env_int('PROFILING_CPROFILE_EVERY', 0)
+
+PROFILING_CPROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+
+# Журнал SQL (core.middleware.QueryInspectorMiddleware): запросы дольше
+# QUERYLOG_SLOW_MS и повторы сверх бюджета пишутся в лог yatube.queries,
+# а при QUERYLOG_RAISE (в тестах) - исключение. QUERYLOG_ENABLED задают
+# профили.
+QUERYLOG_RAISE = False
+
+QUERYLOG_SLOW_MS = env_int('QUERYLOG_SLOW_MS', 100)
+
+QUERYLOG_MAX_QUERIES = 15
+
+QUERYLOG_MAX_DUPLICATES = 1
+
+QUERYLOG_MAX_SIMILAR = 3
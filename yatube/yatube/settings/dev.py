@@ -0,0 +1,34 @@
+import os
+
+from .base import *  # noqa: F401,F403
+from .base import (cache_settings, database_settings, env_bool, env_int,
+                   env_list, template_settings)
+
+ENVIRONMENT = 'dev'
+
+DEBUG = env_bool('DJANGO_DEBUG', True)
+
+SECRET_KEY = os.getenv(
+    'SECRET_KEY', '!&0t53*i4_kvd_!d*%4*pywq$@_^p#l+sj9qywnoz2@sc=5)rj'
+)
+
+ALLOWED_HOSTS = env_list('ALLOWED_HOSTS', [
+    'localhost',
+    '127.0.0.1',
+    '[::1]',
+    'testserver',
+])
+
+DATABASES = database_settings(env_int('CONN_MAX_AGE', 0))
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+
+CACHES = cache_settings(CACHE_BACKEND)
+
+# При DEBUG правки шаблонов видны без перезапуска; TEMPLATES_CACHED=1
+# включает cached.Loader, как в prod.
+TEMPLATES_CACHED = env_bool('TEMPLATES_CACHED', not DEBUG)
+
+TEMPLATES = template_settings(TEMPLATES_CACHED)
+
+QUERYLOG_ENABLED = env_bool('QUERYLOG_ENABLED', DEBUG)
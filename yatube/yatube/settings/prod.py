@@ -0,0 +1,46 @@
+"""
+Продакшен. Обязательны переменные окружения SECRET_KEY и ALLOWED_HOSTS
+(через запятую). Значения по умолчанию выбраны ради производительности;
+то, что их ухудшает, отмечает проверка core.checks при запуске
+manage.py (migrate, check и др.).
+"""
+import os
+
+from .base import *  # noqa: F401,F403
+from .base import (cache_settings, database_settings, env_bool, env_int,
+                   env_list, template_settings)
+
+ENVIRONMENT = 'prod'
+
+# DEBUG хранит в памяти каждый SQL-запрос и отключает cached.Loader.
+DEBUG = env_bool('DJANGO_DEBUG', False)
+
+SECRET_KEY = os.environ['SECRET_KEY']
+
+ALLOWED_HOSTS = env_list('ALLOWED_HOSTS', [])
+
+# Соединение с базой живет CONN_MAX_AGE секунд, а не один запрос.
+DATABASES = database_settings(env_int('CONN_MAX_AGE', 60))
+
+# Версии кеша лент должны быть общими для всех процессов, поэтому кеш -
+# сервер, а не память процесса.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis')
+
+CACHES = cache_settings(CACHE_BACKEND)
+
+TEMPLATES_CACHED = env_bool('TEMPLATES_CACHED', True)
+
+TEMPLATES = template_settings(TEMPLATES_CACHED)
+
+# Сессия читается из кеша, в базу пишется только при изменении.
+SESSION_ENGINE = os.getenv('SESSION_ENGINE',
+                           'django.contrib.sessions.backends.cached_db')
+
+# Имена статики с хешем содержимого: их можно кешировать навсегда.
+# Требует collectstatic в STATIC_ROOT.
+STATICFILES_STORAGE = os.getenv(
+    'STATICFILES_STORAGE',
+    'django.contrib.staticfiles.storage.ManifestStaticFilesStorage',
+)
+
+QUERYLOG_ENABLED = env_bool('QUERYLOG_ENABLED', False)